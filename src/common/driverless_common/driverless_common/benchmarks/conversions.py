@@ -0,0 +1,142 @@
+"""Compares the array/message helpers in driverless_common.conversions against building messages one cone at a time
+
+Usage:
+    python -m driverless_common.benchmarks.conversions [--sizes=50,500,5000] [--repeats=20]
+
+For each message size, reports the median time (ms) and the time per cone (us) of each conversion, done with the
+helpers and with the per-cone loops the nodes used before them.
+"""
+import getopt
+import sys
+import time
+
+import numpy as np
+
+from driverless_msgs.msg import (
+    Cone,
+    ConeDetectionStamped,
+    ConeWithCovariance,
+    PathPoint,
+    PathStamped,
+    TrackDetectionStamped,
+)
+from geometry_msgs.msg import Point
+
+from driverless_common.conversions import (
+    cone_detection_msg,
+    cones_to_array,
+    path_msg,
+    path_to_array,
+    track_detection_msg,
+    track_to_arrays,
+)
+
+from typing import Callable, Dict, List
+
+
+def loop_cone_detection_msg(cones: np.ndarray) -> ConeDetectionStamped:
+    return ConeDetectionStamped(
+        cones=[Cone(location=Point(x=cone[0], y=cone[1], z=0.0), color=int(cone[2])) for cone in cones]
+    )
+
+
+def loop_cones_to_array(cones: List[Cone]) -> np.ndarray:
+    return np.array([[c.location.x, c.location.y, c.color] for c in cones])
+
+
+def loop_track_detection_msg(cones: np.ndarray, covariances: np.ndarray) -> TrackDetectionStamped:
+    return TrackDetectionStamped(
+        cones=[
+            ConeWithCovariance(
+                cone=Cone(location=Point(x=cone[0], y=cone[1], z=0.0), color=int(cone[2])),
+                covariance=covariance.flatten().tolist(),
+            )
+            for cone, covariance in zip(cones, covariances)
+        ]
+    )
+
+
+def loop_track_to_arrays(cones: List[ConeWithCovariance]):
+    return (
+        np.array([[c.cone.location.x, c.cone.location.y, c.cone.color] for c in cones]),
+        np.array([c.covariance for c in cones]),
+    )
+
+
+def loop_path_msg(path: np.ndarray) -> PathStamped:
+    path_points = []
+    for i in path:
+        path_point = PathPoint()
+        path_point.location = Point(x=i[0], y=i[1], z=0.0)
+        path_point.turn_intensity = 0.0
+        path_points.append(path_point)
+
+    return PathStamped(path=path_points)
+
+
+def loop_path_to_array(path: List[PathPoint]) -> np.ndarray:
+    return np.array([[p.location.x, p.location.y, p.turn_intensity] for p in path])
+
+
+def time_call(function: Callable, repeats: int) -> float:
+    """
+    Returns:
+        float: Median time of the calls (ms)
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return float(np.median(times)) * 1000
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    opts, _ = getopt.getopt(args, "", ["sizes=", "repeats="])
+    opts = dict(opts)
+
+    sizes = [int(size) for size in opts.get("--sizes", "50,500,5000").split(",")]
+    repeats = int(opts.get("--repeats", 20))
+
+    rng = np.random.default_rng(0)
+    print(
+        f"{'conversion':>22} {'cones':>6} {'loop ms':>9} {'helper ms':>9} {'loop us':>8} {'helper us':>9} {'speedup':>7}"
+    )
+    for size in sizes:
+        cones = np.column_stack((rng.uniform(-50, 50, (size, 2)), rng.integers(0, 5, size)))
+        covariances = rng.uniform(0, 1, (size, 2, 2))
+        path = np.column_stack((rng.uniform(-50, 50, (size, 2)), np.zeros(size)))
+
+        detection = cone_detection_msg(cones)
+        track = track_detection_msg(cones, covariances)
+        path_points = path_msg(path[:, :2])
+
+        conversions: Dict[str, tuple] = {
+            "cone_detection_msg": (lambda: loop_cone_detection_msg(cones), lambda: cone_detection_msg(cones)),
+            "cones_to_array": (
+                lambda: loop_cones_to_array(detection.cones),
+                lambda: cones_to_array(detection.cones),
+            ),
+            "track_detection_msg": (
+                lambda: loop_track_detection_msg(cones, covariances),
+                lambda: track_detection_msg(cones, covariances),
+            ),
+            "track_to_arrays": (lambda: loop_track_to_arrays(track.cones), lambda: track_to_arrays(track.cones)),
+            "path_msg": (lambda: loop_path_msg(path), lambda: path_msg(path[:, :2])),
+            "path_to_array": (
+                lambda: loop_path_to_array(path_points.path),
+                lambda: path_to_array(path_points.path),
+            ),
+        }
+        for name, (loop, helper) in conversions.items():
+            loop_ms = time_call(loop, repeats)
+            helper_ms = time_call(helper, repeats)
+            print(
+                f"{name:>22} {size:>6} {loop_ms:>9.3f} {helper_ms:>9.3f}"
+                f" {loop_ms / size * 1000:>8.2f} {helper_ms / size * 1000:>9.2f} {loop_ms / helper_ms:>6.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Times how long each node takes to start, from launching its executable to its first "initialised" log
+
+Usage:
+    python -m driverless_common.benchmarks.startup [--packages=lidar_pipeline_3,py_slam,...]
+        [--executables=<package>/<executable>,...] [--repeats=3] [--timeout=30]
+
+Runs each executable with `ros2 run` (from a sourced workspace), stops it as soon as it logs a line matching
+PATTERN (or its entry in PATTERNS) and reports the median and fastest start up time. Missions relaunch nodes,
+so this is how long a mission switch waits on each node before it can process anything.
+"""
+import getopt
+import os
+import queue
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+from typing import IO, Dict, List, Optional, Tuple
+
+# Packages timed by default, the nodes launched for a mission
+PACKAGES = ("lidar_pipeline_3", "py_slam", "planners", "path_follower", "mission_controller")
+
+PATTERN = r"initi?ali[sz]ed"  # Matches "Initalised" too
+
+# Executables that log something else once they are ready
+PATTERNS: Dict[str, str] = {
+    "lidar_perception": r"Waiting for point cloud data",
+}
+
+# Arguments each executable needs to log that it is ready
+ARGUMENTS: Dict[str, List[str]] = {
+    "lidar_perception": ["--print_logs"],
+}
+
+
+def get_executables(package: str) -> List[Tuple[str, str]]:
+    """
+    Returns:
+        list: (package, executable) of every executable in the package
+    """
+    output = subprocess.run(["ros2", "pkg", "executables", package], capture_output=True, text=True, check=True)
+    return [tuple(line.split()) for line in output.stdout.splitlines() if line.strip()]
+
+
+def _read_lines(stream: IO[str], lines: queue.SimpleQueue) -> None:
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+
+def time_startup(package: str, executable: str, timeout: float) -> Optional[float]:
+    """Launches an executable and waits for it to log that it is ready
+
+    Returns:
+        float: Seconds from launching to the log, None if it exited or timed out first
+    """
+    pattern = re.compile(PATTERNS.get(executable, PATTERN), re.IGNORECASE)
+
+    # Unbuffered, so the log is read as soon as it is written
+    env = dict(os.environ, PYTHONUNBUFFERED="1", RCUTILS_LOGGING_BUFFERED_STREAM="0")
+    command = ["ros2", "run", package, executable, *ARGUMENTS.get(executable, [])]
+
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env, start_new_session=True
+    )
+    lines: queue.SimpleQueue = queue.SimpleQueue()
+    threading.Thread(target=_read_lines, args=(process.stdout, lines), daemon=True).start()
+
+    try:
+        while True:
+            remaining = timeout - (time.perf_counter() - start_time)
+            if remaining <= 0:
+                return None
+
+            try:
+                line = lines.get(timeout=remaining)
+            except queue.Empty:
+                return None
+
+            if line is None:
+                return None
+            if pattern.search(line):
+                return time.perf_counter() - start_time
+    finally:
+        # ros2 run starts the node in a child process, so the whole group is stopped
+        os.killpg(process.pid, signal.SIGINT)
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    opts, _ = getopt.getopt(args, "", ["packages=", "executables=", "repeats=", "timeout="])
+    opts = dict(opts)
+
+    repeats = int(opts.get("--repeats", 3))
+    timeout = float(opts.get("--timeout", 30))
+
+    if "--executables" in opts:
+        executables = [tuple(name.split("/")) for name in opts["--executables"].split(",")]
+    else:
+        packages = opts["--packages"].split(",") if "--packages" in opts else PACKAGES
+        executables = [executable for package in packages for executable in get_executables(package)]
+
+    print(f"{'executable':>40} {'p50 s':>7} {'min s':>7} {'started':>7}")
+    for package, executable in executables:
+        times = [time_startup(package, executable, timeout) for _ in range(repeats)]
+        started = [startup_time for startup_time in times if startup_time is not None]
+
+        name = f"{package}/{executable}"
+        if started:
+            print(f"{name:>40} {np.median(started):>7.2f} {min(started):>7.2f} {len(started):>4}/{repeats}")
+        else:
+            print(f"{name:>40} {'-':>7} {'-':>7} {0:>4}/{repeats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+from itertools import chain
+
+import numpy as np
+
+from driverless_msgs.msg import (
+    Cone,
+    ConeDetectionStamped,
+    ConeWithCovariance,
+    PathPoint,
+    PathStamped,
+    TrackDetectionStamped,
+)
+from std_msgs.msg import Header
+
+from typing import List, Optional, Sequence, Tuple
+
+# Arrays of cones are (N, 3) [x y color], or (N, 2) [x y] for cones of unknown colour
+# Arrays of paths are (N, 3) [x y turn_intensity], or (N, 2) [x y] for paths without turn intensities
+# Covariances of cones are (N, 4), the flattened 2x2 covariance of each cone's location
+
+
+def cones_to_array(cones: Sequence[Cone]) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: (N, 3) [x y color] of each cone
+    """
+    return np.fromiter(
+        chain.from_iterable((cone.location.x, cone.location.y, cone.color) for cone in cones),
+        dtype=float,
+        count=3 * len(cones),
+    ).reshape(-1, 3)
+
+
+def array_to_cones(cones: np.ndarray, z: float = 0.0) -> List[Cone]:
+    """Cone messages from an (N, 3) [x y color] or (N, 2) [x y] array, at height z"""
+    cones = np.asarray(cones, dtype=float)
+    if cones.size == 0:
+        return []
+
+    if cones.shape[1] > 2:
+        colors = cones[:, 2].astype(int).tolist()
+    else:
+        colors = [Cone.UNKNOWN] * cones.shape[0]
+    z = float(z)
+
+    # Fills in the location each message is constructed with, rather than constructing another to replace it
+    cone_msgs = []
+    for x, y, color in zip(cones[:, 0].tolist(), cones[:, 1].tolist(), colors):
+        cone = Cone(color=color)
+        location = cone.location
+        location.x = x
+        location.y = y
+        location.z = z
+        cone_msgs.append(cone)
+
+    return cone_msgs
+
+
+def cone_detection_msg(cones: np.ndarray, header: Optional[Header] = None, z: float = 0.0) -> ConeDetectionStamped:
+    """Cone detection from an (N, 3) [x y color] or (N, 2) [x y] array of cones, at height z"""
+    if header is None:
+        header = Header()
+    return ConeDetectionStamped(header=header, cones=array_to_cones(cones, z))
+
+
+def track_to_arrays(cones: Sequence[ConeWithCovariance]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns:
+        tuple: (N, 3) [x y color] and (N, 4) covariance of each cone
+    """
+    covariances = np.fromiter(
+        chain.from_iterable(cone.covariance for cone in cones), dtype=float, count=4 * len(cones)
+    ).reshape(-1, 4)
+    return cones_to_array([cone.cone for cone in cones]), covariances
+
+
+def track_detection_msg(
+    cones: np.ndarray, covariances: np.ndarray, header: Optional[Header] = None
+) -> TrackDetectionStamped:
+    """Track from an (N, 3) [x y color] or (N, 2) [x y] array of cones and their (N, 4) or (N, 2, 2) covariances"""
+    if header is None:
+        header = Header()
+    covariances = np.array(covariances, dtype=np.float64).reshape(-1, 4)
+
+    return TrackDetectionStamped(
+        header=header,
+        cones=[
+            ConeWithCovariance(cone=cone, covariance=covariance)
+            for cone, covariance in zip(array_to_cones(cones), covariances)
+        ],
+    )
+
+
+def path_to_array(path: Sequence[PathPoint]) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: (N, 3) [x y turn_intensity] of each path point
+    """
+    return np.fromiter(
+        chain.from_iterable((point.location.x, point.location.y, point.turn_intensity) for point in path),
+        dtype=float,
+        count=3 * len(path),
+    ).reshape(-1, 3)
+
+
+def path_msg(path: np.ndarray, header: Optional[Header] = None) -> PathStamped:
+    """Path from an (N, 3) [x y turn_intensity] or (N, 2) [x y] array of path points"""
+    if header is None:
+        header = Header()
+    path = np.asarray(path, dtype=float)
+    if path.size == 0:
+        return PathStamped(header=header)
+
+    if path.shape[1] > 2:
+        turn_intensities = path[:, 2].tolist()
+    else:
+        turn_intensities = [0.0] * path.shape[0]
+
+    path_points = []
+    for x, y, turn_intensity in zip(path[:, 0].tolist(), path[:, 1].tolist(), turn_intensities):
+        path_point = PathPoint(turn_intensity=turn_intensity)
+        location = path_point.location
+        location.x = x
+        location.y = y
+        path_points.append(path_point)
+
+    return PathStamped(header=header, path=path_points)
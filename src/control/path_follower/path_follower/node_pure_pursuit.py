@@ -12,6 +12,7 @@ from ackermann_msgs.msg import AckermannDriveStamped
 from driverless_msgs.msg import PathStamped
 from geometry_msgs.msg import PoseWithCovarianceStamped
 
+from driverless_common.conversions import path_to_array
 from driverless_common.shutdown_node import ShutdownNode
 
 from typing import List, Tuple
@@ -115,7 +116,7 @@ class PurePursuit(Node):
 
     def path_callback(self, spline_path_msg: PathStamped):
         # convert List[PathPoint] to 2D numpy array
-        self.path = np.array([[p.location.x, p.location.y, p.turn_intensity] for p in spline_path_msg.path])
+        self.path = path_to_array(spline_path_msg.path)
         self.get_logger().debug(f"Spline Path Recieved - length: {len(self.path)}")
 
     def callback(self, msg: PoseWithCovarianceStamped):
@@ -2,7 +2,6 @@ from math import pi
 import time
 
 import cv2
-import matplotlib.pyplot as plt
 import numpy as np
 from scipy.interpolate import UnivariateSpline
 from scipy.spatial import Delaunay
@@ -12,16 +11,17 @@ import rclpy
 from rclpy.node import Node
 from rclpy.publisher import Publisher
 
-from driverless_msgs.msg import Cone, ConeWithCovariance, PathPoint, PathStamped, TrackDetectionStamped
+from driverless_msgs.msg import Cone, PathStamped, TrackDetectionStamped
 from geometry_msgs.msg import Point
 from sensor_msgs.msg import Image
 from std_msgs.msg import ColorRGBA
 from visualization_msgs.msg import Marker
 
+from driverless_common.conversions import path_msg, track_to_arrays
 from driverless_common.marker import delaunay_marker_msg
 from driverless_common.shutdown_node import ShutdownNode
 
-from typing import List, Tuple
+from typing import Tuple
 
 LEFT_CONE_COLOUR = Cone.BLUE
 RIGHT_CONE_COLOUR = Cone.YELLOW
@@ -143,9 +143,6 @@ img_origin_y = (HEIGHT - TRACK_LENGTH * scale) // 3
 
 
 class TrackPlanner(Node):
-    fig = plt.figure()
-    ax = fig.add_subplot()
-
     def __init__(self):
         super().__init__("global_planner_node")
 
@@ -163,22 +160,22 @@ class TrackPlanner(Node):
         self.get_logger().debug("Received track")
         start = time.perf_counter()
 
-        cones_with_cov: List[ConeWithCovariance] = track_msg.cones
+        cones, _ = track_to_arrays(track_msg.cones)  # [x y color]
 
         # get left and right cones
-        left_cones = [c.cone for c in cones_with_cov if c.cone.color == LEFT_CONE_COLOUR]
-        right_cones = [c.cone for c in cones_with_cov if c.cone.color == RIGHT_CONE_COLOUR]
+        left_cones = cones[cones[:, 2] == LEFT_CONE_COLOUR]
+        right_cones = cones[cones[:, 2] == RIGHT_CONE_COLOUR]
 
         if len(left_cones) < 2 or len(right_cones) < 2:  # no cones
             return
 
         # order cones by distance from car
-        left_cones.sort(key=lambda c: c.location.x)
-        right_cones.sort(key=lambda c: c.location.x)
+        left_cones = left_cones[np.argsort(left_cones[:, 0], kind="stable")]
+        right_cones = right_cones[np.argsort(right_cones[:, 0], kind="stable")]
 
         # make one array with alternating left and right cones
-        cones = left_cones + right_cones
-        track = np.array([[c.location.x, c.location.y] for c in cones])
+        cones = np.concatenate((left_cones, right_cones))
+        track = cones[:, :2]
 
         # # compute delaunay triangulation
         tri = Delaunay(track)
@@ -205,9 +202,9 @@ class TrackPlanner(Node):
             v2 = track[t[1]]
             v3 = track[t[2]]
             # get cone colours
-            c1 = cones[t[0]].color
-            c2 = cones[t[1]].color
-            c3 = cones[t[2]].color
+            c1 = cones[t[0], 2]
+            c2 = cones[t[1], 2]
+            c3 = cones[t[2], 2]
             # check if any are different
             if c1 != c2:
                 lines.append(np.vstack((v1, v2)))
@@ -251,14 +248,7 @@ class TrackPlanner(Node):
             path = np.vstack((rix, riy, heading)).T
 
         # publish path
-        path_msg: list[PathPoint] = []
-        for i in path:
-            path_point = PathPoint()
-            path_point.location = Point(x=i[0], y=i[1], z=0.0)
-            path_point.turn_intensity = 0.0
-            path_msg.append(path_point)
-
-        self.path_publisher.publish(PathStamped(path=path_msg))
+        self.path_publisher.publish(path_msg(path[:, :2]))
 
         # publish delaunay lines
         # make pairs of points for each line
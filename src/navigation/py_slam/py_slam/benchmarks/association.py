@@ -0,0 +1,99 @@
+"""Compares associating a frame of detections one at a time against data_association.associate
+
+Usage:
+    python -m py_slam.benchmarks.association [--sizes=50,200,1000] [--detections=20] [--frames=50]
+        [--radius=1.5] [--noise=0.3]
+
+Maps and frames are made the same way as py_slam.benchmarks.landmark_index, with a covariance for the filter.
+Each frame is associated the way the SLAM nodes did before (transform each detection with its own rotation
+matrix, take the closest landmark within --radius) and with associate. Reports the median time per frame (ms) and
+the number of landmarks matched to more than one detection in a frame.
+"""
+import getopt
+from math import atan2, cos, sin
+import sys
+import time
+
+import numpy as np
+
+from py_slam.benchmarks.landmark_index import make_map, query_radius
+from py_slam.data_association import associate, transform_detections
+from py_slam.landmark_index import LandmarkIndex
+
+Q = np.diag([0.2, 0.2]) ** 2
+
+
+def loop_associate(index: LandmarkIndex, state: np.ndarray, local_coords: np.ndarray, radius: float) -> np.ndarray:
+    matches = []
+    for local_x, local_y in local_coords:
+        rotation_mat = np.array([[cos(state[2]), -sin(state[2])], [sin(state[2]), cos(state[2])]])
+        map_coords = rotation_mat @ np.array([local_x, local_y]).T + state[:2]
+
+        close = query_radius(index, map_coords, radius, state[3:].reshape(-1, 2))
+        matches.append(close[0] if close.size != 0 else -1)
+    return np.array(matches)
+
+
+def frame_associate(index: LandmarkIndex, state: np.ndarray, sigma: np.ndarray, local_coords: np.ndarray, radius):
+    measurements = np.column_stack((np.hypot(*local_coords.T), np.arctan2(local_coords[:, 1], local_coords[:, 0])))
+    return associate(state, sigma, index, transform_detections(local_coords, state), measurements, Q, radius)
+
+
+def count_doubles(matches: np.ndarray) -> int:
+    _, counts = np.unique(matches[matches >= 0], return_counts=True)
+    return int(np.sum(counts > 1))
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    opts, _ = getopt.getopt(args, "", ["sizes=", "detections=", "frames=", "radius=", "noise="])
+    opts = dict(opts)
+
+    sizes = [int(size) for size in opts.get("--sizes", "50,200,1000").split(",")]
+    detection_count = int(opts.get("--detections", 20))
+    frame_count = int(opts.get("--frames", 50))
+    radius = float(opts.get("--radius", 1.5))
+    noise = float(opts.get("--noise", 0.3))
+
+    rng = np.random.default_rng(0)
+    print(f"{'landmarks':>9} {'loop ms':>8} {'frame ms':>8} {'speedup':>7} {'loop doubles':>12} {'frame doubles':>13}")
+    for size in sizes:
+        landmarks = make_map(size)
+        index = LandmarkIndex(radius)
+        for landmark in landmarks:
+            index.add(landmark)
+
+        loop_times, frame_times = [], []
+        loop_doubles, frame_doubles = 0, 0
+        for _ in range(frame_count):
+            pose = landmarks[rng.integers(len(landmarks))] + [0.5, 0.5]
+            nearest = np.argsort(np.hypot(*(landmarks - pose).T))[:detection_count]
+            heading = atan2(*(landmarks[nearest[-1]] - pose)[::-1])
+
+            state = np.concatenate(([*pose, heading], landmarks.flatten()))
+            sigma = np.diag(np.concatenate(([0.1, 0.1, 0.001], np.full(2 * len(landmarks), 0.05))))
+
+            # detections relative to the car
+            detections = landmarks[nearest] + rng.normal(0, noise, (len(nearest), 2)) - pose
+            local_coords = detections @ np.array([[cos(heading), -sin(heading)], [sin(heading), cos(heading)]])
+
+            start = time.perf_counter()
+            loop_matches = loop_associate(index, state, local_coords, radius)
+            loop_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            frame_matches = frame_associate(index, state, sigma, local_coords, radius)
+            frame_times.append(time.perf_counter() - start)
+
+            loop_doubles += count_doubles(loop_matches)
+            frame_doubles += count_doubles(frame_matches)
+
+        loop_ms = float(np.median(loop_times)) * 1000
+        frame_ms = float(np.median(frame_times)) * 1000
+        print(
+            f"{size:>9} {loop_ms:>8.3f} {frame_ms:>8.3f} {loop_ms / frame_ms:>6.1f}x"
+            f" {loop_doubles:>12} {frame_doubles:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compares the EKF update in py_slam.ekf against the dense update the SLAM nodes did before
+
+Usage:
+    python -m py_slam.benchmarks.ekf_update [--sizes=50,200,500] [--updates=50]
+
+For each map size, updates random landmarks of a random state with a random positive definite covariance, with
+the dense update (a full 2 x (3+2n) Gt and (3+2n)^2 products) and with ekf.update. Reports the median time per
+update (ms) and the largest difference between the two in the state and covariance.
+"""
+import getopt
+from math import atan2, hypot
+import sys
+import time
+
+import numpy as np
+
+from py_slam import ekf
+
+Q = np.diag([0.2, 0.2]) ** 2
+
+
+def dense_update(state: np.ndarray, sigma: np.ndarray, index: int, measurement: tuple, Q: np.ndarray):
+    i = index * 2 + 3
+    mu_cone = state[i : i + 2]
+
+    r = hypot(state[0] - mu_cone[0], state[1] - mu_cone[1])
+    b = ekf.wrap_to_pi(atan2(mu_cone[1] - state[1], mu_cone[0] - state[0]) - state[2])
+
+    sig_len = len(sigma)
+    Gt = np.zeros((2, sig_len))
+    Gt[0:2, 0:3] = [
+        [-(mu_cone[0] - state[0]) / r, -(mu_cone[1] - state[1]) / r, 0],
+        [(mu_cone[1] - state[1]) / (r**2), -(mu_cone[0] - state[0]) / (r**2), 1],
+    ]
+    Gt[0:2, i : i + 2] = [
+        [(mu_cone[0] - state[0]) / r, (mu_cone[1] - state[1]) / r],
+        [-(mu_cone[1] - state[1]) / (r**2), (mu_cone[0] - state[0]) / (r**2)],
+    ]
+
+    Kt = sigma @ Gt.T @ np.linalg.inv(Gt @ sigma @ Gt.T + Q)
+
+    state = state + Kt @ np.array([measurement[0] - r, ekf.wrap_to_pi(measurement[1] - b)])
+    state[2] = ekf.wrap_to_pi(state[2])
+    sigma = (np.eye(sig_len) - Kt @ Gt) @ sigma
+    return state, sigma
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    opts, _ = getopt.getopt(args, "", ["sizes=", "updates="])
+    opts = dict(opts)
+
+    sizes = [int(size) for size in opts.get("--sizes", "50,200,500").split(",")]
+    update_count = int(opts.get("--updates", 50))
+
+    rng = np.random.default_rng(0)
+    print(f"{'landmarks':>9} {'dense ms':>9} {'sparse ms':>9} {'speedup':>7} {'state diff':>10} {'sigma diff':>10}")
+    for size in sizes:
+        state = np.concatenate(([0.0, 0.0, 0.0], rng.uniform(-50, 50, 2 * size)))
+        A = rng.normal(0, 0.1, (len(state), len(state)))
+        sigma = A @ A.T / len(state) + np.eye(len(state)) * 0.01
+
+        dense_times, sparse_times = [], []
+        state_diff, sigma_diff = 0.0, 0.0
+        for _ in range(update_count):
+            index = int(rng.integers(size))
+            measurement = (rng.uniform(1, 20), rng.uniform(-np.pi, np.pi))
+
+            start = time.perf_counter()
+            dense_state, dense_sigma = dense_update(state, sigma, index, measurement, Q)
+            dense_times.append(time.perf_counter() - start)
+
+            sparse_state, sparse_sigma = state.copy(), sigma.copy()
+            start = time.perf_counter()
+            ekf.update(sparse_state, sparse_sigma, index, measurement, Q)
+            sparse_times.append(time.perf_counter() - start)
+
+            state_diff = max(state_diff, float(np.abs(dense_state - sparse_state).max()))
+            sigma_diff = max(sigma_diff, float(np.abs(dense_sigma - sparse_sigma).max()))
+            state, sigma = sparse_state, sparse_sigma
+
+        dense_ms = float(np.median(dense_times)) * 1000
+        sparse_ms = float(np.median(sparse_times)) * 1000
+        print(
+            f"{size:>9} {dense_ms:>9.3f} {sparse_ms:>9.3f} {dense_ms / sparse_ms:>6.1f}x"
+            f" {state_diff:>10.1e} {sigma_diff:>10.1e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
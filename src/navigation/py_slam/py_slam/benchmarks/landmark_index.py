@@ -0,0 +1,110 @@
+"""Compares associating detections through LandmarkIndex against rebuilding a KDTree of the map for every detection
+
+Usage:
+    python -m py_slam.benchmarks.landmark_index [--sizes=50,200,1000] [--detections=20] [--frames=50]
+        [--radius=1.5] [--noise=0.3]
+
+Maps are pairs of cone lines spaced 5m apart along a circuit. Each frame detects the cones nearest a pose on the
+circuit (plus noise) and finds the landmarks within --radius of each one, the way the SLAM nodes did before
+(np.append of the state, KDTree, query_radius per detection) and with a LandmarkIndex. Reports the median time
+per frame (ms) and checks both find the same landmarks.
+"""
+import getopt
+import sys
+import time
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from py_slam.landmark_index import LandmarkIndex
+
+from typing import List
+
+
+def make_map(size: int) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: (x, y) of `size` cones, two lines 3m apart around a circle 5m between cones
+    """
+    count = size // 2
+    radius = count * 5 / (2 * np.pi)
+    angles = np.linspace(0, 2 * np.pi, count, endpoint=False)
+    inner = np.column_stack((np.cos(angles), np.sin(angles))) * (radius - 1.5)
+    outer = np.column_stack((np.cos(angles), np.sin(angles))) * (radius + 1.5)
+    return np.concatenate((inner, outer))
+
+
+def kdtree_associate(state: np.ndarray, detections: np.ndarray, radius: float) -> List[np.ndarray]:
+    matches = []
+    for detection in detections:
+        track_as_2d = np.array([])
+        for i in range(3, len(state), 2):
+            track_as_2d = np.append(track_as_2d, [state[i], state[i + 1]])
+
+        neighbourhood = KDTree(track_as_2d.reshape(-1, 2), leaf_size=50)
+        matches.append(neighbourhood.query_radius(detection.reshape(1, -1), r=radius)[0])
+    return matches
+
+
+def query_radius(index: LandmarkIndex, point: np.ndarray, radius: float, positions: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: Indices of the landmarks within radius of a point, closest first, like KDTree.query_radius
+    """
+    _, landmarks = index.query_pairs(point, radius, positions)
+    distances = np.hypot(*(positions[landmarks] - np.asarray(point).reshape(2)).T)
+    return landmarks[np.argsort(distances, kind="stable")]
+
+
+def index_associate(index: LandmarkIndex, state: np.ndarray, detections: np.ndarray, radius: float) -> List[np.ndarray]:
+    positions = state[3:].reshape(-1, 2)
+    return [query_radius(index, detection, radius, positions) for detection in detections]
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    opts, _ = getopt.getopt(args, "", ["sizes=", "detections=", "frames=", "radius=", "noise="])
+    opts = dict(opts)
+
+    sizes = [int(size) for size in opts.get("--sizes", "50,200,1000").split(",")]
+    detection_count = int(opts.get("--detections", 20))
+    frame_count = int(opts.get("--frames", 50))
+    radius = float(opts.get("--radius", 1.5))
+    noise = float(opts.get("--noise", 0.3))
+
+    rng = np.random.default_rng(0)
+    print(f"{'landmarks':>9} {'kdtree ms':>9} {'index ms':>9} {'speedup':>7} {'matches':>8}")
+    for size in sizes:
+        landmarks = make_map(size)
+        state = np.concatenate(([0.0, 0.0, 0.0], landmarks.flatten()))
+
+        index = LandmarkIndex(radius)
+        for landmark in landmarks:
+            index.add(landmark)
+
+        kdtree_times, index_times = [], []
+        same = True
+        for _ in range(frame_count):
+            pose = landmarks[rng.integers(len(landmarks))]
+            nearest = np.argsort(np.hypot(*(landmarks - pose).T))[:detection_count]
+            detections = landmarks[nearest] + rng.normal(0, noise, (len(nearest), 2))
+
+            start = time.perf_counter()
+            kdtree_matches = kdtree_associate(state, detections, radius)
+            kdtree_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            index_matches = index_associate(index, state, detections, radius)
+            index_times.append(time.perf_counter() - start)
+
+            same &= all(np.array_equal(np.sort(a), np.sort(b)) for a, b in zip(kdtree_matches, index_matches))
+
+        kdtree_ms = float(np.median(kdtree_times)) * 1000
+        index_ms = float(np.median(index_times)) * 1000
+        print(
+            f"{size:>9} {kdtree_ms:>9.3f} {index_ms:>9.3f} {kdtree_ms / index_ms:>6.1f}x"
+            f" {'same' if same else 'DIFFER':>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
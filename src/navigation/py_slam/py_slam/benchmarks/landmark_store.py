@@ -0,0 +1,86 @@
+"""Compares growing and flushing the EKF state with LandmarkStore against copying it for every change
+
+Usage:
+    python -m py_slam.benchmarks.landmark_store [--sizes=50,200,500] [--flush_every=10] [--flush_count=2]
+
+Builds a map of each size one landmark at a time, removing --flush_count random landmarks every --flush_every
+landmarks, the way the SLAM nodes did before (np.append of the state and a new covariance for each landmark,
+np.delete of rows and columns) and with a LandmarkStore. Reports the total time (ms) and the time per change (us).
+"""
+import getopt
+import sys
+import time
+
+import numpy as np
+
+from py_slam.landmark_store import LandmarkStore
+
+POSE_SIGMA = np.diag([0.5, 0.5, 0.001])
+
+
+def copy_add(state: np.ndarray, sigma: np.ndarray, position: np.ndarray, cov: np.ndarray):
+    state = np.append(state, position)
+
+    sig_len = len(sigma)
+    new_sig = np.zeros((sig_len + 2, sig_len + 2))
+    new_sig[0:sig_len, 0:sig_len] = sigma
+    new_sig[sig_len : sig_len + 2, sig_len : sig_len + 2] = cov
+    return state, new_sig
+
+
+def copy_remove(state: np.ndarray, sigma: np.ndarray, indices: np.ndarray):
+    state = np.delete(state, [indices * 2 + 3, indices * 2 + 4], axis=0)
+    sigma = np.delete(sigma, [indices * 2 + 3, indices * 2 + 4], axis=0)
+    sigma = np.delete(sigma, [indices * 2 + 3, indices * 2 + 4], axis=1)
+    return state, sigma
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    opts, _ = getopt.getopt(args, "", ["sizes=", "flush_every=", "flush_count="])
+    opts = dict(opts)
+
+    sizes = [int(size) for size in opts.get("--sizes", "50,200,500").split(",")]
+    flush_every = int(opts.get("--flush_every", 10))
+    flush_count = int(opts.get("--flush_count", 2))
+
+    print(
+        f"{'landmarks':>9} {'changes':>7} {'copy ms':>8} {'store ms':>8} {'copy us':>8} {'store us':>8} {'speedup':>7}"
+    )
+    for size in sizes:
+        # the same landmarks and removals for both
+        rng = np.random.default_rng(0)
+        changes = []
+        count, added = 0, 0
+        while count < size:
+            changes.append(("add", rng.uniform(-50, 50, 2), np.diag(rng.uniform(0.01, 0.1, 2))))
+            count, added = count + 1, added + 1
+            if added % flush_every == 0:
+                changes.append(("remove", rng.choice(count, flush_count, replace=False)))
+                count -= flush_count
+
+        start = time.perf_counter()
+        state, sigma = np.zeros(3), POSE_SIGMA.copy()
+        for change in changes:
+            if change[0] == "add":
+                state, sigma = copy_add(state, sigma, *change[1:])
+            else:
+                state, sigma = copy_remove(state, sigma, *change[1:])
+        copy_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        store = LandmarkStore(POSE_SIGMA)
+        for change in changes:
+            if change[0] == "add":
+                store.add(*change[1:])
+            else:
+                store.remove(*change[1:])
+        store_ms = (time.perf_counter() - start) * 1000
+
+        print(
+            f"{len(store):>9} {len(changes):>7} {copy_ms:>8.2f} {store_ms:>8.2f} {copy_ms / len(changes) * 1000:>8.1f}"
+            f" {store_ms / len(changes) * 1000:>8.1f} {copy_ms / store_ms:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
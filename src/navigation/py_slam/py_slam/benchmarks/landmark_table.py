@@ -0,0 +1,140 @@
+"""Compares keeping landmark properties as an object per landmark against the columns of a LandmarkTable
+
+Usage:
+    python -m py_slam.benchmarks.landmark_table [--sizes=50,200,1000] [--detections=20] [--frames=50]
+
+For each map size, sees --detections random landmarks a frame with random colours, then finds the landmarks to
+publish in the track and local map and the ones to flush, the way the SLAM nodes did before (a loop over an object
+array of properties, updating one landmark at a time) and with a LandmarkTable. Reports the median time per frame
+(ms) and the number of landmarks the two disagree on the colour or confirmation of.
+"""
+import getopt
+from math import cos, sin
+import sys
+import time
+
+import numpy as np
+
+from driverless_msgs.msg import Cone
+
+from py_slam.landmark_table import LandmarkTable
+
+FRAME_COUNT = 20
+FRAME_REM_COUNT = 40
+X_RANGE = 15
+Y_RANGE = 10
+COLOURS = np.array([Cone.YELLOW, Cone.BLUE, Cone.ORANGE_BIG, Cone.UNKNOWN])
+
+
+class LoopProps:
+    def __init__(self, map_coords: np.ndarray, colour: int):
+        self.map_coords, self.colour = map_coords, colour
+        self.cov = np.zeros((2, 2))
+        self.local_x, self.local_y = 0.0, 0.0
+        self.confirmed = False
+        self.frame_count, self.yellow_count, self.blue_count, self.orange_count = 0, 0, 0, 0
+
+    def update(self, state: np.ndarray, cov: np.ndarray, colour: int):
+        self.map_coords = state
+        self.cov = cov
+
+        self.frame_count += 1
+        if self.frame_count > FRAME_COUNT and not self.confirmed:
+            if abs(self.cov[0, 0]) < 0.5 and abs(self.cov[1, 1]) < 0.5:
+                self.confirmed = True
+
+        if colour == Cone.YELLOW:
+            self.yellow_count += 1
+        elif colour == Cone.BLUE:
+            self.blue_count += 1
+        elif colour == Cone.ORANGE_BIG:
+            self.orange_count += 1
+
+        if self.yellow_count > self.blue_count and self.yellow_count > self.orange_count:
+            self.colour = Cone.YELLOW
+        elif self.blue_count > self.yellow_count and self.blue_count > self.orange_count:
+            self.colour = Cone.BLUE
+
+        if self.orange_count > 10 or self.orange_count > self.yellow_count or self.orange_count > self.blue_count:
+            self.colour = Cone.ORANGE_BIG
+
+
+def loop_frame(properties: np.ndarray, pose: np.ndarray, seen: np.ndarray, coords, covs, colours) -> tuple:
+    for index, state, cov, colour in zip(seen, coords, covs, colours):
+        properties[index].update(state, cov, colour)
+
+    confirmed = [props for props in properties if props.confirmed]
+    track = np.array([[*props.map_coords, props.colour] for props in confirmed]).reshape(-1, 3)
+
+    rotation_mat = np.array([[cos(pose[2]), -sin(pose[2])], [sin(pose[2]), cos(pose[2])]])
+    local_coords = np.array([])
+    for props in properties:
+        local = np.linalg.inv(rotation_mat) @ (props.map_coords - pose[0:2])
+        local_coords = np.append(local_coords, [local])
+        props.local_x, props.local_y = local
+    local_coords = local_coords.reshape(-1, 2)
+    side_idxs = np.where(np.logical_and(local_coords[:, 1] > -Y_RANGE, local_coords[:, 1] < Y_RANGE))[0]
+    forward_idxs = np.where(np.logical_and(local_coords[:, 0] > 0, local_coords[:, 0] < X_RANGE))[0]
+    local_map = [[p.local_x, p.local_y, p.colour] for p in properties[np.intersect1d(side_idxs, forward_idxs)]]
+
+    noisy_idxs = np.array([i for i, props in enumerate(properties) if props.frame_count < FRAME_REM_COUNT])
+    return track, np.array(local_map).reshape(-1, 3), noisy_idxs
+
+
+def table_frame(table: LandmarkTable, pose: np.ndarray, seen: np.ndarray, coords, covs, colours) -> tuple:
+    table.update(seen, coords, covs, colours, FRAME_COUNT)
+
+    rows = table.rows
+    confirmed = rows[rows["confirmed"]]
+    track = np.column_stack((confirmed["map_coords"], confirmed["colour"]))
+
+    local_map = rows[table.get_local(pose, (0, X_RANGE), (-Y_RANGE, Y_RANGE))]
+    local_map = np.column_stack((local_map["local_coords"], local_map["colour"]))
+
+    noisy_idxs = np.flatnonzero(rows["frame_count"] < FRAME_REM_COUNT)
+    return track, local_map, noisy_idxs
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    opts, _ = getopt.getopt(args, "", ["sizes=", "detections=", "frames="])
+    opts = dict(opts)
+
+    sizes = [int(size) for size in opts.get("--sizes", "50,200,1000").split(",")]
+    detection_count = int(opts.get("--detections", 20))
+    frame_count = int(opts.get("--frames", 50))
+
+    rng = np.random.default_rng(0)
+    print(f"{'landmarks':>9} {'loop ms':>8} {'table ms':>8} {'speedup':>7} {'differences':>11}")
+    for size in sizes:
+        landmarks = rng.uniform(-50, 50, (size, 2))
+        properties = np.array([LoopProps(landmark, Cone.UNKNOWN) for landmark in landmarks])
+        table = LandmarkTable()
+        table.add(landmarks, np.full(size, Cone.UNKNOWN))
+
+        loop_times, table_times = [], []
+        for _ in range(frame_count):
+            pose = np.array([*rng.uniform(-50, 50, 2), rng.uniform(-np.pi, np.pi)])
+            seen = rng.choice(size, min(detection_count, size), replace=False)
+            coords = landmarks[seen] + rng.normal(0, 0.05, (len(seen), 2))
+            covs = np.eye(2) * rng.uniform(0.01, 1.0, (len(seen), 1, 1))
+            colours = rng.choice(COLOURS, len(seen), p=[0.45, 0.45, 0.05, 0.05])
+
+            start = time.perf_counter()
+            loop_frame(properties, pose, seen, coords, covs, colours)
+            loop_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            table_frame(table, pose, seen, coords, covs, colours)
+            table_times.append(time.perf_counter() - start)
+
+        differences = sum(
+            props.colour != row["colour"] or props.confirmed != row["confirmed"]
+            for props, row in zip(properties, table.rows)
+        )
+        loop_ms = float(np.median(loop_times)) * 1000
+        table_ms = float(np.median(table_times)) * 1000
+        print(f"{size:>9} {loop_ms:>8.3f} {table_ms:>8.3f} {loop_ms / table_ms:>6.1f}x {differences:>11}")
+
+
+if __name__ == "__main__":
+    main()
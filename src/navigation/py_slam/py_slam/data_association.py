@@ -0,0 +1,106 @@
+from math import cos, pi, sin
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from py_slam.landmark_index import LandmarkIndex
+
+GATE = 9.21  # squared Mahalanobis distance a match has to be within, chi-square 99% with 2 degrees of freedom
+UNMATCHED = -1  # no landmark within the radius, so a new landmark
+REJECTED = -2  # landmarks within the radius but none matched, neither a match nor a new landmark
+
+
+def transform_detections(local_coords: np.ndarray, pose: np.ndarray) -> np.ndarray:
+    """
+    Transform detections from the car to the map
+    * param local_coords: (x, y) of each detection relative to the car
+    * param pose: (x, y, theta) of the car
+    * return: (x, y) of each detection in the map
+    """
+    rotation_mat = np.array([[cos(pose[2]), -sin(pose[2])], [sin(pose[2]), cos(pose[2])]])
+    return local_coords.reshape(-1, 2) @ rotation_mat.T + pose[:2]
+
+
+def get_mahalanobis(
+    state: np.ndarray,
+    sigma: np.ndarray,
+    measurements: np.ndarray,
+    landmark_ind: np.ndarray,
+    Q: np.ndarray,
+) -> np.ndarray:
+    """
+    Squared Mahalanobis distances between measurements and the measurements predicted from their landmarks, using
+    the same range bearing model and Jacobians as the EKF update
+    * param measurements: (range, bearing) of each pair's detection
+    * param landmark_ind: index of each pair's landmark in the map
+    * return: distance of each pair
+    """
+    i = landmark_ind * 2 + 3  # landmark index in the state
+    delta = state[np.stack((i, i + 1), axis=1)] - state[:2]
+    q = np.einsum("ij,ij->i", delta, delta)
+    r = np.sqrt(q)
+
+    innovation = measurements - np.column_stack((r, np.arctan2(delta[:, 1], delta[:, 0]) - state[2]))
+    innovation[:, 1] = (innovation[:, 1] + pi) % (2 * pi) - pi
+
+    # Jacobian of (range, bearing) over [x, y, theta, landmark x, landmark y]
+    Gt = np.zeros((len(i), 2, 5))
+    Gt[:, 0, 0] = -delta[:, 0] / r
+    Gt[:, 0, 1] = -delta[:, 1] / r
+    Gt[:, 1, 0] = delta[:, 1] / q
+    Gt[:, 1, 1] = -delta[:, 0] / q
+    Gt[:, 1, 2] = 1
+    Gt[:, :, 3:] = -Gt[:, :, :2]
+
+    # covariance of the pose and each pair's landmark
+    ind = np.column_stack((np.broadcast_to([0, 1, 2], (len(i), 3)), i, i + 1))
+    sigma_pairs = sigma[ind[:, :, np.newaxis], ind[:, np.newaxis, :]]
+
+    S = Gt @ sigma_pairs @ Gt.transpose(0, 2, 1) + Q
+    return np.einsum("ij,ij->i", innovation, np.linalg.solve(S, innovation[:, :, np.newaxis])[:, :, 0])
+
+
+def associate(
+    state: np.ndarray,
+    sigma: np.ndarray,
+    index: LandmarkIndex,
+    map_coords: np.ndarray,
+    measurements: np.ndarray,
+    Q: np.ndarray,
+    radius: float,
+    gate: float = GATE,
+) -> np.ndarray:
+    """
+    Match a frame of detections to landmarks, each landmark is matched to at most one detection
+    Candidates within the radius are gated on Mahalanobis distance, then the assignment with the lowest total
+    distance is found for the whole frame
+    * param map_coords: (x, y) of each detection in the map
+    * param measurements: (range, bearing) of each detection from the car
+    * return: index of the landmark matched to each detection, otherwise UNMATCHED or REJECTED
+    """
+    matched = np.full(len(map_coords), UNMATCHED, dtype=np.int64)
+    if len(index) == 0 or len(map_coords) == 0:
+        return matched
+
+    detection_ind, landmark_ind = index.query_pairs(map_coords, radius, state[3:].reshape(-1, 2))
+    if detection_ind.size == 0:
+        return matched
+    matched[detection_ind] = REJECTED
+
+    distances = get_mahalanobis(state, sigma, measurements[detection_ind], landmark_ind, Q)
+    gated = distances <= gate
+    detection_ind, landmark_ind, distances = detection_ind[gated], landmark_ind[gated], distances[gated]
+    if detection_ind.size == 0:
+        return matched
+
+    # cost matrix over only the detections and landmarks with candidates
+    # pairs outside the gate cost more than any set of gated pairs, so the most pairs are matched first
+    rows, detection_ind = np.unique(detection_ind, return_inverse=True)
+    cols, landmark_ind = np.unique(landmark_ind, return_inverse=True)
+    costs = np.full((len(rows), len(cols)), gate * min(len(rows), len(cols)) + 1)
+    costs[detection_ind, landmark_ind] = distances
+
+    row_ind, col_ind = linear_sum_assignment(costs)
+    assigned = costs[row_ind, col_ind] <= gate
+    matched[rows[row_ind[assigned]]] = cols[col_ind[assigned]]
+    return matched
@@ -0,0 +1,59 @@
+from math import atan2, hypot, pi
+
+import numpy as np
+from scipy.linalg.blas import dger
+
+from typing import Tuple
+
+UPDATE_BLOCK = 64  # rows of the covariance updated at a time when it isn't contiguous
+
+
+def wrap_to_pi(angle: float) -> float:  # in rads
+    return (angle + pi) % (2 * pi) - pi
+
+
+def update(state: np.ndarray, sigma: np.ndarray, index: int, measurement: Tuple[float, float], Q: np.ndarray):
+    """
+    Update step of the EKF for a range bearing measurement of one landmark, in place
+    The measurement Jacobian Gt is only non zero for the vehicle and the landmark, so the gain only needs those
+    columns of sigma and the covariance update is rank 2: O(n) then O(n^2), rather than dense (3+2n)^2 products
+    * param state: [x, y, theta, landmark x, landmark y, ...]
+    * param sigma: covariance of the state
+    * param index: index of the landmark in the map
+    * param measurement: (range, bearing) of the landmark from the car
+    * param Q: measurement noise covariance matrix for this sensor
+    """
+
+    i = index * 2 + 3  # landmark index, first 3 are vehicle, each landmark has 2 values
+    dx, dy = state[i : i + 2] - state[0:2]
+
+    r = hypot(dx, dy)  # range to landmark
+    b = wrap_to_pi(atan2(dy, dx) - state[2])  # bearing to landmark
+
+    # columns of Gt for the vehicle, then the landmark
+    ind = [0, 1, 2, i, i + 1]
+    Gt = np.array(
+        [
+            [-dx / r, -dy / r, 0, dx / r, dy / r],
+            [dy / (r**2), -dx / (r**2), 1, -dy / (r**2), dx / (r**2)],
+        ]
+    )
+
+    sigma_Gt = sigma[:, ind] @ Gt.T  # sigma @ Gt.T from the columns of sigma Gt touches
+    # with Gt @ sigma @ Gt.T + Q = L @ L.T, Kt = W @ inv(L) and Kt @ Gt @ sigma = W @ W.T
+    L = np.linalg.cholesky(Gt @ sigma_Gt[ind] + Q)
+    W = np.linalg.solve(L, sigma_Gt.T).T
+    Kt = np.linalg.solve(L.T, W.T).T
+
+    # update state, wrap bearing to pi, wrap heading to pi
+    state += Kt @ np.array([measurement[0] - r, wrap_to_pi(measurement[1] - b)])
+    state[2] = wrap_to_pi(state[2])
+    # update cov, (I - Kt @ Gt) @ sigma as a rank 2 update, kept exactly symmetric so rounding doesn't build up
+    if sigma.flags.c_contiguous:
+        # in place without an n x n temporary, sigma.T is the Fortran ordered array BLAS updates
+        for column in W.T:
+            dger(-1.0, column, column, a=sigma.T, overwrite_a=True)
+    else:
+        # a view into a larger buffer (see LandmarkStore), a block of rows at a time to keep the temporary small
+        for start in range(0, len(sigma), UPDATE_BLOCK):
+            sigma[start : start + UPDATE_BLOCK] -= W[start : start + UPDATE_BLOCK] @ W.T
@@ -0,0 +1,118 @@
+from functools import lru_cache
+import math
+
+import numpy as np
+
+from typing import Optional, Tuple
+
+CODE_STRIDE = 1 << 32  # cell (x, y) -> x * CODE_STRIDE + y, unique while |y| < 2^31 cells
+
+
+@lru_cache
+def get_offsets(span: int) -> np.ndarray:
+    """
+    * return: (x, y) offsets of the cells within span cells of a cell
+    """
+    offsets = np.arange(-span, span + 1)
+    return np.stack(np.meshgrid(offsets, offsets, indexing="ij"), axis=-1).reshape(-1, 2)
+
+
+class LandmarkIndex:
+    """Uniform grid of landmark positions for radius queries, kept up to date as landmarks are added, moved
+    and removed rather than rebuilt for every detection
+
+    Landmarks are referred to by their index in the map (their order in the state), so removing landmarks shifts
+    the indices of the landmarks after them, the same as deleting them from the state.
+
+    Queries look cells up in a sorted array of cell codes, built when the cells have changed since the last query.
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.keys = np.empty((0, 2), dtype=np.int64)  # cell of each landmark
+        self.sorted_codes: Optional[Tuple[np.ndarray, np.ndarray]] = None  # cell codes sorted, landmark of each
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get_keys(self, positions: np.ndarray) -> np.ndarray:
+        return np.floor(np.asarray(positions).reshape(-1, 2) / self.cell_size).astype(np.int64)
+
+    @staticmethod
+    def get_codes(keys: np.ndarray) -> np.ndarray:
+        return keys[:, 0] * CODE_STRIDE + keys[:, 1]
+
+    def get_sorted_codes(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self.sorted_codes is None:
+            codes = self.get_codes(self.keys)
+            order = np.argsort(codes, kind="stable")
+            self.sorted_codes = (codes[order], order)
+        return self.sorted_codes
+
+    def add(self, position: np.ndarray) -> int:
+        """
+        Add a landmark to the end of the map
+        * param position: (x, y) of the landmark
+        * return: index of the landmark
+        """
+        index = len(self.keys)
+        key = self.get_keys(position)
+        self.keys = np.concatenate((self.keys, key))
+        self.sorted_codes = None
+        return index
+
+    def update(self, positions: np.ndarray):
+        """
+        Move landmarks to their current positions, the cell codes are only rebuilt if a landmark changed cell
+        * param positions: (x, y) of every landmark in the map
+        """
+        keys = self.get_keys(positions)
+        if np.any(keys != self.keys):
+            self.sorted_codes = None
+        self.keys = keys
+
+    def keep(self, order: np.ndarray):
+        """
+        Keep only some landmarks, in a new order
+        * param order: previous index of the landmark now at each index (see LandmarkStore.remove)
+        """
+        self.keys = self.keys[order]
+        self.sorted_codes = None
+
+    def clear(self):
+        self.keys = np.empty((0, 2), dtype=np.int64)
+        self.sorted_codes = None
+
+    def query_pairs(self, points: np.ndarray, radius: float, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get landmarks within a radius of many points at once
+        * param points: (x, y) of each point to search around
+        * param radius: search radius
+        * param positions: (x, y) of every landmark in the map
+        * return: point and landmark index of each pair within the radius, in order of point
+        """
+        empty = np.empty(0, dtype=np.int64)
+        points = np.asarray(points).reshape(-1, 2)
+        if len(points) == 0 or len(self.keys) == 0:
+            return empty, empty
+
+        # every cell around every point
+        offsets = get_offsets(math.ceil(radius / self.cell_size))
+        cells = (self.get_keys(points)[:, np.newaxis, :] + offsets).reshape(-1, 2)
+
+        # landmarks of each cell are a run of the sorted codes
+        codes, order = self.get_sorted_codes()
+        query_codes = self.get_codes(cells)
+        starts = np.searchsorted(codes, query_codes, side="left")
+        counts = np.searchsorted(codes, query_codes, side="right") - starts
+        total = counts.sum()
+        if total == 0:
+            return empty, empty
+
+        run_starts = np.cumsum(counts) - counts
+        point_ind = np.repeat(np.arange(len(cells)) // len(offsets), counts)
+        landmark_ind = order[np.repeat(starts - run_starts, counts) + np.arange(total)]
+
+        distances = np.hypot(*(positions[landmark_ind] - points[point_ind]).T)
+        in_radius = distances <= radius
+        return point_ind[in_radius], landmark_ind[in_radius]
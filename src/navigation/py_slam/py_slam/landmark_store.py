@@ -0,0 +1,106 @@
+import numpy as np
+
+INITIAL_CAPACITY = 64  # landmarks the buffers are first allocated for
+
+
+class LandmarkStore:
+    """State and covariance of the EKF, the pose then each landmark, in buffers preallocated for a number of
+    landmarks that double when full, so adding a landmark doesn't copy the whole covariance
+
+    state and sigma are views of the buffers for the landmarks in the map, and are replaced when the buffers grow,
+    so they shouldn't be kept across adding landmarks. Removing landmarks moves the last landmarks into the gaps
+    rather than shifting every landmark after them.
+    """
+
+    def __init__(self, pose_sigma: np.ndarray, capacity: int = INITIAL_CAPACITY):
+        self.count = 0  # landmarks in the map
+        self.state_buffer = np.zeros(3 + 2 * capacity)
+        self.sigma_buffer = np.zeros((3 + 2 * capacity, 3 + 2 * capacity))
+        self.reset(pose_sigma)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def size(self) -> int:
+        return 3 + 2 * self.count  # length of vehicle+landmarks
+
+    @property
+    def capacity(self) -> int:
+        return (len(self.state_buffer) - 3) // 2
+
+    @property
+    def state(self) -> np.ndarray:
+        return self.state_buffer[: self.size]
+
+    @property
+    def sigma(self) -> np.ndarray:
+        return self.sigma_buffer[: self.size, : self.size]
+
+    def reset(self, pose_sigma: np.ndarray):
+        """
+        Remove every landmark and reset the pose
+        * param pose_sigma: 3x3 covariance of the pose
+        """
+        self.count = 0
+        self.state_buffer[0:3] = 0.0
+        self.sigma_buffer[0:3, 0:3] = pose_sigma
+
+    def grow(self):
+        """
+        Double the capacity of the buffers, copying the map into the new buffers
+        """
+        size = self.size
+        state_buffer = np.zeros(3 + 4 * self.capacity)
+        sigma_buffer = np.zeros((len(state_buffer), len(state_buffer)))
+        state_buffer[:size] = self.state
+        sigma_buffer[:size, :size] = self.sigma
+        self.state_buffer, self.sigma_buffer = state_buffer, sigma_buffer
+
+    def add(self, position: np.ndarray, cov: np.ndarray) -> int:
+        """
+        Add a landmark to the end of the map, uncorrelated with the rest of the state
+        * param position: (x, y) of the landmark
+        * param cov: 2x2 covariance of the landmark
+        * return: index of the landmark
+        """
+        if self.count == self.capacity:
+            self.grow()
+
+        index = self.count
+        i = self.size
+        self.count += 1
+
+        self.state_buffer[i : i + 2] = position
+        # rows and columns of removed landmarks are left in the buffer
+        self.sigma_buffer[i : i + 2, : self.size] = 0.0
+        self.sigma_buffer[: self.size, i : i + 2] = 0.0
+        self.sigma_buffer[i : i + 2, i : i + 2] = cov
+        return index
+
+    def remove(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Remove landmarks from the map, filling their places with the last landmarks
+        * param indices: indices of the landmarks to remove
+        * return: previous index of the landmark now at each index, to reorder anything kept per landmark
+        """
+        removed = np.zeros(self.count, dtype=bool)
+        removed[np.asarray(indices, dtype=np.int64)] = True
+        remaining = self.count - int(removed.sum())
+
+        # landmarks kept from past the new end of the map fill the gaps before it
+        gaps = np.flatnonzero(removed[:remaining])
+        moved = np.flatnonzero(~removed[remaining:]) + remaining
+        order = np.arange(remaining)
+        order[gaps] = moved
+
+        if gaps.size != 0:
+            size = self.size
+            gaps = np.stack((gaps * 2 + 3, gaps * 2 + 4), axis=1).ravel()
+            moved = np.stack((moved * 2 + 3, moved * 2 + 4), axis=1).ravel()
+            self.state_buffer[gaps] = self.state_buffer[moved]
+            self.sigma_buffer[gaps, :size] = self.sigma_buffer[moved, :size]  # rows
+            self.sigma_buffer[:size, gaps] = self.sigma_buffer[:size, moved]  # columns
+
+        self.count = remaining
+        return order
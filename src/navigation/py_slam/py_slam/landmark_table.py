@@ -0,0 +1,118 @@
+import numpy as np
+
+from driverless_msgs.msg import Cone
+
+from py_slam.landmark_store import INITIAL_CAPACITY
+
+# properties of each landmark, a row per landmark in the same order as the state
+LANDMARK_DTYPE = np.dtype(
+    [
+        ("map_coords", np.float64, (2,)),  # (x, y) of the landmark when last seen
+        ("cov", np.float64, (2, 2)),  # covariance of the landmark when last seen
+        ("local_coords", np.float64, (2,)),  # (x, y) relative to the car, from the last get_local
+        ("colour", np.int64),
+        ("votes", np.int64, (3,)),  # detections seen as yellow, blue and big orange
+        ("frame_count", np.int64),  # frames the landmark has been seen in
+        ("confirmed", np.bool_),
+    ]
+)
+VOTE_COLOURS = (Cone.YELLOW, Cone.BLUE, Cone.ORANGE_BIG)  # colour of each column of votes
+CONFIRM_VARIANCE = 0.5  # largest x and y variance a landmark is confirmed with
+
+
+class LandmarkTable:
+    """Properties of each landmark in the map as a structured array, a column per property, so a frame of
+    detections updates them together rather than an object per landmark at a time
+
+    Rows are kept in a buffer that doubles when full, like LandmarkStore, and are reordered the same way when
+    landmarks are removed. rows is a view of the buffer and is replaced when it grows.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.count = 0  # landmarks in the map
+        self.buffer = np.zeros(capacity, dtype=LANDMARK_DTYPE)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self.buffer[: self.count]
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, map_coords: np.ndarray, colours: np.ndarray):
+        """
+        Add new landmarks to the end of the table, unseen and unconfirmed
+        * param map_coords: (N, 2) array of (x, y) of the landmarks
+        * param colours: colour of each landmark
+        """
+        count = self.count + len(map_coords)
+        if count > len(self.buffer):
+            buffer = np.zeros(max(count, 2 * len(self.buffer)), dtype=LANDMARK_DTYPE)
+            buffer[: self.count] = self.rows
+            self.buffer = buffer
+
+        self.buffer[self.count : count] = np.zeros(1, dtype=LANDMARK_DTYPE)
+        self.buffer["map_coords"][self.count : count] = map_coords
+        self.buffer["colour"][self.count : count] = colours
+        self.count = count
+
+    def keep(self, order: np.ndarray):
+        """
+        Keep only some landmarks, in a new order
+        * param order: previous index of the landmark to put at each index, see LandmarkStore.remove
+        """
+        self.buffer[: len(order)] = self.rows[order]
+        self.count = len(order)
+
+    def update(self, indices: np.ndarray, map_coords: np.ndarray, covs: np.ndarray, colours: np.ndarray, frames: int):
+        """
+        Update the landmarks seen in a frame, each landmark at most once
+        A landmark is confirmed once seen in more than a number of frames with a small enough variance, and takes the
+        colour it was detected as most often, or big orange if it was often enough
+        * param indices: index of each seen landmark
+        * param map_coords: (N, 2) array of (x, y) of each landmark from the filter
+        * param covs: (N, 2, 2) array of the covariance of each landmark from the filter
+        * param colours: colour each landmark was detected as
+        * param frames: frames a landmark has to be seen in before being confirmed
+        """
+        rows = self.rows
+        rows["map_coords"][indices] = map_coords
+        rows["cov"][indices] = covs
+
+        frame_count = rows["frame_count"][indices] + 1
+        variance = np.abs(np.diagonal(covs, axis1=1, axis2=2))
+        rows["frame_count"][indices] = frame_count
+        rows["confirmed"][indices] |= (frame_count > frames) & np.all(variance < CONFIRM_VARIANCE, axis=1)
+
+        # detections of other colours don't vote
+        colours = np.asarray(colours)
+        votes = rows["votes"][indices] + (colours[:, np.newaxis] == VOTE_COLOURS)
+        rows["votes"][indices] = votes
+
+        yellow, blue, orange = votes.T
+        colour = rows["colour"][indices]
+        colour = np.where((yellow > blue) & (yellow > orange), Cone.YELLOW, colour)
+        colour = np.where((blue > yellow) & (blue > orange), Cone.BLUE, colour)
+        colour = np.where((orange > 10) | (orange > yellow) | (orange > blue), Cone.ORANGE_BIG, colour)
+        rows["colour"][indices] = colour
+
+    def get_local(self, pose: np.ndarray, x_range: tuple, y_range: tuple) -> np.ndarray:
+        """
+        Set the coordinates of every landmark relative to the car, and find the ones in view of it
+        * param pose: (x, y, theta) of the car
+        * param x_range: (min, max) distance in front of the car
+        * param y_range: (min, max) distance beside the car
+        * return: indices of the landmarks within both ranges
+        """
+        rows = self.rows
+        rotation_mat = np.array([[np.cos(pose[2]), -np.sin(pose[2])], [np.sin(pose[2]), np.cos(pose[2])]])
+        # inverse rotation of each row vector, v @ R is R.T @ v
+        local_coords = (rows["map_coords"] - pose[0:2]) @ rotation_mat
+        rows["local_coords"] = local_coords
+
+        in_view = (x_range[0] < local_coords[:, 0]) & (local_coords[:, 0] < x_range[1])
+        in_view &= (y_range[0] < local_coords[:, 1]) & (local_coords[:, 1] < y_range[1])
+        return np.flatnonzero(in_view)
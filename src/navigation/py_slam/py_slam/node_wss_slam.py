@@ -1,8 +1,7 @@
-from math import atan2, cos, hypot, pi, sin, sqrt
+from math import cos, pi, sin, sqrt
 import time
 
 import numpy as np
-from sklearn.neighbors import KDTree
 from tf2_ros import TransformBroadcaster
 from transforms3d.euler import euler2quat, quat2euler
 
@@ -11,20 +10,27 @@ import rclpy
 from rclpy.node import Node
 from rclpy.publisher import Publisher
 
-from driverless_msgs.msg import ConeDetectionStamped, ConeWithCovariance, Reset, TrackDetectionStamped, WSSVelocity
+from driverless_msgs.msg import ConeDetectionStamped, Reset, TrackDetectionStamped, WSSVelocity
 from geometry_msgs.msg import Point, PoseWithCovarianceStamped, Quaternion, TransformStamped, TwistStamped
+from std_msgs.msg import Header
 
+from driverless_common.conversions import cone_detection_msg, track_detection_msg
 from driverless_common.shutdown_node import ShutdownNode
-from py_slam.cone_props import ConeProps
+from py_slam import ekf
+from py_slam.cone_props import get_detections
+from py_slam.data_association import UNMATCHED, associate, transform_detections
+from py_slam.landmark_index import LandmarkIndex
+from py_slam.landmark_store import LandmarkStore
+from py_slam.landmark_table import LandmarkTable
 
 from typing import List, Optional
 
 R = np.diag([0.01, 0.01]) ** 2  # motion model
 Q_CAM = np.diag([0.5, 0.5]) ** 2  # measurement
 Q_LIDAR = np.diag([0.2, 0.2]) ** 2
-RADIUS_LIDAR = 1  # nn kdtree nearch
+RADIUS_LIDAR = 1  # association radius
 RADIUS_CAM = 1.8
-LEAF_SIZE = 5  # nodes per tree before it starts brute forcing?
+CELL_SIZE = max(RADIUS_LIDAR, RADIUS_CAM)  # landmark index cells, a radius query checks the 3x3 cells around it
 FRAME_COUNT = 10  # minimum frames before confirming cones
 FRAME_REM_COUNT = 25  # minimum frames that cones have to be seen in to not be removed
 
@@ -38,10 +44,6 @@ def wrap_to_pi(angle: float) -> float:  # in rads
 
 
 class PySlam(Node):
-    state = np.array([0.0, 0.0, 0.0])  # initial pose
-    sigma = np.diag([0.0, 0.0, 0.0])
-    properties = np.array([])
-
     last_timestamp: Optional[float] = None
 
     motor_vels: List[float] = [0.0, 0.0, 0.0, 0.0]
@@ -66,8 +68,21 @@ class PySlam(Node):
         # Initialize the transform broadcaster
         self.broadcaster = TransformBroadcaster(self)
 
+        # pose and landmarks of the EKF, and landmark positions for association
+        self.store = LandmarkStore(np.diag([0.0, 0.0, 0.0]))
+        self.table = LandmarkTable()  # properties of each landmark
+        self.landmarks = LandmarkIndex(CELL_SIZE)
+
         self.get_logger().info("---SLAM node initialised---")
 
+    @property
+    def state(self) -> np.ndarray:
+        return self.store.state
+
+    @property
+    def sigma(self) -> np.ndarray:
+        return self.store.sigma
+
     def velocity_callback(self, imu_msg: TwistStamped, wss_msg: WSSVelocity):
         if self.last_timestamp is None:
             self.last_timestamp = stamp_to_seconds(imu_msg.header.stamp)
@@ -95,81 +110,64 @@ class PySlam(Node):
 
     def reset_callback(self, msg):
         self.get_logger().info("Resetting Map")
-        self.state = np.array([0.0, 0.0, 0.0])
-        self.sigma = np.diag([0.5, 0.5, 0.001])
-        self.properties = np.array([])
+        self.store.reset(np.diag([0.5, 0.5, 0.001]))
+        self.table.clear()
+        self.landmarks.clear()
 
     def detection_callback(self, msg: ConeDetectionStamped, Q, RADIUS: float):
         # process detected cones
-        track_as_2d = np.array([])
-        for detection in msg.cones:
-            detection = ConeProps(detection, msg.header.frame_id)  # detection with properties
-
-            # transform detection to map
-            rotation_mat = np.array(
-                [
-                    [cos(self.state[2]), -sin(self.state[2])],
-                    [sin(self.state[2]), cos(self.state[2])],
-                ]
-            )
-            map_coords = rotation_mat @ np.array([detection.local_x, detection.local_y]).T + self.state[:2]
-
-            track_as_2d = np.array([])
-            for i in range(3, len(self.state), 2):
-                track_as_2d = np.append(track_as_2d, [self.state[i], self.state[i + 1]])
-
-            if len(track_as_2d) != 0:
-                neighbourhood = KDTree(track_as_2d.reshape(-1, 2), leaf_size=LEAF_SIZE)
-                check: np.ndarray = map_coords.reshape(1, -1)  # turn into a 2D row array
-                ind: np.ndarray = neighbourhood.query_radius(check, r=RADIUS)  # check neighbours in radius
-                close: np.ndarray = ind[0]  # index from the single colour list
-                if close.size != 0:
-                    # update step
-                    prev_mu = self.state[0:3]
-                    prev_sigma = self.sigma[0:3, 0:3]
-                    updated_detection: ConeProps = self.properties[close[0]]
-                    if detection.sensor == "lidar":
-                        self.update(close[0], detection, Q)
-                        updated_detection.sensor = "lidar"
-
-                    # reset car state if this isn't a confirmed cone
-                    # only update states on confirmed cones not noise
-                    if not updated_detection.confirmed:
-                        self.state[0:3] = prev_mu
-                        self.sigma[0:3, 0:3] = prev_sigma
-
-                    idx = close[0] * 2 + 3
-                    state = self.state[idx : idx + 2]
-                    cov = self.sigma[idx : idx + 2, idx : idx + 2]
-
-                    updated_detection.update(state, cov, detection.colour, FRAME_COUNT)
-                    detection = updated_detection
-
-            if not detection.tracked and msg.header.frame_id == "velodyne":
-                detection.set_world_coords(map_coords)
-                self.properties = np.append(self.properties, detection)
-                # initialise new landmark
-                self.init_landmark(detection, Q)
+        local_coords, measurements, colours = get_detections(msg.cones, msg.header.frame_id)
+
+        # transform detections to map, then match the whole frame to landmarks
+        map_coords = transform_detections(local_coords, self.state)
+        matches = associate(self.state, self.sigma, self.landmarks, map_coords, measurements, Q, RADIUS)
+        matched = np.flatnonzero(matches >= 0)
+
+        if msg.header.frame_id == "velodyne":
+            for detection in matched.tolist():
+                # update step
+                prev_mu = self.state[0:3].copy()
+                prev_sigma = self.sigma[0:3, 0:3].copy()
+                self.update(matches[detection], measurements[detection], Q)
+                self.landmarks.update(self.state[3:].reshape(-1, 2))  # the update moves correlated landmarks
+
+                # reset car state if this isn't a confirmed cone
+                # only update states on confirmed cones not noise
+                if not self.table.rows["confirmed"][matches[detection]]:
+                    self.state[0:3] = prev_mu
+                    self.sigma[0:3, 0:3] = prev_sigma
+
+        # landmark properties of the whole frame, each landmark is matched at most once
+        idxs = (matches[matched] * 2 + 3)[:, np.newaxis] + [0, 1]  # state indices of each landmark
+        landmark_coords = self.state[idxs]
+        landmark_covs = self.sigma[idxs[:, :, np.newaxis], idxs[:, np.newaxis, :]]
+        self.table.update(matches[matched], landmark_coords, landmark_covs, colours[matched], FRAME_COUNT)
+
+        if msg.header.frame_id == "velodyne":
+            # initialise new landmarks
+            new = np.flatnonzero(matches == UNMATCHED)
+            for detection in new.tolist():
+                self.init_landmark(map_coords[detection], measurements[detection], Q)
+                self.landmarks.add(map_coords[detection])
+            self.table.add(map_coords[new], colours[new])
 
         # remove noise
-        self.flush_map(track_as_2d.reshape(-1, 2))
+        self.flush_map()
 
         # publish track msg
-        track_msg = TrackDetectionStamped()
-        track_msg.header.stamp = msg.header.stamp
-        track_msg.header.frame_id = "track"
-        for detection in self.properties:
-            if detection.confirmed:
-                track_msg.cones.append(ConeWithCovariance(cone=detection.cone_as_msg, covariance=detection.cov_as_msg))
+        rows = self.table.rows
+        confirmed = rows[rows["confirmed"]]
+        track = np.column_stack((confirmed["map_coords"], confirmed["colour"]))
+        track_msg = track_detection_msg(track, confirmed["cov"], Header(stamp=msg.header.stamp, frame_id="track"))
         self.slam_publisher.publish(track_msg)
 
         # publish local map msg
-        local_map_msg = ConeDetectionStamped()
-        local_map_msg.header.stamp = msg.header.stamp
-        local_map_msg.header.frame_id = "car"
-        for detection in self.get_local_map(track_as_2d.reshape(-1, 2)):
-            if detection.confirmed:
-                local_map_msg.cones.append(detection.local_cone_as_msg)
+        local_map = rows[self.get_local_map()]
+        local_map = local_map[local_map["confirmed"]]
+        local_map_msg = cone_detection_msg(
+            np.column_stack((local_map["local_coords"], local_map["colour"])),
+            Header(stamp=msg.header.stamp, frame_id="car"),
+        )
         self.local_publisher.publish(local_map_msg)
 
         # publish localisation msg
@@ -225,129 +223,69 @@ class PySlam(Node):
         # uncertainty
         self.sigma[0:3, 0:3] = Jx @ self.sigma[0:3, 0:3] @ Jx.T + Ju @ R @ Ju.T
 
-    def update(self, index: int, detection: ConeProps, Q: np.ndarray):
+    def update(self, index: int, measurement: np.ndarray, Q: np.ndarray):
         """
-        Update step of the EKF
+        Update step of the EKF, see ekf.update
         * param index: index of the cone in the map
-        * param detection: ConeProps object containing the cone properties
+        * param measurement: (range, bearing) of the cone from the car
         * param Q: measurement noise covariance matrix for this sensor
         """
 
-        i = index * 2 + 3  # landmark index, first 3 are vehicle, each landmark has 2 values
-        mu_cone = self.state[i : i + 2]  # omit colour from location mean
-
-        r = hypot(self.state[0] - mu_cone[0], self.state[1] - mu_cone[1])  # range to landmark
-        b = wrap_to_pi(atan2(mu_cone[1] - self.state[1], mu_cone[0] - self.state[0]) - self.state[2])  # bearing to lm
-        h = [r, b]
-
-        sig_len = len(self.sigma)  # length of vehicle+landmarks we've seen so far
-
-        Gt = np.zeros((2, sig_len))
-        # vehicle jacobian
-        Gt[0:2, 0:3] = [
-            [-(mu_cone[0] - self.state[0]) / r, -(mu_cone[1] - self.state[1]) / r, 0],
-            [(mu_cone[1] - self.state[1]) / (r**2), -(mu_cone[0] - self.state[0]) / (r**2), 1],
-        ]
-        # landmark jacobian
-        Gt[0:2, i : i + 2] = [
-            [(mu_cone[0] - self.state[0]) / r, (mu_cone[1] - self.state[1]) / r],
-            [-(mu_cone[1] - self.state[1]) / (r**2), (mu_cone[0] - self.state[0]) / (r**2)],
-        ]
-
-        Kt = self.sigma @ Gt.T @ np.linalg.inv(Gt @ self.sigma @ Gt.T + Q)
+        ekf.update(self.state, self.sigma, index, measurement, Q)
 
-        # update state, wrap bearing to pi, wrap heading to pi
-        self.state = self.state + (Kt @ np.array([detection.range - h[0], wrap_to_pi(detection.bearing - h[1])])).T
-        self.state[2] = wrap_to_pi(self.state[2])
-        # update cov
-        self.sigma = (np.eye(sig_len) - Kt @ Gt) @ self.sigma
-
-    def init_landmark(self, detection: ConeProps, Q: np.ndarray):
+    def init_landmark(self, map_coords: np.ndarray, measurement: np.ndarray, Q: np.ndarray):
         """
         Add new landmark to state
-        * param detection: ConeProps object containing the cone properties
+        * param map_coords: (x, y) of the cone in the map
+        * param measurement: (range, bearing) of the cone from the car
         * param Q: measurement noise covariance matrix for this sensor
         """
-
-        self.state = np.append(self.state, detection.map_coords)  # append new landmark
+        r, b = measurement
 
         # landmark Jacobian
         Lz = np.array(
             [
-                [cos(self.state[2] + detection.bearing), detection.range * -sin(self.state[2] + detection.bearing)],
-                [sin(self.state[2] + detection.bearing), detection.range * cos(self.state[2] + detection.bearing)],
+                [cos(self.state[2] + b), r * -sin(self.state[2] + b)],
+                [sin(self.state[2] + b), r * cos(self.state[2] + b)],
             ]
         )
 
-        sig_len = len(self.sigma)
-        new_sig = np.zeros((sig_len + 2, sig_len + 2))  # create zeros
-        new_sig[0:sig_len, 0:sig_len] = self.sigma  # top left corner is existing sigma
-        new_sig[sig_len : sig_len + 2, sig_len : sig_len + 2] = Lz @ Q @ Lz.T  # bottom right is new lm
-        self.sigma = new_sig
+        self.store.add(map_coords, Lz @ Q @ Lz.T)  # append new landmark, uncorrelated
 
-    def flush_map(self, track_as_2d: np.ndarray):
+    def flush_map(self):
         """
         Remove landmarks not seen for a number of frames and only behind the car
-        * param track_as_2d: track as a 2d array
         """
 
-        if len(self.properties) == 0:
+        if len(self.table) == 0:
             return
         heading = np.array([cos(self.state[2]), sin(self.state[2])])
         position = np.array([self.state[0], self.state[1]])
 
         # get the landmark position vectors
         # if the landmark is behind car, the dot product will be negative
-        landmark_position_vectors = track_as_2d - position
-        dot_products = np.dot(landmark_position_vectors, heading)
-        behind_idxs = np.where(dot_products < 0)[0]
+        landmark_position_vectors = self.state[3:].reshape(-1, 2) - position
+        behind = np.dot(landmark_position_vectors, heading) < 0
 
-        # get indexes of landmarks that have been seen for a number of frames
-        noisy_idxs = np.array([i for i, cone in enumerate(self.properties) if cone.frame_count < FRAME_REM_COUNT])
+        # landmarks that haven't been seen for a number of frames
+        noisy = self.table.rows["frame_count"] < FRAME_REM_COUNT
 
         # remove noisy and behind landmarks
-        idxs_to_remove = np.concatenate((behind_idxs, noisy_idxs))
-        unique, count = np.unique(idxs_to_remove, return_counts=True)  # gets unique indexes
-        duplicated_idxs = unique[count > 1]  # only gets indexes that are duplicated (behind and noisy)
-
-        if len(duplicated_idxs) > 0:
-            self.state = np.delete(self.state, [duplicated_idxs * 2 + 3, duplicated_idxs * 2 + 4], axis=0)
-
-            self.sigma = np.delete(self.sigma, [duplicated_idxs * 2 + 3, duplicated_idxs * 2 + 4], axis=0)  # rows
-            self.sigma = np.delete(self.sigma, [duplicated_idxs * 2 + 3, duplicated_idxs * 2 + 4], axis=1)  # columns
+        idxs_to_remove = np.flatnonzero(behind & noisy)
 
-            self.properties = np.delete(self.properties, duplicated_idxs, axis=0)
+        if len(idxs_to_remove) > 0:
+            # the last landmarks are moved into the gaps, everything kept per landmark is reordered the same
+            order = self.store.remove(idxs_to_remove)
+            self.table.keep(order)
+            self.landmarks.keep(order)
 
-    def get_local_map(self, rotation_mat) -> np.ndarray:
+    def get_local_map(self) -> np.ndarray:
         """
-        Get cones within view of the car
-        * param rotation_mat: rotation matrix to rotate the map to the car's heading
-        * return: array of (x, y) of these cones
+        Get cones within view of the car, setting the local coordinates of every landmark
+        * return: indices of these cones in the map
         """
-        # transform detection to map
-        rotation_mat = np.array(
-            [
-                [cos(self.state[2]), -sin(self.state[2])],
-                [sin(self.state[2]), cos(self.state[2])],
-            ]
-        )
-
-        local_coords = np.array([])
-        for i in range(len(self.properties)):
-            local = np.linalg.inv(rotation_mat) @ (self.properties[i].map_coords - self.state[0:2])
-            local_coords = np.append(local_coords, [local])
-            self.properties[i].local_x = local[0]
-            self.properties[i].local_y = local[1]
-        local_coords = local_coords.reshape(-1, 2)
-
-        # get any cones that are within -10m to 10m beside car
-        side_idxs = np.where(np.logical_and(local_coords[:, 1] > -10, local_coords[:, 1] < 7.5))[0]
-        # get any cones that are within 15m in front of car
-        forward_idxs = np.where(np.logical_and(local_coords[:, 0] > 0, local_coords[:, 0] < 15))[0]
-        # combine indexes
-        idxs = np.intersect1d(side_idxs, forward_idxs)
-
-        return self.properties[idxs]
+        # get any cones that are within 0m to 15m in front of and -10m to 7.5m beside car
+        return self.table.get_local(self.state[0:3], (0, 15), (-10, 7.5))
 
 
 def main(args=None):
@@ -0,0 +1,91 @@
+"""Compares grouping object points on a grid against DBSCAN (op.cluster_points with --clusterer grid and dbscan)
+
+Usage:
+    python -m lidar_pipeline_3.benchmarks.clustering --data_path=<.npy, .npz, .bin file or directory>
+
+Each recorded frame is decoded and labelled by lidar_manager (polar front end), so the clusterers see the same
+object points as the node. For every frame, reports the runtime of each clusterer, the number of objects found
+and how closely the grid clusters agree with DBSCAN's (adjusted Rand index over object points, noise counts as
+one cluster).
+"""
+import sys
+import time
+
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+
+from .. import constants as const
+from ..library import lidar_manager
+from ..library import object_processor as op
+from ..library.point_cloud_buffer import PointCloudBuffer
+from ..library.stage_timer import StageTimer
+from ..replay import load_frames
+from ..utils import Config
+
+from typing import Optional
+
+
+def label_frame(config: Config, point_cloud: np.ndarray, buffer: PointCloudBuffer) -> Optional[dict]:
+    """Decodes and labels a point cloud through lidar_manager, as locate_cones does
+
+    Returns:
+        dict: The frame's arrays (see lidar_manager.label_points), None without object points
+    """
+    timer = StageTimer()
+    timer.start()
+
+    lidar_manager.decode_points(config, point_cloud, buffer)
+    return lidar_manager.label_points(config, buffer, timer)
+
+
+def time_call(function, *args) -> tuple:
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    config = Config()
+    config.update(args)
+    if config.front_end != "polar":
+        raise ValueError("The clusterers group the object points of the polar front end, use --front_end=polar")
+
+    print(
+        f"{'frame':>6} {'points':>7} {'dbscan_ms':>10} {'grid_ms':>8} {'dbscan_objs':>12} {'grid_objs':>10} {'ari':>6}"
+    )
+
+    buffer = PointCloudBuffer()
+    dbscan_times, grid_times, scores = [], [], []
+    for frame_idx, point_cloud in enumerate(load_frames(config.data_path)):
+        frame = label_frame(config, point_cloud, buffer)
+        if frame is None or frame["object_ind"].size < const.MIN_POINTS:
+            continue
+
+        x, y, z, object_ind = frame["x"], frame["y"], frame["z"], frame["object_ind"]
+        (_, dbscan_objects), dbscan_time = time_call(op.cluster_points, x, y, z, object_ind, "dbscan")
+        (_, grid_objects), grid_time = time_call(op.cluster_points, x, y, z, object_ind, "grid")
+
+        object_x, object_y = x[object_ind], y[object_ind]
+        score = adjusted_rand_score(op.get_dbscan_labels(object_x, object_y), op.get_grid_labels(object_x, object_y))
+
+        dbscan_times.append(dbscan_time)
+        grid_times.append(grid_time)
+        scores.append(score)
+        print(
+            f"{frame_idx:>6} {object_ind.size:>7} {dbscan_time * 1e3:>10.3f} {grid_time * 1e3:>8.3f} "
+            f"{dbscan_objects.size:>12} {grid_objects.size:>10} {score:>6.3f}"
+        )
+
+    if len(scores) == 0:
+        print(f"No frames with object points found in {config.data_path}")
+        return
+
+    print(
+        f"\n{len(scores)} frames | DBSCAN: {np.mean(dbscan_times) * 1e3:.3f}ms | "
+        f"Grid: {np.mean(grid_times) * 1e3:.3f}ms ({np.mean(dbscan_times) / np.mean(grid_times):.1f}x) | "
+        f"ARI mean: {np.mean(scores):.3f}, min: {np.min(scores):.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmarks lidar_manager.locate_cones on synthetic scans as the number of points grows
+
+Usage:
+    python -m lidar_pipeline_3.benchmarks.perception [--map=<maps/*.csv>] [--pose=x,y,yaw] [--slope=0.0]
+        [--noise=0.01] [--frames=10] [--front_end=polar|range_image]
+
+Scans are ray-cast over the map's cones (or a straight track without --map) at increasing point densities.
+For each density and front end (both unless --front_end is given), reports the throughput, the median time of
+each stage and the recall / precision of the detected cones against the cones in view. Each density is run with
+LIDAR_HORIZONTAL_RES scaled to match the scans, so the cone filter expects as many points per cone as they have.
+"""
+import getopt
+import sys
+import time
+
+import numpy as np
+
+from .. import constants as const
+from .. import synthetic
+from ..library import lidar_manager
+from ..library.point_cloud_buffer import PointCloudBuffer
+from ..library.stage_timer import STAGES, StageTimer
+from ..utils import Config
+
+# Approximate number of points per scan to benchmark
+POINT_COUNTS = (20_000, 50_000, 100_000, 200_000, 300_000)
+
+
+def run(config: Config, scans: list, expected: np.ndarray) -> dict:
+    """Runs every scan through locate_cones
+
+    Returns:
+        dict: Median stage and total times (ms), mean recall and precision over the scans
+    """
+    timer = StageTimer(history=len(scans))
+    buffer = PointCloudBuffer()
+    recalls, precisions = [], []
+    for point_cloud in scans:
+        start_time = time.perf_counter()
+        cone_centers = lidar_manager.locate_cones(config, point_cloud, start_time, timer=timer, buffer=buffer)
+        timer.record(total=int((time.perf_counter() - start_time) * 1e9))
+
+        recall, precision = synthetic.match_cones(np.asarray(cone_centers).reshape(-1, 3), expected)
+        recalls.append(recall)
+        precisions.append(precision)
+
+    results = {timing: values[0] for timing, values in timer.percentiles(q=(50,)).items()}
+    results["recall"] = np.mean(recalls)
+    results["precision"] = np.mean(precisions)
+    return results
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    opts, _ = getopt.getopt(args, "", ["map=", "pose=", "slope=", "noise=", "frames=", "front_end="])
+    opts = dict(opts)
+
+    cones = synthetic.load_map(opts["--map"]) if "--map" in opts else synthetic.straight_track()
+    pose = tuple(float(value) for value in opts.get("--pose", "0,0,0").split(","))
+    slope = float(opts.get("--slope", 0.0))
+    noise = float(opts.get("--noise", 0.01))
+    frames = int(opts.get("--frames", 10))
+    front_ends = (opts["--front_end"],) if "--front_end" in opts else const.FRONT_ENDS
+
+    configs = {}
+    for front_end in front_ends:
+        configs[front_end] = Config()
+        configs[front_end].front_end = front_end
+    expected = synthetic.visible_cones(cones, pose)
+
+    # Points per scan grow linearly with density
+    base_count = synthetic.generate_scan(cones, pose, slope, noise).shape[0]
+
+    print(f"{expected.shape[0]} cones in view | slope: {slope} | noise: {noise}m | {frames} frames per density\n")
+    print(
+        f"{'points':>7} {'front end':>11} {'hz':>7} "
+        + " ".join(f"{stage[:8]:>8}" for stage in STAGES)
+        + f" {'total':>8} {'recall':>6} {'prec':>6}"
+    )
+
+    # Warm up caches and the ground plane kernels
+    for config in configs.values():
+        run(config, [synthetic.generate_scan(cones, pose, slope, noise)], expected)
+
+    for point_count in POINT_COUNTS:
+        density = point_count / base_count
+        scans = [synthetic.generate_scan(cones, pose, slope, noise, density, seed) for seed in range(frames)]
+        for front_end, config in configs.items():
+            with const.override(LIDAR_HORIZONTAL_RES=const.LIDAR_HORIZONTAL_RES / density):
+                results = run(config, scans, expected)
+
+            print(
+                f"{int(np.mean([scan.shape[0] for scan in scans])):>7} {front_end:>11} {1000 / results['total']:>7.2f} "
+                + " ".join(f"{results[stage]:>8.3f}" for stage in STAGES)
+                + f" {results['total']:>8.3f} {results['recall']:>6.2f} {results['precision']:>6.2f}"
+            )
+    print("\nStage times are medians in ms")
+
+
+if __name__ == "__main__":
+    main()
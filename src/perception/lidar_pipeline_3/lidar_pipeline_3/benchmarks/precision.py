@@ -0,0 +1,173 @@
+"""Checks the pipeline in single precision (float32 / int32) against double precision (float64 / int64)
+
+Usage:
+    python -m lidar_pipeline_3.benchmarks.precision [--data_path=<recording>] [--map=<maps/*.csv>]
+        [--pose=x,y,yaw] [--slope=0.0] [--noise=0.01] [--frames=10] [--clusterer=grid|dbscan]
+        [--tolerance=0.01] [--label_tolerance=0.001]
+
+Runs every frame through the polar front end with const.PRECISION "single" and "double". Frames are synthetic
+scans of the map's cones (or a straight track without --map), or the first frames of a recording from
+--data_path. For each precision, reports the median frame time and the bytes of the arrays computed for a frame.
+
+Passes when every frame detects the same number of cones in both precisions, each cone is within --tolerance
+(metres) of its double precision counterpart, and at most --label_tolerance of points are labelled differently.
+Exits with status 1 otherwise.
+"""
+import getopt
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from .. import constants as const
+from .. import replay, synthetic
+from ..library import lidar_manager
+from ..library.point_cloud_buffer import PointCloudBuffer
+from ..library.stage_timer import StageTimer
+from ..utils import Config
+
+from typing import List, Optional, Tuple
+
+
+def run_frame(config: Config, point_cloud: np.ndarray, buffer: PointCloudBuffer) -> Tuple[Optional[dict], float]:
+    """Runs a frame through decoding, labelling and cone detection at the current precision
+
+    Returns:
+        tuple: The frame's arrays (see lidar_manager.label_points), None without object points, and its time (ms)
+    """
+    timer = StageTimer()
+    start_time = time.perf_counter()
+    timer.start()
+
+    lidar_manager.decode_points(config, point_cloud, buffer)
+    frame = lidar_manager.label_points(config, buffer, timer)
+    if frame is not None:
+        lidar_manager.detect_cones(config, frame, timer)
+
+    return frame, (time.perf_counter() - start_time) * 1000
+
+
+def frame_bytes(frame: Optional[dict]) -> int:
+    """
+    Returns:
+        int: Bytes of every array computed for the frame, not counting lists of arrays
+    """
+    if frame is None:
+        return 0
+
+    return sum(value.nbytes for value in frame.values() if isinstance(value, np.ndarray) and value.dtype != object)
+
+
+def compare_frames(single: Optional[dict], double: Optional[dict]) -> Tuple[int, float, float]:
+    """
+    Returns:
+        tuple: Difference in the number of cones detected, the largest distance between a single precision cone
+            and the closest double precision cone (m) and the fraction of points labelled differently
+    """
+    single_cones = np.empty((0, 3)) if single is None else np.asarray(single["cone_centers"]).reshape(-1, 3)
+    double_cones = np.empty((0, 3)) if double is None else np.asarray(double["cone_centers"]).reshape(-1, 3)
+
+    cone_difference = abs(single_cones.shape[0] - double_cones.shape[0])
+    max_distance = 0.0
+    if single_cones.shape[0] > 0 and double_cones.shape[0] > 0:
+        distances = np.linalg.norm(
+            single_cones[:, np.newaxis, :2].astype(float) - double_cones[np.newaxis, :, :2], axis=2
+        )
+        max_distance = float(distances.min(axis=1).max())
+
+    # Filtering in either precision can keep a different number of points right at LIDAR_RANGE
+    if single is None or double is None:
+        label_difference = 0.0 if single is double else 1.0
+    elif single["point_labels"].size != double["point_labels"].size:
+        label_difference = 1.0
+    else:
+        label_difference = float(np.mean(single["point_labels"] != double["point_labels"]))
+
+    return cone_difference, max_distance, label_difference
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    opts, _ = getopt.getopt(
+        args,
+        "",
+        [
+            "data_path=",
+            "map=",
+            "pose=",
+            "slope=",
+            "noise=",
+            "frames=",
+            "clusterer=",
+            "tolerance=",
+            "label_tolerance=",
+        ],
+    )
+    opts = dict(opts)
+
+    frame_count = int(opts.get("--frames", 10))
+    tolerance = float(opts.get("--tolerance", 0.01))
+    label_tolerance = float(opts.get("--label_tolerance", 0.001))
+
+    config = Config()
+    config.clusterer = opts.get("--clusterer", config.clusterer)
+
+    if "--data_path" in opts:
+        frames = list(itertools.islice(replay.load_frames(opts["--data_path"]), frame_count))
+        source = opts["--data_path"]
+    else:
+        cones = synthetic.load_map(opts["--map"]) if "--map" in opts else synthetic.straight_track()
+        pose = tuple(float(value) for value in opts.get("--pose", "0,0,0").split(","))
+        slope = float(opts.get("--slope", 0.0))
+        noise = float(opts.get("--noise", 0.01))
+        frames = [synthetic.generate_scan(cones, pose, slope, noise, 1.0, seed) for seed in range(frame_count)]
+        source = f"synthetic scans | slope: {slope} | noise: {noise}m"
+    print(f"{source}\n{len(frames)} frames | clusterer: {config.clusterer}\n")
+
+    with const.override(PRECISION="single"):
+        single_buffer = PointCloudBuffer()
+    with const.override(PRECISION="double"):
+        double_buffer = PointCloudBuffer()
+
+    # Warm up caches in both precisions
+    with const.override(PRECISION="single"):
+        run_frame(config, frames[0], single_buffer)
+    with const.override(PRECISION="double"):
+        run_frame(config, frames[0], double_buffer)
+
+    times = {"single": [], "double": []}
+    sizes = {"single": [], "double": []}
+    results: List[Tuple[int, float, float]] = []
+    for point_cloud in frames:
+        with const.override(PRECISION="double"):
+            double, double_time = run_frame(config, point_cloud, double_buffer)
+        with const.override(PRECISION="single"):
+            single, single_time = run_frame(config, point_cloud, single_buffer)
+
+        times["double"].append(double_time)
+        times["single"].append(single_time)
+        sizes["double"].append(frame_bytes(double))
+        sizes["single"].append(frame_bytes(single))
+        results.append(compare_frames(single, double))
+
+    print(f"{'precision':>9} {'total':>8} {'frame MB':>9}")
+    for precision in ("double", "single"):
+        print(f"{precision:>9} {np.median(times[precision]):>8.3f} {np.median(sizes[precision]) / 1e6:>9.2f}")
+
+    cone_differences, max_distances, label_differences = (np.array(values) for values in zip(*results))
+    print(
+        f"\nCone count differences: {int(cone_differences.sum())} | largest cone offset: {max_distances.max():.2e}m"
+        f" | points labelled differently: {label_differences.max():.2e}"
+    )
+    print("Frame times are medians in ms")
+
+    passed = (
+        cone_differences.sum() == 0 and max_distances.max() <= tolerance and label_differences.max() <= label_tolerance
+    )
+    print("PASS" if passed else "FAIL")
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
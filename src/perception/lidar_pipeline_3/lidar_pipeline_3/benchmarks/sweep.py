@@ -0,0 +1,210 @@
+"""Sweeps pipeline parameters to trade throughput off against detection recall
+
+Usage:
+    python -m lidar_pipeline_3.benchmarks.sweep [--data_path=<recording>] [--map=<maps/*.csv>] [--pose=x,y,yaw]
+        [--slope=0.0] [--noise=0.01] [--density=1.0] [--frames=10] [--processes=N]
+        [--front_end=polar|range_image] [--clusterer=grid|dbscan] [--<PARAMETER>=value,value,...]
+
+Runs locate_cones over every frame for each combination of the swept parameters (SWEEP, or the values given on
+the command line, e.g. --T_RMSE=0.1,0.2), spread across a pool of processes. Frames are synthetic scans of the
+map's cones (or a straight track without --map), or the first frames of a recording from --data_path, in which
+case recall is measured against the cones detected with the default parameters.
+
+Objects are grouped by grid cells with the grid clusterer and within EPSILON of each other otherwise, so only
+the one of GRID_CELL_SIZE and EPSILON in use is swept (CLUSTERING_SWEEP).
+
+Prints the Pareto front of throughput against recall, the combinations that no other combination beats on both.
+Runs share the CPU with each other, so throughput is only comparable between combinations of the same sweep.
+"""
+import getopt
+import itertools
+import math
+import multiprocessing as mp
+import sys
+import time
+
+import numpy as np
+
+from .. import constants as const
+from .. import replay, synthetic
+from ..library import lidar_manager
+from ..library.point_cloud_buffer import PointCloudBuffer
+from ..library.stage_timer import StageTimer
+from ..utils import Config
+
+from typing import Dict, List, Tuple
+
+# Values of each parameter swept by default, including the default value of each
+SWEEP = {
+    "T_D_GROUND": (0.1, 0.125, 0.15),
+    "MIN_POINTS": (2, 3),
+    "BIN_SIZE": (0.1, 0.14, 0.2),
+    "DELTA_ALPHA": ((2 * math.pi) / 96, (2 * math.pi) / 128, (2 * math.pi) / 192),
+    "T_RMSE": (0.1, 0.2, 0.4),
+}
+
+# Values of the parameter that sizes the neighbourhoods objects are grouped in, see clustering_parameter
+CLUSTERING_SWEEP = {
+    "GRID_CELL_SIZE": (0.2, 0.3, 0.4),
+    "EPSILON": (0.4, 0.6, 0.8),
+}
+
+
+def clustering_parameter(config: Config) -> str:
+    """
+    Returns:
+        str: The CLUSTERING_SWEEP parameter used by the config's front end and clusterer, the range image front end
+            always groups pixels within EPSILON
+    """
+    if config.front_end == "polar" and config.clusterer == "grid":
+        return "GRID_CELL_SIZE"
+
+    return "EPSILON"
+
+
+def run(config: Config, frames: List[np.ndarray], expected: List[np.ndarray]) -> dict:
+    """Runs every frame through locate_cones with the current parameters
+
+    Returns:
+        dict: Median frame time (ms), mean recall and precision over the frames
+    """
+    timer = StageTimer(history=len(frames))
+    buffer = PointCloudBuffer()
+    recalls, precisions = [], []
+    for point_cloud, frame_expected in zip(frames, expected):
+        start_time = time.perf_counter()
+        cone_centers = lidar_manager.locate_cones(config, point_cloud, start_time, timer=timer, buffer=buffer)
+        timer.record(total=int((time.perf_counter() - start_time) * 1e9))
+
+        recall, precision = synthetic.match_cones(np.asarray(cone_centers).reshape(-1, 3), frame_expected)
+        recalls.append(recall)
+        precisions.append(precision)
+
+    return {
+        "total": timer.percentiles(q=(50,))["total"][0],
+        "recall": np.mean(recalls),
+        "precision": np.mean(precisions),
+    }
+
+
+def pareto_front(results: List[Tuple[dict, dict]]) -> List[Tuple[dict, dict]]:
+    """
+    Returns:
+        list: (parameters, results) of the combinations that no other combination is both faster than and has
+            higher recall than, fastest first
+    """
+    front = []
+    for parameters, result in sorted(results, key=lambda item: (item[1]["total"], -item[1]["recall"])):
+        if not front or result["recall"] > front[-1][1]["recall"]:
+            front.append((parameters, result))
+
+    return front
+
+
+# Each worker process holds its own copy of the config and frames
+_worker_config: Config = None
+_worker_frames: List[np.ndarray] = None
+_worker_expected: List[np.ndarray] = None
+
+
+def _init_worker(config: Config, frames: List[np.ndarray], expected: List[np.ndarray]) -> None:
+    global _worker_config, _worker_frames, _worker_expected
+    _worker_config = config
+    _worker_frames = frames
+    _worker_expected = expected
+
+    # Warm up caches and the ground plane kernels
+    run(config, frames[:1], expected[:1])
+
+
+def _run_worker(parameters: dict) -> Tuple[dict, dict]:
+    with const.override(**parameters):
+        return parameters, run(_worker_config, _worker_frames, _worker_expected)
+
+
+def main(args: list = sys.argv[1:]) -> None:
+    opts, _ = getopt.getopt(
+        args,
+        "",
+        [
+            "data_path=",
+            "map=",
+            "pose=",
+            "slope=",
+            "noise=",
+            "density=",
+            "frames=",
+            "processes=",
+            "front_end=",
+            "clusterer=",
+            *[f"{name}=" for name in (*SWEEP, *CLUSTERING_SWEEP)],
+        ],
+    )
+    opts = dict(opts)
+
+    frame_count = int(opts.get("--frames", 10))
+    processes = int(opts.get("--processes", max(1, math.floor(mp.cpu_count() * const.CPU_UTILISATION))))
+
+    config = Config()
+    config.front_end = opts.get("--front_end", config.front_end)
+    config.clusterer = opts.get("--clusterer", config.clusterer)
+
+    clustering = clustering_parameter(config)
+    for name in CLUSTERING_SWEEP:
+        if name != clustering and f"--{name}" in opts:
+            raise ValueError(
+                f"{name} is not used with the {config.front_end} front end and {config.clusterer} clusterer"
+            )
+
+    # Values given on the command line replace the default values of a parameter
+    sweep: Dict[str, tuple] = {}
+    for name, values in {**SWEEP, clustering: CLUSTERING_SWEEP[clustering]}.items():
+        if f"--{name}" in opts:
+            values = tuple(type(getattr(const, name))(value) for value in opts[f"--{name}"].split(","))
+        sweep[name] = values
+
+    if "--data_path" in opts:
+        frames = list(itertools.islice(replay.load_frames(opts["--data_path"]), frame_count))
+        buffer = PointCloudBuffer()
+        expected = [
+            np.asarray(lidar_manager.locate_cones(config, frame, time.perf_counter(), buffer=buffer)).reshape(-1, 3)
+            for frame in frames
+        ]
+        source = f"{opts['--data_path']} (recall against the default parameters)"
+    else:
+        cones = synthetic.load_map(opts["--map"]) if "--map" in opts else synthetic.straight_track()
+        pose = tuple(float(value) for value in opts.get("--pose", "0,0,0").split(","))
+        slope = float(opts.get("--slope", 0.0))
+        noise = float(opts.get("--noise", 0.01))
+        density = float(opts.get("--density", 1.0))
+        frames = [synthetic.generate_scan(cones, pose, slope, noise, density, seed) for seed in range(frame_count)]
+        expected = [synthetic.visible_cones(cones, pose)] * frame_count
+        source = f"synthetic scans | slope: {slope} | noise: {noise}m | density: {density}"
+
+    combinations = [dict(zip(sweep, values)) for values in itertools.product(*sweep.values())]
+    print(f"{source}\n{len(frames)} frames | {len(combinations)} combinations | {processes} processes\n")
+
+    with mp.Pool(processes, initializer=_init_worker, initargs=(config, frames, expected)) as pool:
+        results = list(pool.imap_unordered(_run_worker, combinations))
+
+    print(" ".join(f"{name[:11]:>11}" for name in sweep) + f" {'hz':>7} {'total':>8} {'recall':>6} {'prec':>6}")
+    defaults = {name: getattr(const, name) for name in sweep}
+    for parameters, result in pareto_front(results):
+        print(
+            " ".join(f"{parameters[name]:>11.4g}" for name in sweep)
+            + f" {1000 / result['total']:>7.2f} {result['total']:>8.3f}"
+            + f" {result['recall']:>6.2f} {result['precision']:>6.2f}"
+            + (" (defaults)" if parameters == defaults else "")
+        )
+
+    for parameters, result in results:
+        if parameters == defaults:
+            print(
+                f"\nDefaults: {1000 / result['total']:.2f} Hz | {result['total']:.3f}ms"
+                f" | recall: {result['recall']:.2f} | precision: {result['precision']:.2f}"
+            )
+    print("Frame times are medians in ms")
+
+
+if __name__ == "__main__":
+    main()
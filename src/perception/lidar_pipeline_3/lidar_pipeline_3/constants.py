@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from enum import Enum
 import math
 import pathlib
@@ -11,7 +12,9 @@ VIDEOS_DIR: str = "videos"
 # Algorithm Parameters
 LIDAR_RANGE = 25  # Max range of points to process (metres)
 DELTA_ALPHA = (2 * math.pi) / 128  # Delta angle of segments
-BIN_SIZE = 0.14  # Size of bins
+BIN_SIZE = 0.14  # Size of bins (the nearest bins, if ADAPTIVE_BINS)
+ADAPTIVE_BINS = False  # Grow bins with range to the vertical spacing of the rings, rather than BIN_SIZE everywhere
+BIN_RESOLUTION = 0.01  # Bin edges are rounded to this, so bins can be looked up from a table (metres)
 T_M = 2 * math.pi / 148  # (2 * math.pi) / (152*2)           # Max angle that will be considered for ground lines
 T_M_SMALL = 0  # Angle considered to be a small slope
 T_B = 0.05  # Max y-intercept for a ground plane line
@@ -20,8 +23,18 @@ REGRESS_BETWEEN_BINS = True  # Determines if regression for ground lines should
 # neighbouring bins when they're described by different lines
 T_D_GROUND = 0.125  # 0.15 # Maximum distance between point and line to be considered part of ground plane # tune this
 # changed from 0.1, ^^ also, the higher this value, the more low object points it will mark as ground BUT this makes dbscan faster
+T_RMSE_TEMPORAL = 0.05  # Max RMSE of prototype points about last frame's ground lines to reuse the lines
+T_COVERAGE_TEMPORAL = 0.8  # Min fraction of a segment's prototype points along last frame's lines to reuse them
 T_D_MAX = 100  # Maximum distance a point can be from the origin to even be considered as
 # a ground point. Otherwise it's labelled as a non-ground point.
+CLUSTERERS = ("grid", "dbscan")  # Methods for grouping object points (--clusterer)
+EPSILON = 0.6  # DBSCAN Neighbourhood Scan Size 0.1: +0Hz, 0.5: -2Hz, 1 -3Hz:
+MIN_POINTS = 2  # Number of points required to form a neighbourhood / object
+GRID_CELL_SIZE = 0.3  # Size of grid cells when grouping object points, points in touching cells are grouped
+FRONT_ENDS = ("polar", "range_image")  # Ground removal and clustering over segments and bins, or a range image
+T_ALPHA_GROUND = math.pi / 4  # Max angle from the last ground point in a column of the range image to a ground point
+PRECISIONS = ("single", "double")  # float32 and int32 arrays of points, or float64 and int64 to check against
+PRECISION = "double"
 CPU_UTILISATION = 0.90  # Percentage of CPU Cores to use for multiprocessing ground plane mapping (0.0 - 1.0)
 CONE_DIAM = 0.15
 CONE_WIDTH = 0.075
@@ -34,14 +47,87 @@ LIDAR_HORIZONTAL_RES = 0.05 * (math.pi / 180)  # NEW
 HACH_LOWER_ERR = 0.3  # 0.087 - 0.3 < 0 so min bound should probably just be zero lol
 HACH_UPPER_ERR = CONE_HEIGHT  # - 0.025
 
-# Derived Parameters
-SEGMENT_COUNT = math.ceil(2 * math.pi / DELTA_ALPHA)
-BIN_COUNT = math.ceil(LIDAR_RANGE / BIN_SIZE)
-HALF_AREA_CONE_HEIGHT = CONE_HEIGHT * (2 - math.sqrt(2)) / 2  # 0.08787
+# Diagnostics
+TIMING_HISTORY = 600  # Frames of stage timings kept to compute percentiles
+DIAGNOSTICS_PERIOD = 1.0  # Seconds between publishing stage timings on /diagnostics
+LATENCY_BUDGET_MS = 100  # Frame time (p99) above which diagnostics report a warning
+
+# Figures
+FIGURE_PROCESSES = 2  # Processes rendering figures in the background with --create_figures
+FIGURE_QUEUE_SIZE = 4  # Frames waiting to be rendered, frames that arrive while this many are waiting are dropped
+VIDEO_FPS = 10  # Frame rate of videos of figures
+VIDEO_DPI_SCALE = 0.5  # Resolution of video frames relative to saved figures
+
+
+# Start of each bin, bins are BIN_SIZE wide until range * growth is wider
+def get_bin_edges(bin_size, growth, max_range, resolution):
+    edges = [0.0]
+    while edges[-1] < max_range:
+        width = max(bin_size, growth * edges[-1])
+        edges.append(round((edges[-1] + width) / resolution) * resolution)
+
+    return edges[:-1]
+
+
+# Derived Parameters, recomputed whenever the parameters above are overridden
+def derive_parameters():
+    global SEGMENT_COUNT, BIN_GROWTH, BIN_EDGES, BIN_COUNT, HALF_AREA_CONE_HEIGHT, NUMER, DENOM
+    global FLOAT_DTYPE, INT_DTYPE
+
+    SEGMENT_COUNT = math.ceil(2 * math.pi / DELTA_ALPHA)
+    BIN_GROWTH = math.tan(LIDAR_VERTICAL_RES) if ADAPTIVE_BINS else 0  # Ring spacing on a vertical surface per metre
+    BIN_EDGES = get_bin_edges(BIN_SIZE, BIN_GROWTH, LIDAR_RANGE, BIN_RESOLUTION)
+    BIN_COUNT = len(BIN_EDGES)
+    HALF_AREA_CONE_HEIGHT = CONE_HEIGHT * (2 - math.sqrt(2)) / 2  # 0.08787
+
+    # Expected number of points on a cone at a given distance
+    NUMER = CONE_HEIGHT * CONE_DIAM
+    DENOM = 8 * math.tan(LIDAR_VERTICAL_RES / 2) * math.tan(LIDAR_HORIZONTAL_RES / 2)
+
+    # Types of point arrays, segment and bin indices
+    if PRECISION not in PRECISIONS:
+        raise ValueError(f"Invalid precision: {PRECISION}")
+    FLOAT_DTYPE, INT_DTYPE = ("float32", "int32") if PRECISION == "single" else ("float64", "int64")
+
+
+derive_parameters()
+
+
+def get_parameters():
+    """Current values of the parameters of this module, e.g. to pass to processes that import it afresh"""
+    return {
+        name: value
+        for name, value in globals().items()
+        if name.isupper() and isinstance(value, (bool, int, float, str, tuple))
+    }
+
+
+def set_parameters(**parameters):
+    """Replaces parameters of this module for the rest of the process, and recomputes the derived parameters"""
+    module = globals()
+    for name in parameters:
+        if name not in module or not name.isupper():
+            raise ValueError(f"Invalid parameter: {name}")
+
+    module.update(parameters)
+    derive_parameters()
+
+
+@contextmanager
+def override(**parameters):
+    """Replaces parameters of this module while in the context, e.g. with override(EPSILON=0.5, T_RMSE=0.3):
+
+    The pipeline reads parameters from this module each time they are used, so runs inside the context use the
+    new values. Not thread safe, the parameters are changed for the whole process.
+    """
+    module = globals()
+    previous = {name: module[name] for name in parameters if name in module}
+    try:
+        set_parameters(**parameters)
+        yield
+    finally:
+        set_parameters(**previous)
 
-# Expected number of points on a cone at a given distance
-NUMER = CONE_HEIGHT * CONE_DIAM
-DENOM = 8 * math.tan(LIDAR_VERTICAL_RES / 2) * math.tan(LIDAR_HORIZONTAL_RES / 2)
 
 # Visualiser
 # Default Values
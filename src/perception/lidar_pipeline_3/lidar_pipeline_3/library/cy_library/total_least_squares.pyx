@@ -1,202 +1,134 @@
 # Modules
 cimport libc.math as math
-import sys
+import numpy as np
 
 
-# Point Wise Variance
-cdef float get_point_var(int x, int y, float x_mean, float y_mean):
-    # point_x_var = (x - x_mean)**2
-    # point_y_var = (y - y_mean)**2
-    # return (point_x_var + point_y_var) / 2
-    return 1.0
+# Total Least Squares fit of a line from its sufficient statistics
+# Returns the gradient, intercept and RMSE of the line
+cdef tuple fit_sums(
+    int n, double sum_x, double sum_y, double sum_xx, double sum_yy, double sum_xy, double y_first, double y_last
+):
+    # Point wise weights are all 1 (see note 1), so the weighted means are the means
+    cdef double x_mean = sum_x / n
+    cdef double y_mean = sum_y / n
 
+    cdef double cov_xx = sum_xx - sum_x * x_mean
+    cdef double cov_yy = sum_yy - sum_y * y_mean
+    cdef double cov_xy = sum_xy - sum_x * y_mean
 
-# Unused
-# Sample Variances
-cdef get_sample_vars(points, float x_mean, float y_mean, int num_points):
-    cdef float x_sample_var = 0
-    cdef float y_sample_var = 0
-    cdef int i
-
-    for i in range(num_points):
-        x_sample_var += (points[i][0] - x_mean)**2
-        y_sample_var += (points[i][1] - y_mean)**2
-
-    x_sample_var = x_sample_var / (num_points - 1)
-    y_sample_var = y_sample_var / (num_points - 1)
-
-    return [x_sample_var, y_sample_var]
-
-
-# Theta
-cdef float get_theta(float x, float y):
-    if x == 0:
-        x = sys.maxsize
-
-    cdef float theta = math.atan(y / x)
-    return theta
-
-
-# Theta Vector
-cdef get_theta_vector(points, int num_points):
-    theta_mat = []
-    cdef int i
-
-    for i in range(num_points):
-        theta_mat.append(get_theta(points[i][0], points[i][1]))
-
-    return theta_mat
-
-
-# Rho
-cdef get_rho(float x, float y):
-    rho = math.sqrt(x**2 + y**2)
-    return rho
-
-
-# Rho Vector
-cdef get_rho_vector(points, int num_points):
-    rho_mat = []
-    cdef int i
-
-    for i in range(num_points):
-        rho_mat.append(get_rho(points[i][0], points[i][1]))
-
-    return rho_mat
-
-
-# Weights, W
-cdef get_weights(points, int num_points, float x_mean, float y_mean):
-    w_mat = []
-    cdef int i
-
-    for i in range(num_points):
-        w_mat.append(get_point_var(points[i][0], points[i][1], x_mean, y_mean))
-
-    return w_mat
-
-
-# x_w
-cdef float get_x_weight(w_mat, rho_mat, theta_mat, w_sum, int num_points):
-    cdef float x_weight = 0
-    cdef int i
-
-    for i in range(num_points):
-        x_weight += w_mat[i] * rho_mat[i] * math.cos(theta_mat[i])
-
-    x_weight = (1/w_sum) * x_weight
-    return x_weight
-
-
-# y_w
-cdef float get_y_weight(w_mat, rho_mat, theta_mat, w_sum, int num_points):
-    cdef float y_weight = 0
-    cdef int i
-
-    for i in range(num_points):
-        y_weight += w_mat[i] * rho_mat[i] * math.sin(theta_mat[i])
-
-    y_weight = (1/w_sum) * y_weight
-    return y_weight
-
-
-# alpha, rearrange (4) to get alpha
-cdef float get_alpha(points, int num_points, w_mat, float x_weight, float y_weight):
-    cdef float numerator = 0
-    cdef float denominator = 0
-    cdef int i
-
-    for i in range(num_points):
-        numerator += w_mat[i] * (y_weight - points[i][1]) * (x_weight - points[i][0])
-        denominator += w_mat[i] * ((y_weight - points[i][1])**2 - (x_weight - points[i][0])**2)
-
-    numerator = -2 * numerator
-    cdef float tan_2_alpha = numerator / denominator
+    # alpha, rearrange (4) to get alpha
+    cdef double tan_2_alpha = -2 * cov_xy / (cov_yy - cov_xx)
 
     # - Custom Code -
     # If the difference in height between first and last point is negative,
     # then make tan_2_alpha negative. Otherwise, positive.
-    cdef float y_delta = points[0][1] - points[num_points - 1][1]
-    if y_delta >= 0:
-        tan_2_alpha = -abs(tan_2_alpha)
+    if y_first - y_last >= 0:
+        tan_2_alpha = -math.fabs(tan_2_alpha)
     else:
-        tan_2_alpha = abs(tan_2_alpha)
-
-    cdef float alpha = math.atan(tan_2_alpha) / 2
-    return alpha
+        tan_2_alpha = math.fabs(tan_2_alpha)
 
+    cdef double alpha = math.atan(tan_2_alpha) / 2
 
-# r
-cdef float get_r(float x_weight, float y_weight, float alpha):
-    cdef float r = x_weight * math.cos(alpha) + y_weight * math.sin(alpha)
-    return r
-
-
-# Gradient, m
-cdef float get_m(float alpha, float y_weight):
-    cdef float m = math.tan(alpha)
-    return m
-
-
-# Intercept, b
-cdef get_b(points, int num_points, float r, float alpha, float m):
-    cdef float b = 0
-    cdef int i
+    # r
+    cdef double r = x_mean * math.cos(alpha) + y_mean * math.sin(alpha)
+    if r < 0:
+        alpha += math.pi / 2
+
+    # Gradient, m and intercept, b
+    cdef double m = math.tan(alpha)
+    cdef double b = y_mean - m * x_mean
+
+    # Sum of squared residuals about the line, from the same statistics
+    cdef double sse = m * m * cov_xx - 2 * m * cov_xy + cov_yy
+    cdef double rmse = math.sqrt(sse / n) if sse > 0 else 0.0
+
+    return (m, b, rmse)
+
+
+# Running sums of the points in a line, so points can be added and removed in O(1)
+cdef class LineStats:
+    cdef public int n
+    cdef double sum_x, sum_y, sum_xx, sum_yy, sum_xy
+
+    def __init__(self):
+        self.clear()
+
+    cpdef void add(self, double x, double y):
+        self.n += 1
+        self.sum_x += x
+        self.sum_y += y
+        self.sum_xx += x * x
+        self.sum_yy += y * y
+        self.sum_xy += x * y
+
+    cpdef void remove(self, double x, double y):
+        self.n -= 1
+        self.sum_x -= x
+        self.sum_y -= y
+        self.sum_xx -= x * x
+        self.sum_yy -= y * y
+        self.sum_xy -= x * y
+
+    cpdef void clear(self):
+        self.n = 0
+        self.sum_x = 0
+        self.sum_y = 0
+        self.sum_xx = 0
+        self.sum_yy = 0
+        self.sum_xy = 0
+
+    # y_first and y_last are the heights of the first and last point, which set the sign of the gradient
+    cpdef tuple fit(self, double y_first, double y_last):
+        return fit_sums(self.n, self.sum_x, self.sum_y, self.sum_xx, self.sum_yy, self.sum_xy, y_first, y_last)
+
+
+# Total Least Squares fit of an (N, 2) array of points
+cpdef tuple fit_points(const double[:, ::1] points):
+    cdef Py_ssize_t num_points = points.shape[0]
+    cdef double sum_x = 0
+    cdef double sum_y = 0
+    cdef double sum_xx = 0
+    cdef double sum_yy = 0
+    cdef double sum_xy = 0
+    cdef double x, y
+    cdef Py_ssize_t i
 
     for i in range(num_points):
-        b += points[i][1] - m * points[i][0]
+        x = points[i, 0]
+        y = points[i, 1]
+        sum_x += x
+        sum_y += y
+        sum_xx += x * x
+        sum_yy += y * y
+        sum_xy += x * y
 
-    b = b / num_points
-    return b
+    return fit_sums(num_points, sum_x, sum_y, sum_xx, sum_yy, sum_xy, points[0, 1], points[num_points - 1, 1])
 
 
 # Total Least Squares Fitting Method
+# Kept for callers that pass a list of [x, y] points
 cpdef fit_line(points):
-    cdef int num_points = len(points)
-
-    cdef float x_mean = sum([point[0] for point in points]) / num_points
-    cdef float y_mean = sum([point[1] for point in points]) / num_points
-
-    rho_mat = get_rho_vector(points, num_points)
-    theta_mat = get_theta_vector(points, num_points)
-
-    w_mat = get_weights(points, num_points, x_mean, y_mean)
-    w_sum = sum(w_mat)
-
-    cdef float x_weight = get_x_weight(w_mat, rho_mat, theta_mat, w_sum, num_points)
-    cdef float y_weight = get_y_weight(w_mat, rho_mat, theta_mat, w_sum, num_points)
-
-    cdef float alpha = get_alpha(points, num_points, w_mat, x_weight, y_weight)
-    cdef float r = get_r(x_weight, y_weight, alpha)
-
-    if r < 0:
-        r = -r
-        alpha += math.pi/2
-
-    cdef float m = get_m(alpha, y_weight)
-    cdef float b = get_b(points, num_points, r, alpha, m)
+    cdef double m, b
+    m, b, _ = fit_points(np.ascontiguousarray(points, dtype=np.float64))
+    return [m, b]
 
-    return ([m, b])
 
 # Notes
-# 1. The get_point_var() is incorrectly implemented for the time being as I was unable to
+# 1. Point wise variance is not implemented for the time being as I was unable to
 #    understand how to calculate point-wise variance. In the paper, it is made clear that
 #    each point has a weight and that "The weights can be chosen as the inverses of the
 #    variances giving most weight to data points with low variability". The old
-#    implementation of get_point_var() finds the variance of the x value and the variance
-#    of the y value. It returns the average of these two variances. I don't believe this
-#    worked correctly. The current implementation simply returns 1 (i.e. point wise
-#    variance is not computed).
-# 2. Currently get_sample_vars() is unused since only the variance of each point is neeeded
-#    and I'm unsure if the variance of a point is related to the sample variances.
-# 3. Investigate faster way to calculate b (intercept), perhaps using the gradient, rho and
-#    other values calcualted and relating to polar coordinates. I may have already fixed
-#    this. I'm going through today and tidying notes which may or may not be out of date,
-#    whoops.
-# 4. tan_2_alpha = numerator / denominator will encounter a division by zero error if the
+#    implementation of get_point_var() found the variance of the x value and the variance
+#    of the y value and returned the average of these two variances. I don't believe this
+#    worked correctly. Every point currently has a weight of 1.
+# 2. The sample variances (previously get_sample_vars()) were unused since only the variance of
+#    each point is needed and I'm unsure if the variance of a point is related to the sample variances.
+# 3. b (intercept) is now y_mean - m * x_mean, which is the same as averaging y - m * x over the points.
+# 4. tan_2_alpha = -2 * cov_xy / (cov_yy - cov_xx) will encounter a division by zero error if the
 #    points forming the line are EXACTLY linear. However, this is practically impossible.
-# 5. get_theta(x, y) attempts to solve a division by zero error by setting x to be the max
-#    system value if it is equal to 0. This patch did not work for tan_2_alpha.
+# 5. With unit weights the polar form used in the paper (x_w = sum(w * rho * cos(theta)) / sum(w))
+#    reduces to the mean of x (and likewise y), so the line is fit directly from the point sums.
+#    This also removed the sys.maxsize guard get_theta() needed when x was 0.
 # 6. Investigate all places that involve division and explore edge cases that may lead to
 #    division by zero errors (like the above).
 # 7. Review method for identifying sign of gradient. If first or last point is an outlier, the
@@ -206,8 +138,9 @@ cpdef fit_line(points):
 #    the average changes (to identify and remove outliers). However, this is likely unecessary and
 #    too computationally expensive (especially when our goal is near real-time performance). Pretty
 #    sure this comment has been fixed as I have gotten the algorithm correctly working.
-# 8. Look at any places that use len(x) and see if this can be turned into a parsed constant that
-#    doesn't need to be repeatedly re-calculated.
+# 8. LineStats.remove() subtracts from the running sums, so a line that has points added and
+#    removed many times may accumulate small rounding errors. get_ground_lines() only ever removes
+#    the last point added before clearing the line, which keeps this negligible.
 
 # Sources
 #   - Paper: Feature Extraction and Scene Interpretation for Map-Based Navigation and Map Building
@@ -0,0 +1,233 @@
+import multiprocessing as mp
+import threading
+
+import numpy as np
+
+from . import point_cloud_processor as pcp
+from .. import constants as const
+from .. import utils
+from ..utils import Config  # For typing
+from ..video_stitcher import VideoStream
+
+from typing import Dict, List
+
+
+def render_figures(config: Config, frame: dict) -> None:
+    """Plots every figure of a frame from the arrays lidar_manager.locate_cones snapshots for it
+
+    Objects, reconstructed objects and cones are arrays of indices into the filtered point cloud.
+    """
+    # Matplotlib is only imported once figures are created, as it slows down starting the pipeline
+    from . import visualiser as vis
+    from . import visualiser_2 as vis2
+
+    vis2.load_fonts()
+
+    point_cloud = frame["point_cloud"]
+    point_labels = frame["point_labels"]
+    point_norms = frame["point_norms"]
+    segments, bins = frame["segments"], frame["bins"]
+    proto_segs_arr, proto_segs = frame["proto_segs_arr"], frame["proto_segs"]
+    ground_plane = frame["ground_plane"]
+    object_centers = frame["object_centers"]
+    cone_centers = frame["cone_centers"]
+
+    # Visualisations use structured arrays of points rather than columns and indices
+    object_points = point_cloud[point_labels]
+    object_xy = np.column_stack((object_points["x"], object_points["y"]))
+    objects = [point_cloud[object_ind] for object_ind in frame["objects"]]
+    reconstructed_objects = [point_cloud[rec_ind] for rec_ind in frame["reconstructed_objects"]]
+    cone_points = [point_cloud[cone_ind] for cone_ind in frame["cone_points"]]
+
+    # Height of each object center above the ground, as compared by op.cone_filter
+    obj_segs, obj_bins = pcp.get_discretised_positions(
+        object_centers[:, 0], object_centers[:, 1], np.linalg.norm(object_centers[:, :2], axis=1)
+    )
+    ground_lines_arr = frame["ground_table"][obj_segs % const.SEGMENT_COUNT, obj_bins]
+    object_line_dists = np.abs(
+        object_centers[:, 2] - (pcp.BIN_EDGES[obj_bins] * ground_lines_arr[:, 0] + ground_lines_arr[:, 1])
+    )
+
+    vis.plot_point_cloud_2D(config, frame["initial_point_cloud"], "00_PointCloud_2D")
+    vis.plot_point_cloud_2D(config, point_cloud, "01_PointCloud_2D")
+    vis.plot_segments_2D(config, point_cloud, segments, "03_PointCloudSegments_2D")
+    vis.plot_bins_2D(config, point_cloud, bins, "05_PointCloudBins_2D")
+    vis.plot_segments_3D(config, point_cloud, segments, "04_PointCloudSegments_3D")
+    vis.plot_bins_3D(config, point_cloud, bins, "06_PointCloudBins_3D")
+    vis.plot_prototype_points_2D(config, proto_segs_arr, proto_segs, "07_PrototypePoints_2D")
+    vis.plot_prototype_points_3D(config, proto_segs_arr, proto_segs, "08_PrototypePoints_3D")
+    vis.plot_ground_plane_2D(config, ground_plane, proto_segs_arr, proto_segs, "09_GroundPlane_2D")
+    vis.plot_ground_plane_3D(config, ground_plane, proto_segs_arr, proto_segs, "10_GroundPlane_3D")
+    vis.plot_labelled_points_2D(config, point_cloud, point_labels, ground_plane, "11_LabelledPoints_2D")
+    vis.plot_labelled_points_3D(config, point_cloud, point_labels, ground_plane, "12_LabelledPoints_3D")
+    vis.plot_object_points_2D(config, object_xy, "13_Object_Points_2D")
+    vis.plot_object_centers_2D(config, object_xy, object_centers, objects, object_line_dists, "14_Objects_2D")
+    vis.plot_reconstructed_objects_2D(
+        config,
+        [np.column_stack((rec["x"], rec["y"])) for rec in reconstructed_objects],
+        frame["reconstructed_centers"],
+        "14_Reconstructed_Objects",
+    )
+    vis2.plot_cones_2D(config, point_cloud, point_labels, cone_centers, cone_points, "15_Cones")
+    vis2.plot_cones_3D(
+        config, point_cloud[point_norms <= 100], point_labels[point_norms <= 100], cone_centers, "16_Cones_3D"
+    )
+    vis2.plot_detailed_2D(
+        config,
+        point_cloud,
+        segments,
+        bins,
+        ground_plane[np.unique(segments)],
+        point_labels,
+        reconstructed_objects,
+        frame["reconstructed_centers"],
+        frame["cone_intensities"],
+        cone_centers,
+        cone_points,
+        frame["duration"],
+        "17_detailed_2D",
+    )
+
+
+# Each worker process renders with its own copy of the config
+_worker_config: Config = None
+
+
+def _init_worker(config: Config, parameters: dict) -> None:
+    global _worker_config
+    _worker_config = config
+    # Spawned workers import the default parameters, use the ones the renderer was created with
+    const.set_parameters(**parameters)
+
+    # Figures are only drawn to images, never displayed
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _render_frame_worker(frame_idx: int, frame: dict) -> tuple:
+    from . import visualiser as vis
+
+    with vis.collect_figures() as images:
+        render_figures(_worker_config, frame)
+
+    return frame_idx, images
+
+
+class FigureRenderer:
+    """Renders the figures of each frame in a pool of processes, appending each figure to its own video
+
+    The pipeline only hands over a snapshot of each frame's arrays (see lidar_manager.locate_cones). While
+    max_pending frames are waiting to be rendered, new frames are dropped rather than queued, so creating
+    figures never holds up the pipeline. Rendered frames are written in order, as soon as every frame before
+    them has been written, to <runtime_dir>/videos/<figure name>.mp4.
+    """
+
+    def __init__(
+        self, config: Config, processes: int = const.FIGURE_PROCESSES, max_pending: int = const.FIGURE_QUEUE_SIZE
+    ) -> None:
+        self.config: Config = config
+        self.max_pending: int = max_pending
+        self.video_dir: str = f"{config.runtime_dir}/{const.VIDEOS_DIR}"
+        utils.create_dir(self.video_dir)
+
+        self.submitted: int = 0  # Frames handed to the pool
+        self.dropped: int = 0  # Frames dropped because the pool was busy
+        self.failed: int = 0  # Frames that could not be rendered
+        self.written: int = 0  # Frames written to the videos
+
+        # Spawn rather than fork, the parent has usually already started rclpy's threads
+        self._pool = mp.get_context("spawn").Pool(
+            processes, initializer=_init_worker, initargs=(config, const.get_parameters())
+        )
+        self._lock = threading.Lock()
+        self._pending: int = 0
+        self._rendered: Dict[int, dict] = {}  # Rendered frames waiting on an earlier frame
+        self._next_frame: int = 0
+        self._streams: Dict[str, VideoStream] = {}
+
+    def ready(self) -> bool:
+        """
+        Returns:
+            bool: There is room for another frame, if not the next frame should be dropped
+        """
+        return self._pending < self.max_pending
+
+    def drop(self) -> None:
+        """Skip the current frame, as there was no room for it"""
+        with self._lock:
+            self.dropped += 1
+
+    def submit(self, frame: dict) -> bool:
+        """Queue a frame's snapshot to be rendered, or drop it if too many frames are already waiting
+
+        Arrays in the snapshot are pickled to the pool in the background, so must not be modified afterwards
+
+        Returns:
+            bool: The frame was queued
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending += 1
+            frame_idx = self.submitted
+            self.submitted += 1
+
+        self._pool.apply_async(
+            _render_frame_worker,
+            (frame_idx, frame),
+            callback=self._on_rendered,
+            error_callback=lambda error: self._on_failed(frame_idx, error),
+        )
+        return True
+
+    # Callbacks run on the pool's result thread, the only thread that writes to the videos. The lock only
+    # guards the bookkeeping shared with submit, so encoding never blocks the pipeline
+
+    def _on_rendered(self, result: tuple) -> None:
+        frame_idx, images = result
+        with self._lock:
+            self._pending -= 1
+            self._rendered[frame_idx] = images
+            ready = self._pop_ready()
+        self._write(ready)
+
+    def _on_failed(self, frame_idx: int, error: BaseException) -> None:
+        self.config.logger.warning(f"Failed to render figures: {error!r}")
+        with self._lock:
+            self._pending -= 1
+            self.failed += 1
+            self._rendered[frame_idx] = {}
+            ready = self._pop_ready()
+        self._write(ready)
+
+    def _pop_ready(self) -> List[dict]:
+        # Rendered frames whose earlier frames have all been rendered, in order
+        ready = []
+        while self._next_frame in self._rendered:
+            ready.append(self._rendered.pop(self._next_frame))
+            self._next_frame += 1
+
+        return ready
+
+    def _write(self, ready: List[dict]) -> None:
+        for images in ready:
+            for name, image in images.items():
+                if name not in self._streams:
+                    self._streams[name] = VideoStream(f"{self.video_dir}/{name}.mp4")
+                self._streams[name].write(image)
+
+            self.written += len(images) > 0
+
+    def close(self) -> None:
+        """Finish rendering queued frames and close the videos"""
+        self._pool.close()
+        self._pool.join()
+        for stream in self._streams.values():
+            stream.close()
+
+        self.config.logger.info(
+            f"Rendered {self.written} frames of figures to {self.video_dir} | "
+            f"Dropped: {self.dropped} | Failed: {self.failed}"
+        )
@@ -1,31 +1,17 @@
 import math
 import multiprocessing as mp
+from multiprocessing import shared_memory
 
 import numpy as np
 
+from . import point_cloud_processor as pcp
 from .. import constants as const
 from .cy_library import total_least_squares as tls
 
 
 # Returns bin idx of a point from its norm
-def get_bin(norm, BIN_SIZE):
-    return math.floor(norm / BIN_SIZE)
-
-
-# Returns the RMSE of a line fit to a set of points
-def fit_error(m, b, points):
-    num_points = len(points)
-
-    sse = 0
-    for i in range(num_points):
-        x = points[i][0]
-        best_fit = m * x + b
-
-        observed = points[i][1]
-        sse += (best_fit - observed) ** 2
-
-    # root mean square return
-    return math.sqrt(sse / num_points)
+def get_bin(norm):
+    return int(pcp.get_bins(norm))
 
 
 # start and end points are used in visualisation
@@ -33,6 +19,7 @@ def fit_error(m, b, points):
 def get_ground_lines(proto_seg_points):
     estimated_lines = []
     new_line_points = []
+    line_stats = tls.LineStats()  # Running sums of new_line_points, so the line can be refit in O(1)
     lines_created = 0
 
     idx = 0
@@ -43,29 +30,32 @@ def get_ground_lines(proto_seg_points):
         new_point = proto_seg_points[idx]
         if len(new_line_points) >= 2:
             new_line_points.append(new_point)
+            line_stats.add(new_point[0], new_point[1])
 
-            [m_new, b_new] = tls.fit_line(new_line_points)
+            [m_new, b_new, rmse] = line_stats.fit(new_line_points[0][1], new_point[1])
 
             m_b_check = abs(m_new) <= const.T_M and (abs(m_new) > const.T_M_SMALL or abs(b_new) <= const.T_B)
-            if not (m_b_check and fit_error(m_new, b_new, new_line_points) <= const.T_RMSE):
+            if not (m_b_check and rmse <= const.T_RMSE):
                 new_line_points.pop()  # Remove the point we just added
+                line_stats.remove(new_point[0], new_point[1])
 
-                [m_new, b_new] = tls.fit_line(new_line_points)
+                [m_new, b_new, rmse] = line_stats.fit(new_line_points[0][1], new_line_points[-1][1])
 
                 m_b_check = abs(m_new) <= const.T_M and (abs(m_new) > const.T_M_SMALL or abs(b_new) <= const.T_B)
-                if m_b_check and fit_error(m_new, b_new, new_line_points) <= const.T_RMSE:
+                if m_b_check and rmse <= const.T_RMSE:
                     estimated_lines.append(
                         (
                             m_new,
                             b_new,
                             new_line_points[0],
                             new_line_points[-1],
-                            get_bin(new_line_points[0][0], const.BIN_SIZE),
+                            get_bin(new_line_points[0][0]),
                         )
                     )
                     lines_created += 1
 
                 new_line_points = []
+                line_stats.clear()
 
                 if const.REGRESS_BETWEEN_BINS:
                     idx -= 2
@@ -79,13 +69,12 @@ def get_ground_lines(proto_seg_points):
                 <= const.T_M
             ):
                 new_line_points.append(new_point)
+                line_stats.add(new_point[0], new_point[1])
 
         idx += 1
 
     if len(new_line_points) > 1 and m_new != None and b_new != None:
-        estimated_lines.append(
-            (m_new, b_new, new_line_points[0], new_line_points[-1], get_bin(new_line_points[0][0], const.BIN_SIZE))
-        )
+        estimated_lines.append((m_new, b_new, new_line_points[0], new_line_points[-1], get_bin(new_line_points[0][0])))
 
     # If no ground lines were identified in segment, return 0
     if len(estimated_lines) > 0:
@@ -114,6 +103,113 @@ def get_ground_plane_mp(config, proto_segs_arr, proto_segs):
     return ground_plane
 
 
+# Shared memory attached to by each GroundPlanePool worker
+_worker_points = None
+_worker_lines = None
+_worker_line_counts = None
+_worker_shms = []
+
+
+def _attach_worker(parameters, shapes, points_name, lines_name, counts_name):
+    global _worker_points, _worker_lines, _worker_line_counts, _worker_shms
+    # Spawned workers import the default parameters, use the ones the pool was created with
+    const.set_parameters(**parameters)
+    _worker_shms = [shared_memory.SharedMemory(name=name) for name in (points_name, lines_name, counts_name)]
+    _worker_points, _worker_lines, _worker_line_counts = GroundPlanePool.shared_arrays(shapes, *_worker_shms)
+
+
+def _map_segment_batch(offsets, rows):
+    # Fit lines to a contiguous batch of segments, writing them into the shared lines table
+    for i, row in enumerate(rows):
+        lines = get_ground_lines(_worker_points[offsets[i] : offsets[i + 1]].tolist())
+        if lines == 0:
+            _worker_line_counts[row] = 0
+            continue
+
+        _worker_line_counts[row] = len(lines)
+        for j, (m, b, start, end, bin_idx) in enumerate(lines):
+            _worker_lines[row, j] = (m, b, start[0], start[1], end[0], end[1], bin_idx)
+
+
+class GroundPlanePool:
+    """Long-lived pool of processes for ground plane mapping
+
+    Prototype points are handed to the workers through shared memory and the fitted lines are written back
+    into a preallocated [m b start(x, y) end(x, y) bin] table, so only segment offsets are pickled per frame.
+    The buffers and the workers' parameters are those of const when the pool is created.
+    """
+
+    LINE_FIELDS = 7
+    DTYPES = (np.float64, np.float64, np.int64)  # Of the points, lines and line counts
+
+    def __init__(self, processes=None):
+        if processes is None:
+            processes = max(1, math.floor(mp.cpu_count() * const.CPU_UTILISATION))
+        self.processes = processes
+
+        # Every bin of every segment can hold at most one prototype point, and each line spans at least one bin
+        self.shapes = (
+            (const.SEGMENT_COUNT * const.BIN_COUNT, 2),
+            (const.SEGMENT_COUNT, const.BIN_COUNT, self.LINE_FIELDS),
+            (const.SEGMENT_COUNT,),
+        )
+        sizes = [math.prod(shape) * np.dtype(dtype).itemsize for shape, dtype in zip(self.shapes, self.DTYPES)]
+        self._shms = [shared_memory.SharedMemory(create=True, size=size) for size in sizes]
+        self.points, self.lines, self.line_counts = self.shared_arrays(self.shapes, *self._shms)
+
+        # Spawn rather than fork, the parent has usually already started rclpy's threads
+        self._pool = mp.get_context("spawn").Pool(
+            processes,
+            initializer=_attach_worker,
+            initargs=(const.get_parameters(), self.shapes, *(shm.name for shm in self._shms)),
+        )
+
+    @classmethod
+    def shared_arrays(cls, shapes, points_shm, lines_shm, counts_shm):
+        return tuple(
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            for shape, dtype, shm in zip(shapes, cls.DTYPES, (points_shm, lines_shm, counts_shm))
+        )
+
+    def get_ground_plane(self, proto_segs_arr, proto_segs):
+        # Copy every segment's prototype points into shared memory back to back
+        seg_sizes = np.array([proto_seg.shape[0] for proto_seg in proto_segs_arr], dtype=int)
+        offsets = np.zeros(seg_sizes.size + 1, dtype=int)
+        np.cumsum(seg_sizes, out=offsets[1:])
+        if offsets[-1] > 0:
+            np.concatenate(proto_segs_arr, out=self.points[: offsets[-1]])
+
+        # Negative segments wrap around, the same as indexing ground_plane with them
+        rows = np.asarray(proto_segs, dtype=int) % self.line_counts.size
+
+        # One contiguous batch of segments per worker
+        bounds = np.linspace(0, rows.size, self.processes + 1, dtype=int)
+        batches = [
+            (offsets[start : end + 1], rows[start:end]) for start, end in zip(bounds[:-1], bounds[1:]) if end > start
+        ]
+        self._pool.starmap(_map_segment_batch, batches)
+
+        ground_plane = np.zeros(self.line_counts.size, dtype=object)
+        for row in rows:
+            line_count = self.line_counts[row]
+            if line_count == 0:
+                continue
+
+            ground_plane[row] = [
+                (m, b, [start_x, start_y], [end_x, end_y], int(bin_idx))
+                for m, b, start_x, start_y, end_x, end_y, bin_idx in self.lines[row, :line_count].tolist()
+            ]
+
+        return ground_plane
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        for shm in self._shms:
+            shm.close()
+            shm.unlink()
+
+
 def get_ground_plane_single_core(proto_segs_arr, proto_segs):
     # Computing the ground plane
     ground_plane = np.zeros(const.SEGMENT_COUNT, dtype=object)  # should it be vector of dtype, or matrix of nums?
@@ -123,3 +219,92 @@ def get_ground_plane_single_core(proto_segs_arr, proto_segs):
         ground_plane[proto_segs[segment_counter]] = get_ground_lines(proto_seg_points)
 
     return ground_plane
+
+
+class TemporalGroundModel:
+    """Ground plane that keeps each segment's lines between frames
+
+    The ground under most segments barely changes between scans, so last frame's lines are checked against the
+    new prototype points and only segments whose points no longer fit them are refit.
+    A segment's lines are reused when at least T_COVERAGE_TEMPORAL of its prototype points lie along them and the
+    RMSE of those points about the lines is at most T_RMSE_TEMPORAL.
+    """
+
+    def __init__(self, fit=get_ground_plane_single_core):
+        self.fit = fit  # Refits segments, same signature as get_ground_plane_single_core
+        self.ground_plane = np.zeros(const.SEGMENT_COUNT, dtype=object)
+
+        # Counters
+        self.frames = 0
+        self.segments_checked = 0  # Segments with prototype points
+        self.segments_refit = 0
+
+    @property
+    def refit_ratio(self):
+        return self.segments_refit / self.segments_checked if self.segments_checked > 0 else 1.0
+
+    def check_segments(self, proto_segs_arr, rows):
+        """
+        Returns:
+            np.ndarray: Whether last frame's lines still fit each segment's prototype points
+        """
+        line_counts = np.array([0 if lines == 0 else len(lines) for lines in self.ground_plane])
+        if line_counts.sum() == 0:
+            return np.zeros(len(proto_segs_arr), dtype=bool)
+
+        # Every previous line, in order
+        lines = [line for lines in self.ground_plane if lines != 0 for line in lines]
+        line_m = np.array([line[0] for line in lines], dtype=const.FLOAT_DTYPE)
+        line_b = np.array([line[1] for line in lines], dtype=const.FLOAT_DTYPE)
+        line_start_x = np.array([line[2][0] for line in lines], dtype=const.FLOAT_DTYPE)
+        line_end_x = np.array([line[3][0] for line in lines], dtype=const.FLOAT_DTYPE)
+        line_bins = np.clip([line[4] for line in lines], 0, const.BIN_COUNT - 1)
+        line_segs = np.repeat(np.arange(const.SEGMENT_COUNT), line_counts)
+
+        # Line covering each segment and bin (same rule as point_classifier.get_ground_table), -1 without lines
+        line_table = np.full((const.SEGMENT_COUNT, const.BIN_COUNT), -1, dtype=const.INT_DTYPE)
+        np.maximum.at(line_table, (line_segs, line_bins), np.arange(len(lines), dtype=const.INT_DTYPE))
+        line_table[:, 0] = np.maximum(
+            line_table[:, 0], np.where(line_counts > 0, np.cumsum(line_counts) - line_counts, -1)
+        )
+        np.maximum.accumulate(line_table, axis=1, out=line_table)
+
+        seg_sizes = np.array([proto_seg.shape[0] for proto_seg in proto_segs_arr])
+        seg_idx = np.repeat(np.arange(len(proto_segs_arr)), seg_sizes)
+        points = np.concatenate(proto_segs_arr)
+        point_x = points[:, 0]
+        point_bins = pcp.get_bins(point_x)
+
+        # Points within the span of the line covering them
+        point_lines = line_table[rows[seg_idx], point_bins]
+        line_ind = np.maximum(point_lines, 0)
+        covered = (point_lines >= 0) & (line_start_x[line_ind] <= point_x) & (point_x <= line_end_x[line_ind])
+        residuals = np.where(covered, points[:, 1] - (line_m[line_ind] * point_x + line_b[line_ind]), 0)
+
+        covered_counts = np.bincount(seg_idx, covered, len(proto_segs_arr))
+        sse = np.bincount(seg_idx, residuals * residuals, len(proto_segs_arr))
+
+        return (
+            (covered_counts >= 2)
+            & (covered_counts >= const.T_COVERAGE_TEMPORAL * seg_sizes)
+            & (sse <= const.T_RMSE_TEMPORAL**2 * covered_counts)
+        )
+
+    def get_ground_plane(self, proto_segs_arr, proto_segs):
+        ground_plane = np.zeros(const.SEGMENT_COUNT, dtype=object)
+        if len(proto_segs_arr) > 0:
+            rows = proto_segs % const.SEGMENT_COUNT
+            reused = self.check_segments(proto_segs_arr, rows)
+            ground_plane[rows[reused]] = self.ground_plane[rows[reused]]
+
+            refit_ind = np.flatnonzero(~reused)
+            if refit_ind.size > 0:
+                refit_plane = self.fit([proto_segs_arr[i] for i in refit_ind], proto_segs[refit_ind])
+                ground_plane[rows[refit_ind]] = refit_plane[rows[refit_ind]]
+
+            self.segments_checked += len(proto_segs_arr)
+            self.segments_refit += refit_ind.size
+
+        self.frames += 1
+        self.ground_plane = ground_plane
+        return ground_plane
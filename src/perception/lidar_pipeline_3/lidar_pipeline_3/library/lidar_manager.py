@@ -1,79 +1,165 @@
 import time
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+from . import figure_renderer
 from . import ground_plane_estimator as gpe
 from . import object_processor as op
 from . import point_classifier as pc
 from . import point_cloud_processor as pcp
-from . import visualiser as vis
-from . import visualiser_2 as vis2
+from . import range_image as ri
 from .. import constants as const
 from ..utils import Config  # For typing
+from .point_cloud_buffer import PointCloudBuffer
+from .stage_timer import StageTimer
 
 
-def locate_cones(config, point_cloud, start_time):
-    config.logger.info(f"Point Cloud received with {point_cloud.shape[0]} points")
+def locate_cones(
+    config, point_cloud, start_time, timer=None, ground_pool=None, buffer=None, ground_model=None, renderer=None
+):
+    if timer is None:
+        timer = StageTimer()
+    timer.start()
 
-    # Visualise inital point cloud before filtering
-    if config.create_figures:
-        config.setup_image_dir()
-        vis.plot_point_cloud_2D(config, point_cloud, "00_PointCloud_2D")
+    if buffer is None:
+        buffer = PointCloudBuffer()
+    decode_points(config, point_cloud, buffer)
+
+    frame = label_points(config, buffer, timer, ground_pool, ground_model)
+    if frame is None:
+        return []
+
+    cone_centers = detect_cones(config, frame, timer)
+
+    # cones = cones.tolist()
+    # for cone in cones:
+    #     print(cone)
+    # print(const.HALF_AREA_CONE_HEIGHT)
+
+    # Investigate turning structured arrays into normal arrays for better indexing and avoiding column stack
+    # actually i think this is fine ^ go back to structured to retain intensity
+    # Tune group points, 2 min is great for range, but probs noisy, also slower
+    # and now that we have ros bags that are more accurate for track, maybe increase epsilon
+    # to known min distance between cones
+
+    # what if entire point cloud was just turned into a n*5 array of floats?
+    # remove structured array but keep intentity and ring
 
-    # Remove points behind car
-    point_cloud = point_cloud[point_cloud["x"] > 0]
+    if config.create_figures and config.front_end == "polar":
+        create_figures(config, point_cloud, buffer, frame, time.perf_counter() - start_time, renderer)
 
-    # Compute point normals
-    point_norms = np.linalg.norm([point_cloud["x"], point_cloud["y"]], axis=0)
+    return cone_centers
+
+
+# The stages of locate_cones, which can also be run on their own threads (see pipeline.ConePipeline)
+# Each frame is passed between label_points and detect_cones as a dict of the arrays computed for it, the arrays
+# of the filtered point cloud are views of the buffer so the buffer must not be reused until the frame is done
+
+
+# Decode into columns (float32, or float64 with PRECISION double), then remove points behind car or outside of range
+def decode_points(config, point_cloud, buffer):
+    config.logger.debug(f"Point Cloud received with {point_cloud.shape[0]} points")
+
+    # Missing fields are decoded as zeros, which would put every point in the range image's first row
+    if config.front_end == "range_image" and "ring" not in point_cloud.dtype.names:
+        raise ValueError("The range_image front end needs the ring of each point, the point cloud has no ring field")
+
+    buffer.load(point_cloud)
+    buffer.filter()
+    config.logger.debug(f"{buffer.filtered_count} points remain after filtering point cloud")
+
+
+# Ground removal, returns None if there are no object points to detect cones from
+def label_points(config, buffer, timer, ground_pool=None, ground_model=None):
+    if config.front_end == "range_image":
+        return label_points_range_image(config, buffer, timer)
 
-    # Remove points that are outside of range or have a norm of 0
-    mask = point_norms <= const.LIDAR_RANGE  # & (point_norms != 0)
-    point_norms = point_norms[mask]
-    point_cloud = point_cloud[mask]
-    config.logger.info(f"{point_cloud.shape[0]} points remain after filtering point cloud")
+    x, y, z, intensity, point_norms = buffer.x, buffer.y, buffer.z, buffer.intensity, buffer.norms
 
-    segments, bins = pcp.get_discretised_positions(point_cloud["x"], point_cloud["y"], point_norms)
-    config.logger.info("DONE: Segments and Bins")
+    segments, bins = pcp.get_discretised_positions(x, y, point_norms)
+    timer.lap("discretise")
+    config.logger.debug("DONE: Segments and Bins")
 
-    proto_segs_arr, proto_segs, seg_bin_z_ind = pcp.get_prototype_points(point_cloud["z"], segments, bins, point_norms)
-    config.logger.info("DONE: Prototype Points")
+    proto_segs_arr, proto_segs, seg_bin_z_ind = pcp.get_prototype_points(z, segments, bins, point_norms)
+    timer.lap("prototype")
+    config.logger.debug("DONE: Prototype Points")
 
-    # Multiprocessing Ground Plane Mapping [m b start(x, y) end(x, y) bin]
-    # ground_plane = gpe.get_ground_plane_mp(config, proto_segs_arr, proto_segs)
-    ground_plane = gpe.get_ground_plane_single_core(proto_segs_arr, proto_segs)
-    config.logger.info("DONE: Ground Plane Mapped")
+    # Ground Plane Mapping [m b start(x, y) end(x, y) bin]
+    if ground_model is not None:
+        ground_plane = ground_model.get_ground_plane(proto_segs_arr, proto_segs)
+    elif ground_pool is not None:
+        ground_plane = ground_pool.get_ground_plane(proto_segs_arr, proto_segs)
+    else:
+        ground_plane = gpe.get_ground_plane_single_core(proto_segs_arr, proto_segs)
+    timer.lap("ground")
+    config.logger.debug("DONE: Ground Plane Mapped")
 
     # point_labels = pc.label_points(point_cloud, point_norms, seg_bin_z_ind, segments, ground_plane, bins)
     # point_labels = pc.label_points_2(point_cloud, point_norms, segments, bins, seg_bin_z_ind, ground_plane)
     # point_labels = pc.label_points_3(point_cloud, segments, bins, seg_bin_z_ind, ground_plane)
     # point_labels = pc.label_points_4(point_cloud, segments, bins, proto_segs, seg_bin_z_ind, ground_plane)
     # point_labels = pc.label_points_5(point_cloud, segments, bins, seg_bin_z_ind, ground_plane)
-    point_labels, ground_lines_arr = pc.label_points_6(point_cloud["z"], segments, bins, seg_bin_z_ind, ground_plane)
-    config.logger.info("DONE: Points Labelled")
+    # point_labels, ground_lines_arr = pc.label_points_6(point_cloud["z"], segments, bins, seg_bin_z_ind, ground_plane)
+    ground_table = pc.get_ground_table(ground_plane)
+    point_labels = pc.label_points_7(z, segments, bins, ground_table)
+    config.logger.debug("DONE: Points Labelled")
 
-    object_points = point_cloud[point_labels]
-    # object_points = np.column_stack((object_points["x"], object_points["y"], object_points["z"]))
-    config.logger.info("DONE: Object Points Grouped")
+    object_ind = np.flatnonzero(point_labels)
+    timer.lap("label")
+    config.logger.debug("DONE: Object Points Grouped")
 
-    if object_points.size == 0:
-        config.logger.info("No objects points detected")
-        return []
+    if object_ind.size == 0:
+        config.logger.debug("No objects points detected")
+        return None
+
+    return {
+        "x": x,
+        "y": y,
+        "z": z,
+        "intensity": intensity,
+        "point_norms": point_norms,
+        "segments": segments,
+        "bins": bins,
+        "proto_segs_arr": proto_segs_arr,
+        "proto_segs": proto_segs,
+        "seg_bin_z_ind": seg_bin_z_ind,
+        "ground_plane": ground_plane,
+        "ground_table": ground_table,
+        "point_labels": point_labels,
+        "object_ind": object_ind,
+    }
+
+
+# Clustering and cone filtering of a frame from label_points, the arrays computed are added to the frame
+def detect_cones(config, frame, timer):
+    if config.front_end == "range_image":
+        return detect_cones_range_image(config, frame, timer)
+
+    x, y, z, intensity = frame["x"], frame["y"], frame["z"], frame["intensity"]
+    segments, bins, seg_bin_z_ind = frame["segments"], frame["bins"], frame["seg_bin_z_ind"]
+    point_labels = frame["point_labels"]
 
-    object_centers, objects = op.group_points(object_points)  # maybe improve speed?
-    config.logger.info("DONE: Objects Identified")
+    # Objects are arrays of indices into the filtered point cloud
+    object_centers, objects = op.cluster_points(x, y, z, frame["object_ind"], config.clusterer)
+    timer.lap("cluster")
+    config.logger.debug("DONE: Objects Identified")
+
+    # Ground points sorted by segment then bin, indexed by (segment, bin)
+    ground_sorted_ind = seg_bin_z_ind[~point_labels[seg_bin_z_ind]]
+    cell_starts, seg_min = pcp.get_cell_index(segments, bins, ground_sorted_ind)
 
-    ground_points = point_cloud[~point_labels]
     # reconstructed_objects = op.reconstruct_objects(point_cloud, object_centers, objects, const.DELTA_ALPHA, const.CONE_DIAM, const.BIN_SIZE)
-    obj_segs, obj_bins, reconstructed_objects, reconstructed_centers, avg_object_intensity = op.reconstruct_objects_2(
-        ground_points, segments[~point_labels], bins[~point_labels], object_centers, objects
+    # obj_segs, obj_bins, reconstructed_objects, reconstructed_centers, avg_object_intensity = op.reconstruct_objects_2(
+    #     point_cloud[~point_labels], segments[~point_labels], bins[~point_labels], object_centers, objects
+    # )
+    obj_segs, obj_bins, reconstructed_objects, reconstructed_centers, avg_object_intensity = op.reconstruct_objects_4(
+        x, y, z, intensity, ground_sorted_ind, cell_starts, seg_min, object_centers, objects
     )
-    config.logger.info("DONE: Objects Reconstructed")
+    timer.lap("reconstruct")
+    config.logger.debug("DONE: Objects Reconstructed")
 
     cone_centers, cone_points, cone_intensities = op.cone_filter(
-        segments,
-        bins,
-        ground_lines_arr,
+        frame["ground_table"],
         obj_segs,
         obj_bins,
         object_centers,
@@ -81,65 +167,132 @@ def locate_cones(config, point_cloud, start_time):
         reconstructed_centers,
         avg_object_intensity,
     )
-    config.logger.info("DONE: Cones Identified")
-
-    duration = time.perf_counter() - start_time
+    timer.lap("filter")
+    config.logger.debug("DONE: Cones Identified")
 
-    # cones = cones.tolist()
-    # for cone in cones:
-    #     print(cone)
-    # print(const.HALF_AREA_CONE_HEIGHT)
+    frame.update(
+        object_centers=object_centers,
+        objects=objects,
+        reconstructed_objects=reconstructed_objects,
+        reconstructed_centers=reconstructed_centers,
+        cone_centers=cone_centers,
+        cone_points=cone_points,
+        cone_intensities=cone_intensities,
+    )
+    return cone_centers
 
-    # Investigate turning structured arrays into normal arrays for better indexing and avoiding column stack
-    # actually i think this is fine ^ go back to structured to retain intensity
-    # Tune group points, 2 min is great for range, but probs noisy, also slower
-    # and now that we have ros bags that are more accurate for track, maybe increase epsilon
-    # to known min distance between cones
 
-    # what if entire point cloud was just turned into a n*5 array of floats?
-    # remove structured array but keep intentity and ring
+# Create visualisations of a frame from detect_cones, in the background if there is a renderer (dropping frames
+# while it is busy)
+def create_figures(config, point_cloud, buffer, frame, duration, renderer=None):
+    if renderer is not None and not renderer.ready():
+        renderer.drop()
+        return
 
-    # Create visualisations
-    if config.create_figures:
-        vis.plot_point_cloud_2D(config, point_cloud, "01_PointCloud_2D")
-        vis.plot_segments_2D(config, point_cloud, segments, "03_PointCloudSegments_2D")
-        vis.plot_bins_2D(config, point_cloud, bins, "05_PointCloudBins_2D")
-        vis.plot_segments_3D(config, point_cloud, segments, "04_PointCloudSegments_3D")
-        vis.plot_bins_3D(config, point_cloud, bins, "06_PointCloudBins_3D")
-        vis.plot_prototype_points_2D(config, proto_segs_arr, proto_segs, "07_PrototypePoints_2D")
-        vis.plot_prototype_points_3D(config, proto_segs_arr, proto_segs, "08_PrototypePoints_3D")
-        vis.plot_ground_plane_2D(config, ground_plane, proto_segs_arr, proto_segs, "09_GroundPlane_2D")
-        vis.plot_ground_plane_3D(config, ground_plane, proto_segs_arr, proto_segs, "10_GroundPlane_3D")
-        vis.plot_labelled_points_2D(config, point_cloud, point_labels, ground_plane, "11_LabelledPoints_2D")
-        vis.plot_labelled_points_3D(config, point_cloud, point_labels, ground_plane, "12_LabelledPoints_3D")
-        vis.plot_object_points_2D(config, object_points, "13_Object_Points_2D")
-        vis.plot_object_centers_2D(config, object_points, object_centers, objects, object_line_dists, "14_Objects_2D")
-        vis.plot_reconstructed_objects_2D(
-            config, reconstructed_objects, reconstructed_centers, "14_Reconstructed_Objects"
-        )
-        vis2.plot_cones_2D(config, point_cloud, point_labels, cone_centers, cone_points, "15_Cones")
-        vis2.plot_cones_3D(
-            config, point_cloud[point_norms <= 100], point_labels[point_norms <= 100], cones, "16_Cones_3D"
-        )
-        vis2.plot_detailed_2D(
-            config,
-            point_cloud,
-            segments,
-            bins,
-            ground_plane[np.unique(segments)],
-            point_labels,
-            reconstructed_objects,
-            reconstructed_centers,
-            cone_intensities,
-            cone_centers,
-            cone_points,
-            duration,
-            "17_detailed_2D",
+    # Snapshot of the frame, arrays that are reused by the next frame are copied
+    snapshot = {
+        key: frame[key]
+        for key in (
+            "segments",
+            "bins",
+            "proto_segs_arr",
+            "proto_segs",
+            "ground_plane",
+            "ground_table",
+            "point_labels",
+            "object_centers",
+            "objects",
+            "reconstructed_objects",
+            "reconstructed_centers",
+            "cone_centers",
+            "cone_points",
+            "cone_intensities",
         )
+    }
+    snapshot.update(
+        initial_point_cloud=point_cloud,
+        point_cloud=buffer.structured(),
+        point_norms=frame["point_norms"].copy(),
+        duration=duration,
+    )
 
-        # reintro structured array for lidar colouring
+    if renderer is not None:
+        renderer.submit(snapshot)
+    else:
+        config.setup_image_dir()
+        figure_renderer.render_figures(config, snapshot)
 
         if config.show_figures:
+            import matplotlib.pyplot as plt
+
             plt.show()
 
+
+# Same as label_points after filtering, but ground removal works on a ring x azimuth range image of the scan,
+# rather than sorting every point by segment, bin and height. Needs the ring of every point
+# Figures are only created by the polar front end
+def label_points_range_image(config, buffer, timer):
+    x, y, z, point_norms = buffer.x, buffer.y, buffer.z, buffer.norms
+    if buffer.filtered_count == 0:
+        config.logger.debug("No points in range")
+        return None
+
+    pixels, image = ri.get_range_image(x, y, buffer.ring)
+    timer.lap("discretise")
+    config.logger.debug("DONE: Range Image")
+
+    is_ground, ground_below = ri.get_ground_pixels(image, z, point_norms)
+    timer.lap("ground")
+    config.logger.debug("DONE: Ground Pixels")
+
+    is_object = (image >= 0) & ~is_ground
+    timer.lap("label")
+    config.logger.debug("DONE: Points Labelled")
+
+    return {
+        "x": x,
+        "y": y,
+        "z": z,
+        "intensity": buffer.intensity,
+        "point_norms": point_norms,
+        "pixels": pixels,
+        "image": image,
+        "is_ground": is_ground,
+        "ground_below": ground_below,
+        "is_object": is_object,
+    }
+
+
+# Same as detect_cones, but clusters object pixels of the range image into objects
+def detect_cones_range_image(config, frame, timer):
+    x, y, z, intensity = frame["x"], frame["y"], frame["z"], frame["intensity"]
+    pixels, image, is_ground = frame["pixels"], frame["image"], frame["is_ground"]
+
+    # Objects are arrays of indices into the filtered point cloud
+    pixel_labels = ri.get_object_labels(image, frame["is_object"], x, y)
+    object_centers, objects = op.group_labels(pixel_labels[pixels], np.arange(pixels.size), x, y, z)
+    timer.lap("cluster")
+    config.logger.debug("DONE: Objects Identified")
+
+    if len(objects) == 0:
+        config.logger.debug("No objects points detected")
+        return []
+
+    reconstructed_objects, reconstructed_centers, avg_object_intensity = ri.reconstruct_objects(
+        x, y, z, intensity, image, is_ground, object_centers, objects
+    )
+    ground_heights = ri.get_object_ground_heights(frame["ground_below"], pixels, objects)
+    timer.lap("reconstruct")
+    config.logger.debug("DONE: Objects Reconstructed")
+
+    cone_centers, cone_points, cone_intensities = op.cone_filter_2(
+        ground_heights,
+        object_centers,
+        reconstructed_objects,
+        reconstructed_centers,
+        avg_object_intensity,
+    )
+    timer.lap("filter")
+    config.logger.debug("DONE: Cones Identified")
+
     return cone_centers
@@ -1,23 +1,21 @@
 import numpy as np
-from sklearn.cluster import DBSCAN
+from scipy import ndimage
 
 from . import point_cloud_processor as pcp
 from .. import constants as const
 
 
 def group_points(object_points):
-    EPSILON = 0.6  # Neighbourhood Scan Size 0.1: +0Hz, 0.5: -2Hz, 1 -3Hz:
-    MIN_POINTS = 2  # Number of points required to form a neighbourhood
-    # move these into constants file
+    from sklearn.cluster import DBSCAN  # Only imported by --clusterer=dbscan, as sklearn slows down start up
 
     # Cluster object points
-    clustering = DBSCAN(eps=EPSILON, min_samples=MIN_POINTS).fit(
+    clustering = DBSCAN(eps=const.EPSILON, min_samples=const.MIN_POINTS).fit(
         np.column_stack((object_points["x"], object_points["y"]))
     )
     labels = clustering.labels_
 
     # All object ids
-    unq_labels = np.unique(labels)[1:]  # Noise cluster -1 (np.unique sorts)
+    unq_labels = np.unique(labels[labels != -1])  # Noise cluster -1 (not always present)
 
     objects = np.empty(unq_labels.size, dtype=object)
     object_centers = np.empty((unq_labels.size, 3))
@@ -30,13 +28,82 @@ def group_points(object_points):
     return object_centers, objects
 
 
+# Object label of each point from DBSCAN, -1 for noise
+def get_dbscan_labels(x, y):
+    from sklearn.cluster import DBSCAN
+
+    return DBSCAN(eps=const.EPSILON, min_samples=const.MIN_POINTS).fit(np.column_stack((x, y))).labels_
+
+
+# Object label of each point from connected occupied cells of a grid, -1 for noise (like DBSCAN)
+def get_grid_labels(x, y):
+    cols = np.floor(x / const.GRID_CELL_SIZE).astype(const.INT_DTYPE)
+    rows = np.floor(y / const.GRID_CELL_SIZE).astype(const.INT_DTYPE)
+    cols -= cols.min()
+    rows -= rows.min()
+
+    occupied = np.zeros((rows.max() + 1, cols.max() + 1), dtype=bool)
+    occupied[rows, cols] = True
+
+    # Occupied cells that touch, including diagonally, are the same object
+    cell_labels, label_count = ndimage.label(occupied, structure=np.ones((3, 3), dtype=bool))
+    labels = cell_labels[rows, cols] - 1
+
+    # Objects with too few points are noise
+    label_sizes = np.bincount(labels, minlength=label_count)
+    is_object = label_sizes >= const.MIN_POINTS
+    new_labels = np.where(is_object, np.cumsum(is_object, dtype=const.INT_DTYPE) - 1, -1)
+
+    return new_labels[labels]
+
+
+# Groups the points at point_ind by their labels (-1 is noise)
+# Returns object centers, and each object as an array of indices into x, y and z
+def group_labels(labels, point_ind, x, y, z):
+    is_object = labels >= 0
+    labels = labels[is_object]
+    point_ind = point_ind[is_object]
+
+    object_count = labels.max() + 1 if labels.size > 0 else 0
+    object_sizes = np.bincount(labels, minlength=object_count)
+
+    objects = np.empty(object_count, dtype=object)
+    sorted_ind = point_ind[np.argsort(labels, kind="stable")]
+    for idx, object_ind in enumerate(np.split(sorted_ind, np.cumsum(object_sizes)[:-1])):
+        objects[idx] = object_ind
+
+    object_centers = np.column_stack(
+        (
+            np.bincount(labels, x[point_ind], object_count),
+            np.bincount(labels, y[point_ind], object_count),
+            np.bincount(labels, z[point_ind], object_count),
+        )
+    )
+    object_centers /= np.maximum(object_sizes, 1)[:, np.newaxis]
+
+    # bincount sums in float64, the centers are kept at the precision of the points
+    return object_centers.astype(const.FLOAT_DTYPE, copy=False), objects
+
+
+# Clusters the points at object_ind with the chosen clusterer ("grid" or "dbscan")
+# Returns object centers, and each object as an array of indices into x, y and z
+def cluster_points(x, y, z, object_ind, clusterer):
+    if clusterer == "dbscan":
+        labels = get_dbscan_labels(x[object_ind], y[object_ind])
+    else:
+        labels = get_grid_labels(x[object_ind], y[object_ind])
+
+    return group_labels(labels, object_ind, x, y, z)
+
+
 def reconstruct_objects_2(ground_points, ground_segments, ground_bins, object_centers, objects):
     obj_norms = np.linalg.norm(object_centers[:, :2], axis=1)
     obj_segs, obj_bins = pcp.get_discretised_positions(object_centers[:, 0], object_centers[:, 1], obj_norms)
 
     # Upside down floor devision
+    # Bins are at least BIN_SIZE wide, so searching this many of them covers the cone at any range
     bin_search_half = -((const.CONE_DIAM // const.BIN_SIZE) // -2)
-    seg_widths = -((2 * (const.BIN_SIZE * obj_bins) * np.tan(const.DELTA_ALPHA / 2)) // -2)
+    seg_widths = -((2 * pcp.BIN_EDGES[obj_bins] * np.tan(const.DELTA_ALPHA / 2)) // -2)
     seg_search_half = np.floor_divide(const.CONE_DIAM, seg_widths)
 
     # do i even car about all the points in a recon object? wouldnt i just want the cetner, and num points?
@@ -71,6 +138,51 @@ def reconstruct_objects_2(ground_points, ground_segments, ground_bins, object_ce
     return obj_segs, obj_bins, reconstructed_objs, reconstructed_centers, avg_object_intensity
 
 
+# Same as reconstruct_objects_2, but only reads ground points in each object's search window
+# from the (segment, bin) index of pcp.get_cell_index, rather than searching every ground point.
+# For a point cloud of columns (see PointCloudBuffer), objects and reconstructed objects are arrays of point indices
+def reconstruct_objects_4(x, y, z, intensity, ground_sorted_ind, cell_starts, seg_min, object_centers, objects):
+    obj_norms = np.linalg.norm(object_centers[:, :2], axis=1)
+    obj_segs, obj_bins = pcp.get_discretised_positions(object_centers[:, 0], object_centers[:, 1], obj_norms)
+
+    # Upside down floor devision
+    # Bins are at least BIN_SIZE wide, so searching this many of them covers the cone at any range
+    bin_search_half = -((const.CONE_DIAM // const.BIN_SIZE) // -2)
+    seg_widths = -((2 * pcp.BIN_EDGES[obj_bins] * np.tan(const.DELTA_ALPHA / 2)) // -2)
+    seg_search_half = np.floor_divide(const.CONE_DIAM, seg_widths)
+
+    seg_max = seg_min + (cell_starts.size - 1) // const.BIN_COUNT - 1
+
+    reconstructed_objs = np.empty(object_centers.shape[0], dtype=object)
+    reconstructed_centers = np.empty((object_centers.shape[0], 3), dtype=const.FLOAT_DTYPE)
+    avg_object_intensity = np.empty(object_centers.shape[0], dtype=const.FLOAT_DTYPE)
+    for i in range(object_centers.shape[0]):
+        matching_ind = objects[i]
+        avg_object_intensity[i] = np.mean(intensity[matching_ind])
+
+        # Search window, limited to the segments and bins that have points
+        seg_start = int(max(obj_segs[i] - seg_search_half[i], seg_min))
+        seg_end = int(min(obj_segs[i] + seg_search_half[i], seg_max))
+        bin_start = int(max(obj_bins[i] - bin_search_half, 0))
+        bin_end = int(min(obj_bins[i] + bin_search_half, const.BIN_COUNT - 1))
+
+        # The window's bins are one contiguous run of the index in each segment
+        seg_cells = np.arange(seg_start - seg_min, seg_end - seg_min + 1) * const.BIN_COUNT
+        search_ind = [
+            ground_sorted_ind[cell_starts[cell + bin_start] : cell_starts[cell + bin_end + 1]] for cell in seg_cells
+        ]
+        search_ind = np.sort(np.concatenate(search_ind)) if len(search_ind) > 0 else np.empty(0, dtype=int)
+
+        if search_ind.size > 0:
+            distances = np.hypot(x[search_ind] - object_centers[i, 0], y[search_ind] - object_centers[i, 1])
+            matching_ind = np.concatenate((matching_ind, search_ind[distances <= const.CONE_DIAM / 2]))
+
+        reconstructed_centers[i] = (np.mean(x[matching_ind]), np.mean(y[matching_ind]), np.mean(z[matching_ind]))
+        reconstructed_objs[i] = matching_ind
+
+    return obj_segs, obj_bins, reconstructed_objs, reconstructed_centers, avg_object_intensity
+
+
 def reconstruct_objects(point_cloud, object_centers, objects, DELTA_ALPHA, CONE_DIAM, BIN_SIZE):
     # center_norms = np.linalg.norm(object_centers, axis=1)
     # segment_widths = 2 * np.multiply(center_norms, np.tan(DELTA_ALPHA / 2))
@@ -114,9 +226,7 @@ def get_expected_point_count(distance):
 # to be in a segment or bin where no points were due to the small
 # epsilon in DBSCAN. If you introduce the noise cluster back, you will though
 def cone_filter(
-    segments,
-    bins,
-    ground_lines_arr,
+    ground_table,
     obj_segs,
     obj_bins,
     object_centers,
@@ -125,17 +235,32 @@ def cone_filter(
     avg_object_intensity,
 ):
     # Filter 1: Height of object compared to expected height of cone
-    seg_bin_ind = (obj_segs == segments) * (obj_bins == bins)
-
     # i think i chose to use object center here instead of rec cause i thought that implied
     # a line was guranteed to have been computed, a thus exist in ground_lines_arr
     # but huge angled walls can cause an object center to not actually be on any of its points
-    # so maybe use reconstructed instead? maybe have a try-catch to and ignore any objects that
-    # don't have a line computed in their bin. they're probably not cones anyway
-    discretised_ground_heights = (
-        (const.BIN_SIZE * bins[seg_bin_ind]) * ground_lines_arr[seg_bin_ind, 0]
-    ) + ground_lines_arr[seg_bin_ind, 1]
-    object_line_dists = np.abs(object_centers[:, 2] - discretised_ground_heights)
+    # so maybe use reconstructed instead? the ground table has a line for every segment and bin
+    # though, so every object gets a ground height
+    ground_lines_arr = ground_table[obj_segs % const.SEGMENT_COUNT, obj_bins]
+    discretised_ground_heights = (pcp.BIN_EDGES[obj_bins] * ground_lines_arr[:, 0]) + ground_lines_arr[:, 1]
+
+    return cone_filter_2(
+        discretised_ground_heights,
+        object_centers,
+        reconstructed_objects,
+        reconstructed_centers,
+        avg_object_intensity,
+    )
+
+
+# Same as cone_filter, but with the height of the ground under each object already known
+def cone_filter_2(
+    ground_heights,
+    object_centers,
+    reconstructed_objects,
+    reconstructed_centers,
+    avg_object_intensity,
+):
+    object_line_dists = np.abs(object_centers[:, 2] - ground_heights)
 
     # Upper bound cone height, lower bound take err margin
     f1_matching_ind = (const.HALF_AREA_CONE_HEIGHT - const.HACH_LOWER_ERR <= object_line_dists) * (
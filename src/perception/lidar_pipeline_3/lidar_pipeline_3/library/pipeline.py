@@ -0,0 +1,206 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+from . import lidar_manager
+from ..utils import Config  # For typing
+from .figure_renderer import FigureRenderer
+from .ground_plane_estimator import GroundPlanePool, TemporalGroundModel
+from .point_cloud_buffer import PointCloudBuffer
+from .stage_timer import StageTimer
+
+from typing import Any, Callable, Dict, Optional
+
+# Threads the pipeline is split across: decode, ground/label and cluster/filter
+STAGE_COUNT = 3
+
+# Frames that can hold a point cloud buffer at once, one in each stage and one waiting between each stage
+BUFFER_COUNT = 2 * STAGE_COUNT - 1
+
+
+class LatestSlot:
+    """Queue of depth 1 between two stages, where the newest item wins
+
+    Putting an item replaces any item that has not been taken yet, so a stage that falls behind always takes the
+    freshest frame waiting for it. Once closed, take() still returns the last item put, then None.
+    """
+
+    def __init__(self) -> None:
+        self._item: Any = None
+        self._closed: bool = False
+        self._condition = threading.Condition()
+
+    def put(self, item: Any) -> Any:
+        """
+        Returns:
+            Any: The stale item that was replaced, None if the slot was empty
+        """
+        with self._condition:
+            stale = self._item
+            self._item = item
+            self._condition.notify()
+
+        return stale
+
+    def take(self) -> Any:
+        """Wait for an item
+
+        Returns:
+            Any: The item, None once the slot is closed and empty
+        """
+        with self._condition:
+            while self._item is None and not self._closed:
+                self._condition.wait()
+
+            item = self._item
+            self._item = None
+
+        return item
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class ConePipeline:
+    """Runs lidar_manager.locate_cones as stages on their own threads, joined by LatestSlots
+
+    Consecutive frames overlap, while one frame is clustered the next is labelled and the one after decoded.
+    When a stage falls behind, the frames waiting for it are dropped in favour of the latest, so cones are always
+    detected from the freshest scan rather than from a backlog. Stages only overlap while NumPy has released the
+    GIL, the single core ground fit is a Python loop over segments that holds it, so give the pipeline a
+    GroundPlanePool (--mp_ground_plane) to move the fit out of process when there are cores to spare.
+
+    on_cones is called from the last stage's thread with the context given to submit(), the cone centers,
+    the stage times (ns) and the time since the frame was submitted (s).
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        on_cones: Callable[[Any, np.ndarray, Dict[str, int], float], None],
+        ground_pool: Optional[GroundPlanePool] = None,
+        ground_model: Optional[TemporalGroundModel] = None,
+        renderer: Optional[FigureRenderer] = None,
+    ) -> None:
+        self.config: Config = config
+        self.on_cones = on_cones
+        self.ground_pool: Optional[GroundPlanePool] = ground_pool
+        self.ground_model: Optional[TemporalGroundModel] = ground_model
+        self.renderer: Optional[FigureRenderer] = renderer
+
+        self.submitted: int = 0  # Frames handed to the pipeline
+        self.dropped: int = 0  # Frames replaced by a newer frame before reaching the end of the pipeline
+
+        # Enough buffers that decoding never waits on a buffer
+        self._buffers: queue.SimpleQueue = queue.SimpleQueue()
+        for _ in range(BUFFER_COUNT):
+            self._buffers.put(PointCloudBuffer())
+
+        self._lock = threading.Lock()
+        self._slots = [LatestSlot() for _ in range(STAGE_COUNT)]
+        stages = (self._decode, self._label, self._detect)
+        self._threads = [
+            threading.Thread(target=self._run_stage, args=(stage, i), name=f"cone_pipeline_{stage.__name__[1:]}")
+            for i, stage in enumerate(stages)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, point_cloud: np.ndarray, context: Any = None, start_time: Optional[float] = None) -> None:
+        """Queue a point cloud, replacing one that has not started decoding yet
+
+        The point cloud is decoded on the pipeline's thread, so must not be modified afterwards
+        """
+        job = {
+            "point_cloud": point_cloud,
+            "context": context,
+            "start_time": time.perf_counter() if start_time is None else start_time,
+            "times": {},
+        }
+        with self._lock:
+            self.submitted += 1
+        self._drop(self._slots[0].put(job))
+
+    def close(self) -> None:
+        """Finish the frames already submitted and stop the stages"""
+        self._slots[0].close()
+        for thread in self._threads:
+            thread.join()
+
+    def _run_stage(self, stage: Callable[[dict, StageTimer], bool], index: int) -> None:
+        inputs = self._slots[index]
+        outputs = self._slots[index + 1] if index + 1 < STAGE_COUNT else None
+        timer = StageTimer()
+
+        while True:
+            job = inputs.take()
+            if job is None:
+                break
+
+            timer.start()
+            try:
+                passed_on = stage(job, timer)
+                for stage_name, stage_time in timer.times.items():
+                    job["times"][stage_name] = job["times"].get(stage_name, 0) + stage_time
+
+                if not passed_on:
+                    self._finish(job, [])
+                elif outputs is not None:
+                    self._drop(outputs.put(job))
+                else:
+                    self._finish(job, job["cone_centers"])
+            except Exception as error:
+                self.config.logger.error(f"Cone pipeline failed in {stage.__name__[1:]}: {error!r}")
+                self._release(job)
+
+        if outputs is not None:
+            outputs.close()
+
+    # Stages return whether the frame should be passed on, otherwise there are no cones in it
+
+    def _decode(self, job: dict, timer: StageTimer) -> bool:
+        job["buffer"] = self._buffers.get()
+        lidar_manager.decode_points(self.config, job["point_cloud"], job["buffer"])
+
+        # Counted with discretising, as it is in locate_cones
+        timer.lap("discretise")
+        return True
+
+    def _label(self, job: dict, timer: StageTimer) -> bool:
+        job["frame"] = lidar_manager.label_points(
+            self.config, job["buffer"], timer, self.ground_pool, self.ground_model
+        )
+        return job["frame"] is not None
+
+    def _detect(self, job: dict, timer: StageTimer) -> bool:
+        job["cone_centers"] = lidar_manager.detect_cones(self.config, job["frame"], timer)
+
+        # Figures are only rendered in the background, never displayed from the pipeline's threads
+        if self.renderer is not None and self.config.front_end == "polar":
+            duration = time.perf_counter() - job["start_time"]
+            lidar_manager.create_figures(
+                self.config, job["point_cloud"], job["buffer"], job["frame"], duration, self.renderer
+            )
+
+        return True
+
+    def _finish(self, job: dict, cone_centers: np.ndarray) -> None:
+        self._release(job)
+        self.on_cones(job["context"], cone_centers, job["times"], time.perf_counter() - job["start_time"])
+
+    def _drop(self, job: Optional[dict]) -> None:
+        if job is None:
+            return
+
+        self._release(job)
+        with self._lock:
+            self.dropped += 1
+
+    def _release(self, job: dict) -> None:
+        buffer = job.pop("buffer", None)
+        if buffer is not None:
+            self._buffers.put(buffer)
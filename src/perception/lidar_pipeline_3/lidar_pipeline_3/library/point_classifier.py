@@ -3,6 +3,7 @@
 
 import numpy as np
 
+from . import point_cloud_processor as pcp
 from .. import constants as const
 
 
@@ -143,7 +144,7 @@ def label_points(point_cloud, point_norms, seg_bin_z_ind, segments, ground_plane
             ground_line = ground_line_dict[bin_idx]
             # point_line_dist = get_point_line_dist_2(ground_line, point_norm, point_z)
             point_line_dist = point_z - (
-                ground_line[0] * ((bin_idx - ground_line[4]) * const.BIN_SIZE) + ground_line[1]
+                ground_line[0] * (pcp.BIN_EDGES[bin_idx] - pcp.BIN_EDGES[ground_line[4]]) + ground_line[1]
             )
 
             is_non_ground = True
@@ -227,7 +228,7 @@ def label_points_2(point_cloud, point_norms, segments, bins, seg_bin_z_ind, grou
             ground_line = ground_line_dict[bin_idx]
             # point_line_dist = get_point_line_dist_2(ground_line, point_norm, point_z)
             point_line_dist = point_z - (
-                ground_line[0] * ((bin_idx - ground_line[4]) * const.BIN_SIZE) + ground_line[1]
+                ground_line[0] * (pcp.BIN_EDGES[bin_idx] - pcp.BIN_EDGES[ground_line[4]]) + ground_line[1]
             )
 
             is_non_ground = True
@@ -280,9 +281,7 @@ def label_points_3(point_cloud, segments, bins, seg_bin_z_ind, ground_plane):
             line_ind = ((segments == curr_seg) & (bins >= curr_bin)).nonzero()[0]
             ground_lines_arr[line_ind, :] = np.array([ground_line[0], ground_line[1]])
 
-    discretised_ground_heights = (const.BIN_SIZE * bins[seg_bin_z_ind]) * ground_lines_arr[:, 0] + ground_lines_arr[
-        :, 1
-    ]
+    discretised_ground_heights = pcp.BIN_EDGES[bins[seg_bin_z_ind]] * ground_lines_arr[:, 0] + ground_lines_arr[:, 1]
     point_line_dists = point_cloud["z"][seg_bin_z_ind] - discretised_ground_heights  # should there be an abs() here?
 
     point_labels = np.abs(point_line_dists) <= const.T_D_GROUND
@@ -304,9 +303,7 @@ def label_points_4(point_cloud, segments, bins, proto_segs, seg_bin_z_ind, groun
             line_ind = ((segments == curr_seg) & (bins >= curr_bin)).nonzero()[0]
             ground_lines_arr[line_ind, :] = np.array([ground_line[0], ground_line[1]])
 
-    discretised_ground_heights = ((const.BIN_SIZE * bins[seg_bin_z_ind]) * ground_lines_arr[:, 0]) + ground_lines_arr[
-        :, 1
-    ]
+    discretised_ground_heights = (pcp.BIN_EDGES[bins[seg_bin_z_ind]] * ground_lines_arr[:, 0]) + ground_lines_arr[:, 1]
     point_line_dists = point_cloud["z"][seg_bin_z_ind] - discretised_ground_heights  # should there be an abs() here?
 
     point_labels = np.abs(point_line_dists) <= const.T_D_GROUND
@@ -329,9 +326,7 @@ def label_points_5(point_cloud, segments, bins, seg_bin_z_ind, ground_plane):
             line_ind = ((segments == segment_idx) & (bins >= curr_bin)).nonzero()[0]
             ground_lines_arr[line_ind, :] = np.array([ground_line[0], ground_line[1]])
 
-    discretised_ground_heights = ((const.BIN_SIZE * bins[seg_bin_z_ind]) * ground_lines_arr[:, 0]) + ground_lines_arr[
-        :, 1
-    ]
+    discretised_ground_heights = (pcp.BIN_EDGES[bins[seg_bin_z_ind]] * ground_lines_arr[:, 0]) + ground_lines_arr[:, 1]
     point_line_dists = point_cloud["z"][seg_bin_z_ind] - discretised_ground_heights  # should there be an abs() here?
 
     point_labels = point_line_dists > const.T_D_GROUND  # if close enough, or simply lower than line
@@ -344,7 +339,7 @@ def label_points_6(point_heights, segments, bins, seg_bin_z_ind, ground_plane):
     # Get indices where sorted segments differ
     seg_sorted_ind, segments_sorted = sort_segments(segments, seg_bin_z_ind)
 
-    ground_lines_arr = np.empty((point_heights.shape[0], 2))
+    ground_lines_arr = np.empty((point_heights.shape[0], 2), dtype=const.FLOAT_DTYPE)
     for segment_idx in segments_sorted[seg_sorted_ind]:
         ground_set = ground_plane[segment_idx]
         seg_eq_idx = segments == segment_idx
@@ -355,7 +350,7 @@ def label_points_6(point_heights, segments, bins, seg_bin_z_ind, ground_plane):
             line_ind = (seg_eq_idx & (bins >= curr_bin)).nonzero()[0]
             ground_lines_arr[line_ind, :] = np.array([ground_line[0], ground_line[1]])
 
-    discretised_ground_heights = ((const.BIN_SIZE * bins) * ground_lines_arr[:, 0]) + ground_lines_arr[:, 1]
+    discretised_ground_heights = (pcp.BIN_EDGES[bins] * ground_lines_arr[:, 0]) + ground_lines_arr[:, 1]
     point_line_dists = (
         point_heights - discretised_ground_heights
     )  # should there be an abs() here? no, read comment below
@@ -364,4 +359,58 @@ def label_points_6(point_heights, segments, bins, seg_bin_z_ind, ground_plane):
     return point_labels, ground_lines_arr
 
 
+# Dense [m b] ground line of every segment and bin, built once per frame
+# Bins before a segment's first line use that line, empty segments use the closest
+# segment with lines (wrapping around, same as map_segments_3)
+def get_ground_table(ground_plane):
+    ground_table = np.zeros((const.SEGMENT_COUNT, const.BIN_COUNT, 2), dtype=const.FLOAT_DTYPE)
+
+    seg_line_counts = np.array([0 if lines == 0 else len(lines) for lines in ground_plane])
+    if seg_line_counts.sum() == 0:
+        # No ground lines at all, assume flat ground at the height of the lidar
+        ground_table[:, :, 1] = -const.LIDAR_HEIGHT_ABOVE_GROUND
+        return ground_table
+
+    # Every line's [m b] and start bin, in order
+    lines = [line for lines in ground_plane if lines != 0 for line in lines]
+    line_mb = np.array([line[:2] for line in lines], dtype=const.FLOAT_DTYPE)
+    line_bins = np.clip([line[4] for line in lines], 0, const.BIN_COUNT - 1)
+    line_segs = np.repeat(np.arange(const.SEGMENT_COUNT), seg_line_counts)
+    first_lines = np.cumsum(seg_line_counts) - seg_line_counts
+
+    # Index of the last line starting at or before each bin, later lines overwrite earlier ones
+    line_table = np.full((const.SEGMENT_COUNT, const.BIN_COUNT), -1, dtype=const.INT_DTYPE)
+    np.maximum.at(line_table, (line_segs, line_bins), np.arange(len(lines), dtype=const.INT_DTYPE))
+    line_table[:, 0] = np.maximum(line_table[:, 0], first_lines)
+    np.maximum.accumulate(line_table, axis=1, out=line_table)
+
+    # Map segments with no lines to the nearest segment with lines
+    non_empty = np.flatnonzero(seg_line_counts)
+    empty = np.flatnonzero(seg_line_counts == 0)
+    if empty.size > 0:
+        dists = np.abs(empty[:, np.newaxis] - non_empty)
+        wrap_dists = np.abs(const.SEGMENT_COUNT - dists)
+
+        min_dists = dists.min(axis=1)
+        min_wrap_dists = wrap_dists.min(axis=1)
+        closest = np.where(
+            min_dists <= min_wrap_dists, non_empty[dists.argmin(axis=1)], non_empty[wrap_dists.argmin(axis=1)]
+        )
+        line_table[empty] = line_table[closest]
+
+    ground_table[:] = line_mb[line_table]
+    return ground_table
+
+
+# Same as label_points_6, but reads each point's ground line straight out of the ground table
+def label_points_7(point_heights, segments, bins, ground_table):
+    ground_lines_arr = ground_table[segments % const.SEGMENT_COUNT, bins]
+
+    discretised_ground_heights = (pcp.BIN_EDGES[bins] * ground_lines_arr[:, 0]) + ground_lines_arr[:, 1]
+    point_line_dists = point_heights - discretised_ground_heights
+
+    point_labels = point_line_dists > const.T_D_GROUND  # if close enough, or simply lower than line
+    return point_labels
+
+
 # Note: using CUDA, you could run the matrix multiplication on GPU
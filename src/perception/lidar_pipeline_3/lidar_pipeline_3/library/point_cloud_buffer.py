@@ -0,0 +1,144 @@
+import numpy as np
+
+from .. import constants as const
+
+# Columns decoded from each point cloud, in order
+FIELDS = ("x", "y", "z", "intensity", "ring")
+
+# Raw columns are decoded as float32, the type of the x, y, z and intensity fields of the lidar's point clouds
+RAW_DTYPE = np.dtype("float32")
+
+# Layout of PointCloudBuffer.structured(), for visualisation
+STRUCTURED_DTYPE = np.dtype([(field, "<f4") for field in FIELDS])
+
+
+class PointCloudBuffer:
+    """Point cloud stored as contiguous columns, in buffers that are reused across frames
+
+    load() decodes a structured point cloud (e.g. np.frombuffer of a PointCloud2 message) into float32 raw columns,
+    filter() then keeps points in front of the car and within LIDAR_RANGE in a single pass. The filtered columns
+    and norms are const.FLOAT_DTYPE, with PRECISION double only the points that are kept are upcast to float64.
+    Buffers only grow, so frames no larger than the largest seen so far do not allocate any point arrays.
+    """
+
+    def __init__(self, capacity: int = 0) -> None:
+        self.capacity: int = 0
+        self.dtype: np.dtype = np.dtype(const.FLOAT_DTYPE)
+        self.count: int = 0  # Points in the loaded point cloud
+        self.filtered_count: int = 0  # Points remaining after filter()
+
+        self._raw = np.empty((len(FIELDS), 0), dtype=RAW_DTYPE)
+        self._kept = np.empty(0, dtype=RAW_DTYPE)  # Raw column of the points kept, before upcasting
+        self._filtered = np.empty((len(FIELDS) + 1, 0), dtype=self.dtype)  # Filtered columns and point norms
+        self._norms = np.empty(0, dtype=RAW_DTYPE)
+        self._squares = np.empty(0, dtype=RAW_DTYPE)
+        self._mask = np.empty(0, dtype=bool)
+        self._in_range = np.empty(0, dtype=bool)
+
+        self.reserve(capacity)
+
+    def reserve(self, capacity: int) -> None:
+        """Grow the buffers to hold at least capacity points, reallocating them if the precision has changed"""
+        dtype = np.dtype(const.FLOAT_DTYPE)
+        if capacity <= self.capacity and dtype == self.dtype:
+            return
+
+        capacity = max(capacity, 2 * self.capacity)
+        self.dtype = dtype
+        self._raw = np.empty((len(FIELDS), capacity), dtype=RAW_DTYPE)
+        self._kept = np.empty(capacity if dtype != RAW_DTYPE else 0, dtype=RAW_DTYPE)
+        self._filtered = np.empty((len(FIELDS) + 1, capacity), dtype=dtype)
+        self._norms = np.empty(capacity, dtype=RAW_DTYPE)
+        self._squares = np.empty(capacity, dtype=RAW_DTYPE)
+        self._mask = np.empty(capacity, dtype=bool)
+        self._in_range = np.empty(capacity, dtype=bool)
+        self.capacity = capacity
+
+    def load(self, point_cloud: np.ndarray) -> None:
+        """Decode a structured point cloud into the raw columns, missing fields are zeroed"""
+        self.count = point_cloud.shape[0]
+        self.filtered_count = 0
+        self.reserve(self.count)
+
+        for i, field in enumerate(FIELDS):
+            if field in point_cloud.dtype.names:
+                np.copyto(self._raw[i, : self.count], point_cloud[field], casting="unsafe")
+            else:
+                self._raw[i, : self.count] = 0
+
+    def filter(self) -> int:
+        """Keep points in front of the car that are within range, computing their norms on the way
+
+        Returns:
+            int: Number of points remaining
+        """
+        count = self.count
+        x = self._raw[0, :count]
+        y = self._raw[1, :count]
+
+        # Same as np.linalg.norm([x, y], axis=0), without the temporaries
+        norms = self._norms[:count]
+        squares = self._squares[:count]
+        np.multiply(x, x, out=norms)
+        np.multiply(y, y, out=squares)
+        np.add(norms, squares, out=norms)
+        np.sqrt(norms, out=norms)
+
+        # Remove points behind car, or that are outside of range
+        mask = self._mask[:count]
+        in_range = self._in_range[:count]
+        np.greater(x, 0, out=mask)
+        np.less_equal(norms, const.LIDAR_RANGE, out=in_range)
+        np.logical_and(mask, in_range, out=mask)
+
+        self.filtered_count = np.count_nonzero(mask)
+        for i in range(len(FIELDS)):
+            filtered = self._filtered[i, : self.filtered_count]
+            if self.dtype == RAW_DTYPE:
+                np.compress(mask, self._raw[i, :count], out=filtered)
+            else:
+                # compress can't cast, so the kept points are upcast from a float32 column
+                kept = self._kept[: self.filtered_count]
+                np.compress(mask, self._raw[i, :count], out=kept)
+                np.copyto(filtered, kept)
+        if self.dtype == RAW_DTYPE:
+            np.compress(mask, norms, out=self._filtered[-1, : self.filtered_count])
+        else:
+            # Points are kept by their float32 norms, the norms passed on are recomputed from the upcast points
+            np.hypot(self.x, self.y, out=self._filtered[-1, : self.filtered_count])
+
+        return self.filtered_count
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._filtered[0, : self.filtered_count]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._filtered[1, : self.filtered_count]
+
+    @property
+    def z(self) -> np.ndarray:
+        return self._filtered[2, : self.filtered_count]
+
+    @property
+    def intensity(self) -> np.ndarray:
+        return self._filtered[3, : self.filtered_count]
+
+    @property
+    def ring(self) -> np.ndarray:
+        return self._filtered[4, : self.filtered_count]
+
+    @property
+    def norms(self) -> np.ndarray:
+        return self._filtered[-1, : self.filtered_count]
+
+    def structured(self, ind: np.ndarray = None) -> np.ndarray:
+        """Copy of the filtered points (or those at ind) as a structured array, for visualisation"""
+        count = self.filtered_count if ind is None else len(ind)
+        points = np.empty(count, dtype=STRUCTURED_DTYPE)
+        for i, field in enumerate(FIELDS):
+            column = self._filtered[i, : self.filtered_count]
+            points[field] = column if ind is None else column[ind]
+
+        return points
@@ -1,7 +1,43 @@
+import math
+
 import numpy as np
 
 from .. import constants as const
 
+# Start of each bin (see const.BIN_EDGES), and the bin of every BIN_RESOLUTION of range out to LIDAR_RANGE
+# Bin edges fall exactly on the table's steps. Rebuilt whenever the parameters change (see const.override)
+BIN_EDGES: np.ndarray = None
+BIN_TABLE: np.ndarray = None
+_table_edges: list = None
+
+
+def update_bin_table():
+    global BIN_EDGES, BIN_TABLE, _table_edges
+    if _table_edges is const.BIN_EDGES:
+        return
+
+    BIN_EDGES = np.array(const.BIN_EDGES, dtype=const.FLOAT_DTYPE)
+    BIN_TABLE = (
+        np.searchsorted(
+            np.round(np.array(const.BIN_EDGES) / const.BIN_RESOLUTION).astype(int),
+            np.arange(math.ceil(const.LIDAR_RANGE / const.BIN_RESOLUTION) + 1),
+            side="right",
+        )
+        - 1
+    ).astype(const.INT_DTYPE)
+    _table_edges = const.BIN_EDGES
+
+
+update_bin_table()
+
+
+# Bin index of each norm, read from the bin table rather than searching the bin edges
+def get_bins(point_norms):
+    update_bin_table()
+    steps = (np.asarray(point_norms) / const.BIN_RESOLUTION).astype(const.INT_DTYPE)
+
+    return BIN_TABLE[np.clip(steps, 0, BIN_TABLE.size - 1)]
+
 
 def get_discretised_positions(x, y, point_norms):
     # Calculating the segment index for each point
@@ -9,10 +45,10 @@ def get_discretised_positions(x, y, point_norms):
     np.nan_to_num(segments_idx, copy=False, nan=((np.pi / 2) / const.DELTA_ALPHA))  # Limit arctan x->inf = pi/2
 
     # Calculating the bin index for each point
-    bins_idx = point_norms / const.BIN_SIZE
+    bins_idx = get_bins(point_norms)
 
     # Stacking arrays segments_idx, bins_idx, point_norms, and xyz coords into one array
-    return segments_idx.astype(int, copy=False), bins_idx.astype(int, copy=False)
+    return segments_idx.astype(const.INT_DTYPE, copy=False), bins_idx
 
 
 # In LPP 2, np.absolute(z) is used. I'm not sure why this was the case.
@@ -40,3 +76,19 @@ def get_prototype_points(z, segments, bins, point_norms):
     proto_segs_arr = np.split(proto_points, proto_segs_diff)
 
     return proto_segs_arr, proto_segments[np.concatenate((np.array([0]), proto_segs_diff))], seg_bin_z_ind
+
+
+# Index of points already sorted by segment then bin (e.g. from get_prototype_points), in CSR form
+# Points in (segment, bin) are sorted_ind[cell_starts[cell] : cell_starts[cell + 1]]
+# where cell = (segment - seg_min) * BIN_COUNT + bin
+def get_cell_index(segments, bins, sorted_ind):
+    if segments.size == 0:
+        return np.zeros(1, dtype=const.INT_DTYPE), 0
+
+    seg_min = segments.min()
+    seg_count = segments.max() - seg_min + 1
+
+    cells = (segments[sorted_ind] - seg_min) * const.BIN_COUNT + bins[sorted_ind]
+    cell_starts = np.searchsorted(cells, np.arange(seg_count * const.BIN_COUNT + 1, dtype=const.INT_DTYPE))
+
+    return cell_starts, seg_min
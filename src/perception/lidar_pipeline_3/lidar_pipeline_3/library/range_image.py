@@ -0,0 +1,163 @@
+import math
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .. import constants as const
+
+
+# Columns of the range image, one per LIDAR_HORIZONTAL_RES of azimuth in front of the car (-pi/2 to pi/2)
+def get_column_count():
+    return math.ceil(math.pi / const.LIDAR_HORIZONTAL_RES) + 1
+
+
+# Scatters points in front of the car into a ring x azimuth image, rows are rings (lowest first)
+# Returns the pixel of every point, and the index of the point in each pixel (-1 if empty)
+# If several points fall in the same pixel, the pixel holds one of them and the rest share its labels
+def get_range_image(x, y, rings):
+    column_count = get_column_count()
+    rows = rings.astype(const.INT_DTYPE)
+    cols = ((np.arctan2(y, x) + np.pi / 2) / const.LIDAR_HORIZONTAL_RES).astype(const.INT_DTYPE)
+    np.clip(cols, 0, column_count - 1, out=cols)
+
+    pixels = rows * column_count + cols
+    image = np.full((rows.max() + 1, column_count), -1, dtype=const.INT_DTYPE)
+    image.ravel()[pixels] = np.arange(pixels.size, dtype=const.INT_DTYPE)
+
+    return pixels, image
+
+
+# Column-wise slope test, walking up each column of the image from the lowest ring
+# Each column follows the ground as a line through its last ground point, with the slope between its last two
+# ground points (at most T_M). A point is ground if it is no more than T_D_GROUND above the line, and the angle
+# up to it from the last ground point is at most T_ALPHA_GROUND. The angle stops the ground climbing up the side
+# of a cone one ring at a time. Columns start flat, on the ground directly under the lidar
+# Like a new ground line of gpe.get_ground_lines, a point at most T_M up from the last ground point is also ground,
+# so past the last ground return the ground isn't extrapolated any further than the polar front end does
+# Returns which pixels are ground, and the height of the ground line at each pixel
+def get_ground_pixels(image, z, point_norms):
+    column_count = image.shape[1]
+    is_ground = np.zeros(image.shape, dtype=bool)
+    ground_below = np.empty(image.shape, dtype=const.FLOAT_DTYPE)
+
+    max_line_slope = math.tan(const.T_M)
+    max_slope = math.tan(const.T_ALPHA_GROUND)
+    ground_norms = np.zeros(column_count, dtype=const.FLOAT_DTYPE)
+    ground_heights = np.full(column_count, -const.LIDAR_HEIGHT_ABOVE_GROUND, dtype=const.FLOAT_DTYPE)
+    ground_slopes = np.zeros(column_count, dtype=const.FLOAT_DTYPE)
+    for row, row_ind in enumerate(image):
+        # Empty pixels read the last point, but are never ground
+        heights = z[row_ind]
+        norms = point_norms[row_ind]
+        run = np.maximum(norms - ground_norms, 0)
+        rise = heights - ground_heights
+        ground_below[row] = ground_heights + ground_slopes * run
+
+        is_row_ground = is_ground[row]
+        np.logical_and(row_ind >= 0, heights - ground_below[row] <= const.T_D_GROUND, out=is_row_ground)
+        np.logical_and(is_row_ground, rise <= max_slope * run, out=is_row_ground)
+        is_row_ground |= (row_ind >= 0) & (rise <= max_line_slope * run)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slopes = np.clip(rise / run, -max_line_slope, max_line_slope)
+        np.copyto(ground_slopes, slopes, where=is_row_ground & (run > 0))
+        np.copyto(ground_heights, heights, where=is_row_ground)
+        np.copyto(ground_norms, norms, where=is_row_ground)
+
+    return is_ground, ground_below
+
+
+# Groups object pixels into objects with connected components over the image
+# Object pixels are connected to the next object pixel along their ring, and to object pixels in the neighbouring
+# columns of the next ring, when they are within EPSILON of each other (like DBSCAN)
+# Returns the object label of each pixel, -1 for ground, empty pixels and noise
+def get_object_labels(image, is_object, x, y):
+    column_count = image.shape[1]
+    labels = np.full(image.size, -1, dtype=const.INT_DTYPE)
+
+    object_pixels = np.flatnonzero(is_object)  # Sorted by ring, then column
+    object_count = object_pixels.size
+    if object_count == 0:
+        return labels
+
+    nodes = np.full(image.size, -1, dtype=const.INT_DTYPE)
+    nodes[object_pixels] = np.arange(object_count, dtype=const.INT_DTYPE)
+
+    object_ind = image.ravel()[object_pixels]
+    object_x, object_y = x[object_ind], y[object_ind]
+    rows, cols = np.divmod(object_pixels, column_count)
+
+    # Along rings, consecutive object pixels in the same ring
+    edge_starts = [np.flatnonzero(rows[:-1] == rows[1:])]
+    edge_ends = [edge_starts[0] + 1]
+
+    # Between rings, object pixels above and diagonally above
+    has_row_above = rows + 1 < image.shape[0]
+    for col_offset in (-1, 0, 1):
+        neighbour_cols = cols + col_offset
+        starts = np.flatnonzero(has_row_above & (neighbour_cols >= 0) & (neighbour_cols < column_count))
+        ends = nodes[(rows[starts] + 1) * column_count + neighbour_cols[starts]]
+        edge_starts.append(starts[ends >= 0])
+        edge_ends.append(ends[ends >= 0])
+
+    edge_starts = np.concatenate(edge_starts)
+    edge_ends = np.concatenate(edge_ends)
+    is_close = (
+        np.hypot(object_x[edge_starts] - object_x[edge_ends], object_y[edge_starts] - object_y[edge_ends])
+        <= const.EPSILON
+    )
+    edge_starts = edge_starts[is_close]
+    edge_ends = edge_ends[is_close]
+
+    graph = coo_matrix(
+        (np.ones(edge_starts.size, dtype=bool), (edge_starts, edge_ends)), shape=(object_count, object_count)
+    )
+    label_count, object_labels = connected_components(graph, directed=False)
+
+    # Objects with too few pixels are noise
+    label_sizes = np.bincount(object_labels, minlength=label_count)
+    is_large = label_sizes >= const.MIN_POINTS
+    new_labels = np.where(is_large, np.cumsum(is_large) - 1, -1)
+
+    labels[object_pixels] = new_labels[object_labels]
+    return labels
+
+
+# Average height of the ground line at each object's pixels
+def get_object_ground_heights(ground_below, pixels, objects):
+    object_sizes = np.array([len(object_ind) for object_ind in objects])
+    heights = ground_below.ravel()[pixels[np.concatenate(objects)]]
+
+    return np.add.reduceat(heights, np.cumsum(object_sizes) - object_sizes) / object_sizes
+
+
+# Same as op.reconstruct_objects_4, but searches for nearby ground points in the columns of the image within
+# CONE_DIAM / 2 of each object's center, rather than in the (segment, bin) cells around it
+def reconstruct_objects(x, y, z, intensity, image, is_ground, object_centers, objects):
+    obj_norms = np.linalg.norm(object_centers[:, :2], axis=1)
+    center_cols = (np.arctan2(object_centers[:, 1], object_centers[:, 0]) + np.pi / 2) / const.LIDAR_HORIZONTAL_RES
+    col_search_half = np.arctan2(const.CONE_DIAM / 2, obj_norms) / const.LIDAR_HORIZONTAL_RES
+    col_starts = np.clip(np.floor(center_cols - col_search_half), 0, image.shape[1] - 1).astype(const.INT_DTYPE)
+    col_ends = np.clip(np.ceil(center_cols + col_search_half), 0, image.shape[1] - 1).astype(const.INT_DTYPE)
+
+    ground_image = np.where(is_ground, image, -1)
+
+    reconstructed_objs = np.empty(object_centers.shape[0], dtype=object)
+    reconstructed_centers = np.empty((object_centers.shape[0], 3), dtype=const.FLOAT_DTYPE)
+    avg_object_intensity = np.empty(object_centers.shape[0], dtype=const.FLOAT_DTYPE)
+    for i in range(object_centers.shape[0]):
+        matching_ind = objects[i]
+        avg_object_intensity[i] = np.mean(intensity[matching_ind])
+
+        window = ground_image[:, col_starts[i] : col_ends[i] + 1]
+        search_ind = np.sort(window[window >= 0])  # In point cloud order, same as reconstruct_objects_4
+
+        if search_ind.size > 0:
+            distances = np.hypot(x[search_ind] - object_centers[i, 0], y[search_ind] - object_centers[i, 1])
+            matching_ind = np.concatenate((matching_ind, search_ind[distances <= const.CONE_DIAM / 2]))
+
+        reconstructed_centers[i] = (np.mean(x[matching_ind]), np.mean(y[matching_ind]), np.mean(z[matching_ind]))
+        reconstructed_objs[i] = matching_ind
+
+    return reconstructed_objs, reconstructed_centers, avg_object_intensity
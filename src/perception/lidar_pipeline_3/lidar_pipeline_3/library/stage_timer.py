@@ -0,0 +1,80 @@
+import threading
+import time
+
+import numpy as np
+
+from typing import Dict, Optional, Sequence
+
+# Stages of lidar_manager.locate_cones, in the order they run
+STAGES = ("discretise", "prototype", "ground", "label", "cluster", "reconstruct", "filter")
+
+# Recorded for every frame, the total also covers any work done outside of the stages
+TIMINGS = STAGES + ("total",)
+
+PERCENTILES = (50, 95, 99)
+
+
+class StageTimer:
+    """Records how long each stage of the pipeline took for the current frame (nanoseconds)
+
+    With a history, recorded frames are kept in a ring buffer of the last `history` frames,
+    so percentiles of each stage can be reported rather than just a mean. Frames can be recorded on one
+    thread while percentiles are read on another.
+    """
+
+    def __init__(self, history: int = 0) -> None:
+        self.times: Dict[str, int] = {}
+        self.count: int = 0  # Frames recorded
+        self._start: int = 0
+        self._last: int = 0
+        self._history = np.zeros((history, len(TIMINGS)), dtype=np.int64)
+        self._history_lock = threading.Lock()  # Guards _history and count
+
+    def start(self) -> None:
+        """Begin timing a new frame"""
+        self.times = {}
+        self._start = time.perf_counter_ns()
+        self._last = self._start
+
+    def lap(self, stage: str) -> None:
+        """Record the time since the previous lap (or start) against a stage"""
+        now = time.perf_counter_ns()
+        self.times[stage] = now - self._last
+        self._last = now
+
+    def record(self, times: Optional[Dict[str, int]] = None, total: Optional[int] = None) -> None:
+        """Add a frame to the history, stages that did not run count as 0
+
+        Args:
+            times (dict): Stage times (ns), defaults to the current frame
+            total (int): Frame time (ns), defaults to the time since start() for the current frame,
+                otherwise the sum of the stage times
+        """
+        history_size = self._history.shape[0]
+        if history_size == 0:
+            return
+
+        if times is None:
+            times = self.times
+            if total is None:
+                total = time.perf_counter_ns() - self._start
+        elif total is None:
+            total = sum(times.values())
+
+        row = [times.get(stage, 0) for stage in STAGES] + [total]
+        with self._history_lock:
+            self._history[self.count % history_size] = row
+            self.count += 1
+
+    def percentiles(self, q: Sequence[float] = PERCENTILES) -> Dict[str, np.ndarray]:
+        """
+        Returns:
+            dict: Percentiles q of each stage and the total (ms) over the recorded history, empty if none
+        """
+        with self._history_lock:
+            frames = self._history[: min(self.count, self._history.shape[0])].copy()
+        if frames.shape[0] == 0:
+            return {}
+
+        values = np.percentile(frames, q, axis=0) / 1e6
+        return {timing: values[:, i] for i, timing in enumerate(TIMINGS)}
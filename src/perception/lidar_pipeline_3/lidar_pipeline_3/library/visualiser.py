@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 import math
 
 import matplotlib.colors as mpl_colors
@@ -96,6 +97,36 @@ def animate_figure():
     raise NotImplementedError
 
 
+# RGB images of figures by name, while collecting figures for video instead of saving them
+_collected_figures = None
+
+
+@contextmanager
+def collect_figures():
+    """Within the context, save_figure renders each figure to an RGB image in the yielded dict (by name)
+    at VIDEO_DPI_SCALE of its resolution, instead of saving it as a png in the image directory
+    """
+    global _collected_figures
+    _collected_figures = {}
+    try:
+        yield _collected_figures
+    finally:
+        _collected_figures = None
+
+
+def save_figure(config, fig, name, dpi=225):
+    if _collected_figures is not None:
+        fig.set_dpi(dpi * const.VIDEO_DPI_SCALE)
+        fig.canvas.draw()
+        _collected_figures[name] = np.array(fig.canvas.buffer_rgba())[:, :, :3]
+    else:
+        fig.savefig(f"{config.image_dir}/{name}.png", dpi=dpi)
+
+    # Figures are kept open to be displayed
+    if not config.show_figures:
+        plt.close(fig)
+
+
 def add_colourbar(fig, plot, title, title_c, tick_c):
     c_bar = fig.colorbar(plot)
     c_bar.set_label(title, color=title_c, labelpad=10)
@@ -124,7 +155,7 @@ def plot_point_cloud_2D(config, point_cloud, name):
     add_colourbar(fig, plot, "Point Intensity", const.blue, const.mint)
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
 
 def plot_segments_2D(config, point_cloud, segments, name):
@@ -143,7 +174,7 @@ def plot_segments_2D(config, point_cloud, segments, name):
     ax.set_ylim([-max_limit, max_limit])
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
 
 def plot_bins_2D(config, point_cloud, bins, name):
@@ -162,7 +193,7 @@ def plot_bins_2D(config, point_cloud, bins, name):
     ax.set_ylim([-max_limit, max_limit])
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
 
 def plot_segments_3D(config, point_cloud, segments, name):
@@ -195,7 +226,7 @@ def plot_segments_3D(config, point_cloud, segments, name):
     ax.axes.set_zlim(-max_limit, max_limit)
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
     # Create Animation
     if config.animate_figures:
@@ -232,7 +263,7 @@ def plot_bins_3D(config, point_cloud, bins, name):
     ax.axes.set_zlim(-max_limit, max_limit)
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
     # Create Animation
     if config.animate_figures:
@@ -256,7 +287,7 @@ def plot_prototype_points_2D(config, proto_segs_arr, proto_segs, name):
     ax.set_ylim([-max_limit, max_limit])
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
 
 def plot_prototype_points_3D(config, proto_segs_arr, proto_segs, name):
@@ -282,7 +313,7 @@ def plot_prototype_points_3D(config, proto_segs_arr, proto_segs, name):
     ax.axes.set_zlim(-max_limit, max_limit)
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
     # Create Animation
     if config.animate_figures:
@@ -317,7 +348,7 @@ def plot_ground_plane_2D(config, ground_plane, proto_segs_arr, proto_segs, name)
     ax.set_ylim([-max_limit, max_limit])
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
 
 def plot_ground_plane_3D(config, ground_plane, proto_segs_arr, proto_segs, name):
@@ -349,7 +380,7 @@ def plot_ground_plane_3D(config, ground_plane, proto_segs_arr, proto_segs, name)
     ax.axes.set_zlim(-max_limit, max_limit)
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
     # Create Animation
     if config.animate_figures:
@@ -384,7 +415,7 @@ def plot_labelled_points_2D(config, point_cloud, point_labels, ground_plane, nam
     ax.set_ylim([-max_limit, max_limit])
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
 
 def plot_labelled_points_3D(config, point_cloud, point_labels, ground_plane, name):
@@ -430,7 +461,7 @@ def plot_labelled_points_3D(config, point_cloud, point_labels, ground_plane, nam
     ax.axes.set_zlim(-max_limit, max_limit)
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
     # Create Animation
     if config.animate_figures:
@@ -446,7 +477,7 @@ def plot_object_points_2D(config, object_points, name):
     ax.set_ylim([-max_limit, max_limit])
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
 
 def plot_object_centers_2D(config, object_points, object_centers, objects, object_line_dists, name):
@@ -463,7 +494,7 @@ def plot_object_centers_2D(config, object_points, object_centers, objects, objec
     ax.set_ylim([-max_limit, max_limit])
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
 
 def plot_reconstructed_objects_2D(config, reconstructed_objects, reconstructed_centers, name):
@@ -486,7 +517,7 @@ def plot_reconstructed_objects_2D(config, reconstructed_objects, reconstructed_c
     ax.set_ylim([-max_limit, max_limit])
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
 
 def plot_cones_2D(config, point_cloud, identified_cones, name):
@@ -510,4 +541,4 @@ def plot_cones_2D(config, point_cloud, identified_cones, name):
     ax.set_ylim([-max_limit, max_limit])
 
     # Save Figure
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
@@ -1,3 +1,4 @@
+from functools import lru_cache
 import math
 
 from PIL import Image
@@ -8,18 +9,23 @@ import numpy as np
 
 from .. import constants as const
 from ..constants import RGBA, Colour
+from .visualiser import save_figure
 
 # import constants as const
 # from constants import RGBA, Colour
 
-font_dirs = [const.WORKING_DIR + "/library/resources/fonts"]
-# font_dirs = ["C:/Users/liamf/Documents/Personal/Software Development/Python/QUTMS_Driverless/src/perception/lidar_pipeline_3/lidar_pipeline_3/library/resources/fonts"]
-font_files = font_manager.findSystemFonts(fontpaths=font_dirs)
 
-for font_file in font_files:
-    font_manager.fontManager.addfont(font_file)
+# Scanning the font directory is slow, so is done once, before the first figure rather than on import
+@lru_cache(maxsize=None)
+def load_fonts():
+    font_dirs = [const.WORKING_DIR + "/library/resources/fonts"]
+    # font_dirs = ["C:/Users/liamf/Documents/Personal/Software Development/Python/QUTMS_Driverless/src/perception/lidar_pipeline_3/lidar_pipeline_3/library/resources/fonts"]
+    font_files = font_manager.findSystemFonts(fontpaths=font_dirs)
 
-plt.rcParams["font.family"] = "Roboto"
+    for font_file in font_files:
+        font_manager.fontManager.addfont(font_file)
+
+    plt.rcParams["font.family"] = "Roboto"
 
 
 def animate_figure():
@@ -140,7 +146,7 @@ def plot_cones_2D(config, point_cloud, point_labels, cone_centers, cone_points,
 
     # Save Figure
     add_logo(fig, dpi=225, small=True)
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
 
 def plot_cones_3D(config, point_cloud, point_labels, cones, name):
@@ -163,7 +169,7 @@ def plot_cones_3D(config, point_cloud, point_labels, cones, name):
 
     # Save Figure
     add_logo(fig, dpi=225, small=False)
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225)
+    save_figure(config, fig, name, dpi=225)
 
     # Create Animation
     if config.animate_figures:
@@ -462,4 +468,4 @@ def plot_detailed_2D(
 
     # Save Figure
     add_logo(fig, dpi=225 * 2, small=True)
-    plt.savefig(f"{config.image_dir}/{name}.png", dpi=225 * 2)
+    save_figure(config, fig, name, dpi=225 * 2)
@@ -9,25 +9,27 @@ from rclpy.node import Node
 from rclpy.publisher import Publisher
 from rclpy.subscription import Subscription
 
-from driverless_msgs.msg import Cone, ConeDetectionStamped
-from geometry_msgs.msg import Point
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+from driverless_msgs.msg import ConeDetectionStamped
 from sensor_msgs.msg import PointCloud2
+from std_msgs.msg import Header
 
+from driverless_common.conversions import cone_detection_msg
 import ros2_numpy as rnp
 
 from . import constants as const
-from . import utils
+from . import replay, utils, video_stitcher
+from .library import ground_plane_estimator as gpe
 from .library import lidar_manager
+from .library.figure_renderer import FigureRenderer
+from .library.pipeline import ConePipeline
+from .library.point_cloud_buffer import PointCloudBuffer
+from .library.stage_timer import PERCENTILES, StageTimer
 
 # For typing
 from .utils import Config
 
-
-def cone_msg(x: float, y: float) -> Cone:
-    location: Point = Point(x=x, y=y, z=const.LIDAR_HEIGHT_ABOVE_GROUND)
-
-    # This LiDAR Pipeline does not identify cone colour
-    return Cone(location=location, color=Cone.UNKNOWN)
+from typing import Optional
 
 
 class ConeDetectionNode(Node):
@@ -35,7 +37,6 @@ class ConeDetectionNode(Node):
         super().__init__("lidar_processor_node")
 
         self.iteration: int = 0
-        self.average_runtime: float = 0
 
         self.config: Config = _config
         self.pc_subscription: Subscription = self.create_subscription(
@@ -43,8 +44,57 @@ class ConeDetectionNode(Node):
         )
         self.cone_publisher: Publisher = self.create_publisher(ConeDetectionStamped, "/lidar/cone_detection", 1)
 
+        # Stage timings of recent frames, published periodically rather than logged every frame
+        self.stage_timer: StageTimer = StageTimer(history=const.TIMING_HISTORY)
+        self.diagnostics_publisher: Publisher = self.create_publisher(DiagnosticArray, "/diagnostics", 1)
+        self.create_timer(const.DIAGNOSTICS_PERIOD, self.publish_diagnostics)
+
+        # Reused across frames so point clouds are decoded without reallocating
+        self.point_buffer: PointCloudBuffer = PointCloudBuffer()
+
+        self.frame_log: Optional[replay.FrameLogWriter] = None
+        if self.config.export_data:
+            self.frame_log = replay.FrameLogWriter(f"{self.config.runtime_dir}/point_clouds.bin")
+
+        # Started once so worker start-up is not paid on every frame
+        self.ground_pool: Optional[gpe.GroundPlanePool] = None
+        if self.config.mp_ground_plane:
+            self.ground_pool = gpe.GroundPlanePool()
+            self.config.logger.info(f"Mapping Ground Plane using {self.ground_pool.processes} processes")
+
+        # Refits only the segments whose previous ground lines no longer fit
+        self.ground_model: Optional[gpe.TemporalGroundModel] = None
+        if self.config.temporal_ground:
+            if self.ground_pool is not None:
+                self.ground_model = gpe.TemporalGroundModel(fit=self.ground_pool.get_ground_plane)
+            else:
+                self.ground_model = gpe.TemporalGroundModel()
+
+        # Figures are rendered to videos in the background, unless they are to be shown
+        self.renderer: Optional[FigureRenderer] = None
+        if self.config.create_figures and not self.config.show_figures:
+            self.renderer = FigureRenderer(self.config)
+
+        # Stages of consecutive frames run on their own threads, so a slow frame does not hold up the next scan
+        self.pipeline: Optional[ConePipeline] = None
+        if self.config.pipelined:
+            self.pipeline = ConePipeline(
+                self.config, self.publish_cones, self.ground_pool, self.ground_model, self.renderer
+            )
+
         self.config.logger.info("Waiting for point cloud data...")
 
+    def destroy_node(self) -> bool:
+        if self.pipeline is not None:
+            self.pipeline.close()
+        if self.frame_log is not None:
+            self.frame_log.close()
+        if self.ground_pool is not None:
+            self.ground_pool.close()
+        if self.renderer is not None:
+            self.renderer.close()
+        return super().destroy_node()
+
     def pc_callback(self, point_cloud_msg: PointCloud2) -> None:
         self.iteration += 1
 
@@ -55,22 +105,69 @@ class ConeDetectionNode(Node):
         )  # x y z intensity ring
         point_cloud = np.frombuffer(point_cloud_msg.data, dtype_list)
 
-        cone_locations = lidar_manager.locate_cones(self.config, point_cloud, start_time)
+        if self.frame_log is not None:
+            stamp = point_cloud_msg.header.stamp.sec * 10**9 + point_cloud_msg.header.stamp.nanosec
+            self.frame_log.write(point_cloud, stamp)
 
-        if len(cone_locations) == 0:
+        if self.pipeline is not None:
+            self.pipeline.submit(point_cloud, point_cloud_msg.header, start_time)
             return
 
-        detected_cones = [cone_msg(cone[0], cone[1]) for cone in cone_locations]
+        cone_locations = lidar_manager.locate_cones(
+            self.config,
+            point_cloud,
+            start_time,
+            timer=self.stage_timer,
+            ground_pool=self.ground_pool,
+            ground_model=self.ground_model,
+            buffer=self.point_buffer,
+            renderer=self.renderer,
+        )
 
-        detection_msg = ConeDetectionStamped(header=point_cloud_msg.header, cones=detected_cones)
-        self.cone_publisher.publish(detection_msg)
+        self.publish_cones(point_cloud_msg.header, cone_locations)
+        self.stage_timer.record(total=int((time.perf_counter() - start_time) * 1e9))
+
+    def publish_cones(
+        self, header: Header, cone_locations: np.ndarray, times: Optional[dict] = None, duration: float = None
+    ) -> None:
+        if len(cone_locations) > 0:
+            # This LiDAR Pipeline does not identify cone colour
+            cone_locations = np.asarray(cone_locations).reshape(-1, 3)[:, :2]
+            detection_msg = cone_detection_msg(cone_locations, header, z=const.LIDAR_HEIGHT_ABOVE_GROUND)
+            self.cone_publisher.publish(detection_msg)
+
+        # Frames from the pipeline are timed by its stages, up to publishing
+        if times is not None:
+            self.stage_timer.record(times, total=int(duration * 1e9))
+
+    def publish_diagnostics(self) -> None:
+        timings = self.stage_timer.percentiles()
+        if not timings:
+            return
 
-        duration = time.perf_counter() - start_time
-        self.average_runtime = (self.average_runtime * (self.iteration - 1) + duration) / self.iteration
-        self.config.logger.info(
-            f"Current Hz: {round(1 / duration, 2)}\t| Average Hz: {round(1 / self.average_runtime, 2)}"
-        )
-        self.get_logger().debug(f"Time: {round(duration, 4)}\t| Average Hz: {round(1 / self.average_runtime, 2)}")
+        total_p50 = timings["total"][PERCENTILES.index(50)]
+        total_p99 = timings["total"][PERCENTILES.index(99)]
+
+        status = DiagnosticStatus(name="lidar_perception: stage timings", hardware_id=self.config.pc_node)
+        if total_p99 <= const.LATENCY_BUDGET_MS:
+            status.level = DiagnosticStatus.OK
+        else:
+            status.level = DiagnosticStatus.WARN
+        status.message = f"{round(1000 / total_p50, 2)} Hz (p50) | p99: {round(total_p99, 2)}ms"
+        status.values = [KeyValue(key="frames", value=str(self.stage_timer.count))]
+        if self.pipeline is not None:
+            status.values.append(KeyValue(key="dropped frames", value=str(self.pipeline.dropped)))
+        if self.ground_model is not None:
+            status.values.append(KeyValue(key="ground refit ratio", value=str(round(self.ground_model.refit_ratio, 3))))
+        status.values += [
+            KeyValue(key=f"{timing} p{q} (ms)", value=str(round(value, 3)))
+            for timing, values in timings.items()
+            for q, value in zip(PERCENTILES, values)
+        ]
+
+        diagnostics_msg = DiagnosticArray(status=[status])
+        diagnostics_msg.header.stamp = self.get_clock().now().to_msg()
+        self.diagnostics_publisher.publish(diagnostics_msg)
 
 
 def real_time_stream(args: list, config: Config) -> None:
@@ -84,14 +181,19 @@ def real_time_stream(args: list, config: Config) -> None:
     rclpy.shutdown()
 
 
-def local_data_stream():
-    raise NotImplementedError()
+def local_data_stream(config: Config) -> None:
+    replay.replay(config)
 
 
 def main(args=sys.argv[1:]):
     # Init config
     config: Config = utils.Config()
-    # config.update(args)
+
+    # Arguments after --ros-args belong to rclpy
+    if "--ros-args" in args:
+        config.update(args[: args.index("--ros-args")])
+    else:
+        config.update(args)
 
     # Check if logs should be printed
     if not config.print_logs:
@@ -107,13 +209,15 @@ def main(args=sys.argv[1:]):
 
     # Init data stream
     if config.video_from_session:
-        video_stitcher.stitch_figures(
+        frame_counts = video_stitcher.stitch_figures(
             f"{const.OUTPUT_DIR}/{config.video_from_session}{const.FIGURES_DIR}",
             f"{const.OUTPUT_DIR}/{config.video_from_session}_{const.VIDEOS_DIR}/{const.VIDEOS_DIR}",
         )
+        for name, frame_count in frame_counts.items():
+            config.logger.info(f"{name}.mp4: {frame_count} frames")
     elif config.data_path:
         # Use local data source
-        local_data_stream()
+        local_data_stream(config)
     else:
         # Use real-time source
         real_time_stream(args, config)
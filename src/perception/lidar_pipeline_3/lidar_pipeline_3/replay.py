@@ -0,0 +1,281 @@
+from collections import deque
+import multiprocessing as mp
+import os
+import re
+import time
+
+import numpy as np
+
+from . import constants as const
+from .library import ground_plane_estimator as gpe
+from .library import lidar_manager
+from .library.figure_renderer import FigureRenderer
+from .library.point_cloud_buffer import PointCloudBuffer
+from .library.stage_timer import PERCENTILES, STAGES, StageTimer
+from .utils import Config  # For typing
+
+from typing import BinaryIO, Iterator, Tuple
+
+# Point layout used when recording and replaying point clouds
+POINT_DTYPE = np.dtype([("x", "<f4"), ("y", "<f4"), ("z", "<f4"), ("intensity", "<f4"), ("ring", "<u2")])
+
+# Compact binary log of point clouds:
+#   file header:  LOG_MAGIC, uint32 version
+#   frame header: int64 stamp (ns), uint32 point count
+#   frame body:   packed POINT_DTYPE records
+LOG_MAGIC = b"LPCL"
+LOG_VERSION = 1
+LOG_HEADER_DTYPE = np.dtype([("magic", "S4"), ("version", "<u4")])
+FRAME_HEADER_DTYPE = np.dtype([("stamp", "<i8"), ("count", "<u4")])
+
+DATA_EXTENSIONS = (".npy", ".npz", ".bin")
+
+
+def to_point_dtype(point_cloud: np.ndarray) -> np.ndarray:
+    """Converts a structured point cloud or an (N, 4+) array of x, y, z, intensity[, ring] into POINT_DTYPE"""
+    converted = np.zeros(point_cloud.shape[0], dtype=POINT_DTYPE)
+    if point_cloud.dtype.names is not None:
+        for field in POINT_DTYPE.names:
+            if field in point_cloud.dtype.names:
+                converted[field] = point_cloud[field]
+    else:
+        for i, field in enumerate(POINT_DTYPE.names[: point_cloud.shape[1]]):
+            converted[field] = point_cloud[:, i]
+
+    return converted
+
+
+class FrameLogWriter:
+    """Appends point clouds to a compact binary log that can be replayed with --data_path"""
+
+    def __init__(self, path: str) -> None:
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(np.array((LOG_MAGIC, LOG_VERSION), dtype=LOG_HEADER_DTYPE).tobytes())
+
+    def write(self, point_cloud: np.ndarray, stamp: int = 0) -> None:
+        points = to_point_dtype(point_cloud)
+        self._file.write(np.array((stamp, points.shape[0]), dtype=FRAME_HEADER_DTYPE).tobytes())
+        self._file.write(points.tobytes())
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "FrameLogWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def read_frame_log(path: str) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yields (stamp, point cloud) for every frame of a binary log written by FrameLogWriter"""
+    with open(path, "rb") as log_file:
+        header = np.fromfile(log_file, dtype=LOG_HEADER_DTYPE, count=1)
+        if header.size == 0 or header["magic"][0] != LOG_MAGIC:
+            raise ValueError(f"{path} is not a point cloud log")
+        if header["version"][0] != LOG_VERSION:
+            raise ValueError(f"Unsupported point cloud log version: {header['version'][0]}")
+
+        while True:
+            frame_header = np.fromfile(log_file, dtype=FRAME_HEADER_DTYPE, count=1)
+            if frame_header.size == 0:
+                return
+
+            count = int(frame_header["count"][0])
+            points = np.fromfile(log_file, dtype=POINT_DTYPE, count=count)
+            if points.size != count:
+                return  # Truncated final frame, e.g. the recording was killed
+
+            yield int(frame_header["stamp"][0]), points
+
+
+def natural_key(name: str) -> list:
+    # Sorts "arr_2" before "arr_10"
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def load_frames(data_path: str) -> Iterator[np.ndarray]:
+    """Lazily yields recorded point clouds from a .npy, .npz or .bin file, or a directory of them
+
+    A .npy file holds a single frame, a .npz file holds one frame per array (in natural key order)
+    """
+    if os.path.isdir(data_path):
+        files = [file for file in os.listdir(data_path) if file.endswith(DATA_EXTENSIONS)]
+        for file in sorted(files, key=natural_key):
+            yield from load_frames(os.path.join(data_path, file))
+
+    elif data_path.endswith(".npy"):
+        yield to_point_dtype(np.load(data_path))
+
+    elif data_path.endswith(".npz"):
+        with np.load(data_path) as frames:
+            for key in sorted(frames.files, key=natural_key):
+                yield to_point_dtype(frames[key])
+
+    elif data_path.endswith(".bin"):
+        for _, point_cloud in read_frame_log(data_path):
+            yield point_cloud
+
+    else:
+        raise ValueError(f"Unsupported data path: {data_path}")
+
+
+def process_frame(
+    config: Config,
+    frame_idx: int,
+    point_cloud: np.ndarray,
+    buffer: PointCloudBuffer = None,
+    ground_pool: gpe.GroundPlanePool = None,
+    ground_model: gpe.TemporalGroundModel = None,
+    renderer: FigureRenderer = None,
+) -> tuple:
+    """Runs a single frame through locate_cones, decoding it into buffer, mapping the ground plane in ground_pool
+    and reusing ground_model's lines if given
+
+    Returns:
+        tuple: frame index, point count, (K, 3) cone centers, per-stage times (ns), total time (s)
+    """
+    timer = StageTimer()
+    start_time = time.perf_counter()
+    cone_centers = lidar_manager.locate_cones(
+        config,
+        point_cloud,
+        start_time,
+        timer=timer,
+        ground_pool=ground_pool,
+        buffer=buffer,
+        ground_model=ground_model,
+        renderer=renderer,
+    )
+    duration = time.perf_counter() - start_time
+
+    cone_centers = np.asarray(cone_centers, dtype=float).reshape(-1, 3)
+    return frame_idx, point_cloud.shape[0], cone_centers, timer.times, duration
+
+
+# Each worker process holds its own copy of the config and point cloud buffer
+_worker_config: Config = None
+_worker_buffer: PointCloudBuffer = None
+
+
+def _init_worker(config: Config) -> None:
+    global _worker_config, _worker_buffer
+    _worker_config = config
+    _worker_buffer = PointCloudBuffer()
+
+
+def _process_frame_worker(frame_idx: int, point_cloud: np.ndarray) -> tuple:
+    return process_frame(_worker_config, frame_idx, point_cloud, _worker_buffer)
+
+
+def process_frames_parallel(config: Config, frames: Iterator[np.ndarray], workers: int) -> Iterator[tuple]:
+    """Processes frames across a pool of processes, yielding results in frame order
+
+    Only a few frames per worker are in flight at once, so long recordings are never fully loaded into memory.
+    Workers are handed frames out of order, so ground lines can't be carried between frames (--temporal_ground),
+    and each worker maps the ground plane itself (no --mp_ground_plane). Figures aren't rendered (--create_figures).
+    """
+    max_pending = 2 * workers
+    with mp.Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+        pending = deque()
+        for frame_idx, point_cloud in enumerate(frames):
+            pending.append(pool.apply_async(_process_frame_worker, (frame_idx, point_cloud)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+
+
+def replay(config: Config) -> None:
+    """Streams recorded point clouds from config.data_path through locate_cones as fast as possible
+
+    Cone centers for every frame are saved to replay_cones.npz and per-stage timings to replay_timings.csv,
+    both in the runtime directory.
+    """
+    frames = load_frames(config.data_path)
+    ground_pool = None
+    ground_model = None
+    renderer = None
+    if config.workers > 1:
+        if config.temporal_ground:
+            raise ValueError(
+                "--temporal_ground reuses the previous frame's ground lines, it can't be used with --workers"
+            )
+        if config.mp_ground_plane:
+            raise ValueError(
+                "--mp_ground_plane maps the ground plane across processes, it can't be used with --workers"
+            )
+        if config.create_figures:
+            raise ValueError(
+                "--create_figures is only supported when replaying in a single process, it can't be used with --workers"
+            )
+        config.logger.info(f"Replaying {config.data_path} across {config.workers} processes")
+        results = process_frames_parallel(config, frames, config.workers)
+    else:
+        config.logger.info(f"Replaying {config.data_path}")
+        buffer = PointCloudBuffer()
+        if config.mp_ground_plane:
+            ground_pool = gpe.GroundPlanePool()
+            config.logger.info(f"Mapping Ground Plane using {ground_pool.processes} processes")
+        if config.temporal_ground:
+            if ground_pool is not None:
+                ground_model = gpe.TemporalGroundModel(fit=ground_pool.get_ground_plane)
+            else:
+                ground_model = gpe.TemporalGroundModel()
+        if config.create_figures and not config.show_figures:
+            renderer = FigureRenderer(config)
+        results = (
+            process_frame(config, frame_idx, frame, buffer, ground_pool, ground_model, renderer)
+            for frame_idx, frame in enumerate(frames)
+        )
+
+    frame_cones = {}
+    stage_totals = dict.fromkeys(STAGES, 0)
+    recent_timings = StageTimer(history=const.TIMING_HISTORY)
+    frame_count = 0
+
+    start_time = time.perf_counter()
+    with open(f"{config.runtime_dir}/replay_timings.csv", "w") as timings_file:
+        timings_file.write(",".join(["frame", "points", "cones", *[f"{stage}_ms" for stage in STAGES], "total_ms"]))
+        timings_file.write("\n")
+
+        for frame_idx, point_count, cone_centers, stage_times, duration in results:
+            frame_cones[f"frame_{frame_idx}"] = cone_centers
+            frame_count += 1
+
+            row = [frame_idx, point_count, cone_centers.shape[0]]
+            for stage in STAGES:
+                stage_time = stage_times.get(stage, 0)
+                stage_totals[stage] += stage_time
+                row.append(round(stage_time / 1e6, 4))
+            row.append(round(duration * 1e3, 4))
+            recent_timings.record(stage_times, total=int(duration * 1e9))
+            timings_file.write(",".join(str(value) for value in row) + "\n")
+
+            config.logger.info(
+                f"Frame {frame_idx}: {cone_centers.shape[0]} cones from {point_count} points in {round(duration, 4)}s"
+            )
+    wall_time = time.perf_counter() - start_time
+
+    if ground_pool is not None:
+        ground_pool.close()
+    if renderer is not None:
+        renderer.close()
+
+    np.savez(f"{config.runtime_dir}/replay_cones.npz", **frame_cones)
+
+    if frame_count == 0:
+        config.logger.warning(f"No point clouds found in {config.data_path}")
+        return
+
+    config.logger.info(
+        f"Replayed {frame_count} frames in {round(wall_time, 2)}s | Throughput: {round(frame_count / wall_time, 2)} Hz"
+    )
+    if ground_model is not None:
+        config.logger.info(f"Ground segments refit: {round(ground_model.refit_ratio * 100, 1)}%")
+
+    percentile_names = " / ".join(f"p{q}" for q in PERCENTILES)
+    for timing, values in recent_timings.percentiles().items():
+        average = f"{round(stage_totals[timing] / frame_count / 1e6, 3)}ms average | " if timing in STAGES else ""
+        config.logger.info(f"{timing}: {average}{percentile_names}: {' / '.join(str(round(v, 3)) for v in values)}ms")
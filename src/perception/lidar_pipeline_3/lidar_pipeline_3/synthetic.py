@@ -0,0 +1,169 @@
+import math
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from . import constants as const
+from .replay import POINT_DTYPE
+
+from typing import Tuple
+
+# Velodyne style scan pattern, rings are LIDAR_VERTICAL_RES apart starting from the lowest
+LIDAR_RINGS = 32
+LIDAR_LOWEST_ELEVATION = -25 * (math.pi / 180)
+LIDAR_MAX_RANGE = 100  # Rays that hit nothing closer are dropped, like a real sensor
+
+# Intensity ranges returned by the ground and by cones
+GROUND_INTENSITY = (0, 30)
+CONE_INTENSITY = (40, 120)
+
+
+def load_map(path: str) -> np.ndarray:
+    """Loads cone positions from a map csv (colour, x, y, ...) such as maps/example.csv
+
+    Returns:
+        np.ndarray: (N, 2) cone positions in the map frame
+    """
+    return np.loadtxt(path, delimiter=",", usecols=(1, 2), ndmin=2)
+
+
+def straight_track(length: float = 40, spacing: float = 3.5, width: float = 3.5) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: (N, 2) cone positions of a straight track starting in front of the car
+    """
+    xs = np.arange(spacing, length, spacing)
+    return np.concatenate(
+        (np.column_stack((xs, np.full_like(xs, width / 2))), np.column_stack((xs, -np.full_like(xs, width / 2))))
+    )
+
+
+def to_car_frame(cones: np.ndarray, pose: Tuple[float, float, float]) -> np.ndarray:
+    """Transforms (N, 2) map positions into the frame of a car (and LiDAR) at pose (x, y, yaw)"""
+    x, y, yaw = pose
+    cos_yaw, sin_yaw = math.cos(yaw), math.sin(yaw)
+    offsets = cones - (x, y)
+    return np.column_stack(
+        (cos_yaw * offsets[:, 0] + sin_yaw * offsets[:, 1], -sin_yaw * offsets[:, 0] + cos_yaw * offsets[:, 1])
+    )
+
+
+def generate_scan(
+    cones: np.ndarray,
+    pose: Tuple[float, float, float] = (0, 0, 0),
+    slope: float = 0.0,
+    noise: float = 0.01,
+    density: float = 1.0,
+    seed: int = 0,
+) -> np.ndarray:
+    """Ray-casts a single LiDAR scan over a cone layout
+
+    The ground is a plane LIDAR_HEIGHT_ABOVE_GROUND below the LiDAR with the given slope (rise over run)
+    along the car's x axis. Cones are upright CONE_HEIGHT x CONE_DIAM cones standing on the ground.
+
+    Args:
+        cones (np.ndarray): (N, 2) cone positions in the map frame
+        pose (tuple): Car (x, y, yaw) in the map frame
+        slope (float): Gradient of the ground along the car's x axis
+        noise (float): Standard deviation of range noise (metres)
+        density (float): Multiplier on the number of points per ring (LIDAR_HORIZONTAL_RES / density apart)
+        seed (int): Seed for noise and intensities
+
+    Returns:
+        np.ndarray: Point cloud with POINT_DTYPE fields, as the LiDAR driver publishes them
+    """
+    rng = np.random.default_rng(seed)
+
+    elevations = LIDAR_LOWEST_ELEVATION + const.LIDAR_VERTICAL_RES * np.arange(LIDAR_RINGS)
+    azimuth_count = max(1, round(2 * math.pi / (const.LIDAR_HORIZONTAL_RES / density)))
+    azimuths = np.linspace(-math.pi, math.pi, azimuth_count, endpoint=False)
+
+    # Ray directions, (rings, azimuths)
+    cos_elevations = np.cos(elevations)[:, np.newaxis]
+    dir_x = cos_elevations * np.cos(azimuths)
+    dir_y = cos_elevations * np.sin(azimuths)
+    dir_z = np.broadcast_to(np.sin(elevations)[:, np.newaxis], dir_x.shape)
+
+    # Ground plane, z = slope * x - LIDAR_HEIGHT_ABOVE_GROUND
+    ground_denom = dir_z - slope * dir_x
+    with np.errstate(divide="ignore"):
+        ranges = np.where(ground_denom < 0, -const.LIDAR_HEIGHT_ABOVE_GROUND / ground_denom, np.inf)
+    hit_cone = np.zeros(ranges.shape, dtype=bool)
+
+    # Cones are a quadric around the axis through (cx, cy), radius shrinking linearly to the tip
+    cone_slope = (const.CONE_DIAM / 2) / const.CONE_HEIGHT
+    azimuth_step = 2 * math.pi / azimuth_count
+    for cone_x, cone_y in to_car_frame(cones, pose):
+        cone_dist = math.hypot(cone_x, cone_y)
+        if cone_dist <= const.CONE_DIAM or cone_dist > LIDAR_MAX_RANGE:
+            continue
+
+        # Only the azimuths that can see the cone
+        half_width = math.asin(min(1.0, (const.CONE_DIAM / 2) / cone_dist)) + azimuth_step
+        start = math.floor((math.atan2(cone_y, cone_x) - half_width + math.pi) / azimuth_step)
+        end = math.ceil((math.atan2(cone_y, cone_x) + half_width + math.pi) / azimuth_step)
+        cols = np.arange(start, end + 1) % azimuth_count
+
+        base_z = slope * cone_x - const.LIDAR_HEIGHT_ABOVE_GROUND
+        tip_z = base_z + const.CONE_HEIGHT
+
+        dx, dy, dz = dir_x[:, cols], dir_y[:, cols], dir_z[:, cols]
+        a = dx * dx + dy * dy - cone_slope**2 * dz * dz
+        b = -2 * (dx * cone_x + dy * cone_y - cone_slope**2 * tip_z * dz)
+        c = cone_x**2 + cone_y**2 - cone_slope**2 * tip_z**2
+        discriminant = b * b - 4 * a * c
+
+        sqrt_disc = np.sqrt(np.maximum(discriminant, 0))
+        cone_ranges = ranges[:, cols]
+        cone_hits = hit_cone[:, cols]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roots = ((-b - sqrt_disc) / (2 * a), (-b + sqrt_disc) / (2 * a))
+        for root in roots:
+            root_z = root * dz
+            is_hit = (discriminant >= 0) & (root > 0) & (root_z >= base_z) & (root_z <= tip_z) & (root < cone_ranges)
+            cone_ranges = np.where(is_hit, root, cone_ranges)
+            cone_hits |= is_hit
+
+        ranges[:, cols] = cone_ranges
+        hit_cone[:, cols] = cone_hits
+
+    is_return = ranges <= LIDAR_MAX_RANGE
+    ranges = ranges[is_return] + rng.normal(0, noise, np.count_nonzero(is_return))
+    hit_cone = hit_cone[is_return]
+
+    point_cloud = np.empty(ranges.size, dtype=POINT_DTYPE)
+    point_cloud["x"] = ranges * dir_x[is_return]
+    point_cloud["y"] = ranges * dir_y[is_return]
+    point_cloud["z"] = ranges * dir_z[is_return]
+    point_cloud["intensity"] = np.where(
+        hit_cone, rng.uniform(*CONE_INTENSITY, ranges.size), rng.uniform(*GROUND_INTENSITY, ranges.size)
+    )
+    point_cloud["ring"] = np.broadcast_to(np.arange(LIDAR_RINGS)[:, np.newaxis], is_return.shape)[is_return]
+
+    return point_cloud
+
+
+def visible_cones(cones: np.ndarray, pose: Tuple[float, float, float] = (0, 0, 0)) -> np.ndarray:
+    """Cones the pipeline could detect from pose, i.e. in front of the car and within LIDAR_RANGE
+
+    Returns:
+        np.ndarray: (N, 2) cone positions in the car frame
+    """
+    car_cones = to_car_frame(cones, pose)
+    return car_cones[(car_cones[:, 0] > 0) & (np.linalg.norm(car_cones, axis=1) <= const.LIDAR_RANGE)]
+
+
+def match_cones(detected: np.ndarray, expected: np.ndarray, max_dist: float = 0.5) -> Tuple[float, float]:
+    """Matches detected cone centers to expected cone positions, one to one within max_dist
+
+    Returns:
+        tuple: recall and precision of the detections
+    """
+    if detected.shape[0] == 0 or expected.shape[0] == 0:
+        return float(detected.shape[0] == expected.shape[0] == 0), float(detected.shape[0] == 0)
+
+    dists = np.linalg.norm(detected[:, np.newaxis, :2] - expected[np.newaxis, :, :2], axis=2)
+    rows, cols = linear_sum_assignment(dists)
+    matches = int(np.count_nonzero(dists[rows, cols] <= max_dist))
+
+    return matches / expected.shape[0], matches / detected.shape[0]
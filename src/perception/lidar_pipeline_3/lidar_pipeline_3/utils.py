@@ -41,6 +41,12 @@ class Config:
         self._export_data: bool = False
         self._process_all: bool = False
         self._video_from_session: str = ""
+        self._workers: int = 1
+        self._mp_ground_plane: bool = False
+        self._clusterer: str = "grid"
+        self._front_end: str = "polar"
+        self._temporal_ground: bool = False
+        self._pipelined: bool = False
 
         # Misc
         self._pcl_memory: int = 1
@@ -111,7 +117,7 @@ class Config:
     def create_figures(self) -> bool:
         """
         Returns:
-            bool: Creates and saves plots
+            bool: Creates plots of each stage, rendered to videos in the background unless they are shown
         """
         return self._create_figures
 
@@ -161,7 +167,7 @@ class Config:
     def export_data(self) -> bool:
         """
         Returns:
-            bool: Export numpy point clouds to text file
+            bool: Record received point clouds to a binary log that can be replayed with --data_path
         """
         return self._export_data
 
@@ -212,6 +218,84 @@ class Config:
         create_dir(self.runtime_dir + "/" + const.VIDEOS_DIR)
         self.setup_logging()
 
+    @property
+    def workers(self) -> int:
+        """
+        Returns:
+            int: Number of processes used to replay point clouds from --data_path
+        """
+        return self._workers
+
+    @workers.setter
+    def workers(self, value) -> None:
+        self._workers = max(1, int(value))
+
+    @property
+    def mp_ground_plane(self) -> bool:
+        """
+        Returns:
+            bool: Map the ground plane across a persistent pool of processes
+        """
+        return self._mp_ground_plane
+
+    @mp_ground_plane.setter
+    def mp_ground_plane(self, value) -> None:
+        self._mp_ground_plane = value
+
+    @property
+    def temporal_ground(self) -> bool:
+        """
+        Returns:
+            bool: Reuse each segment's ground lines from the previous frame while they still fit
+        """
+        return self._temporal_ground
+
+    @temporal_ground.setter
+    def temporal_ground(self, value) -> None:
+        self._temporal_ground = value
+
+    @property
+    def pipelined(self) -> bool:
+        """
+        Returns:
+            bool: Decode, label and detect cones on separate threads, dropping stale frames between them
+        """
+        return self._pipelined
+
+    @pipelined.setter
+    def pipelined(self, value) -> None:
+        self._pipelined = value
+
+    @property
+    def clusterer(self) -> str:
+        """
+        Returns:
+            str: Method used to group object points, "grid" or "dbscan"
+        """
+        return self._clusterer
+
+    @clusterer.setter
+    def clusterer(self, value) -> None:
+        if value not in const.CLUSTERERS:
+            raise ValueError(f"Invalid clusterer: {value}")
+
+        self._clusterer = value
+
+    @property
+    def front_end(self) -> str:
+        """
+        Returns:
+            str: How points are labelled and grouped into objects, "polar" (segments and bins) or "range_image"
+        """
+        return self._front_end
+
+    @front_end.setter
+    def front_end(self, value) -> None:
+        if value not in const.FRONT_ENDS:
+            raise ValueError(f"Invalid front end: {value}")
+
+        self._front_end = value
+
     @property
     def pcl_memory(self) -> int:
         """
@@ -331,6 +415,9 @@ class Config:
                 "loglevel=",
                 "data_path=",
                 "video_from_session=",
+                "workers=",
+                "clusterer=",
+                "front_end=",
                 "create_figures",
                 "show_figures",
                 "animate_figures",
@@ -338,6 +425,9 @@ class Config:
                 "export_data",
                 "print_logs",
                 "process_all",
+                "mp_ground_plane",
+                "temporal_ground",
+                "pipelined",
             ],
         )
 
@@ -350,6 +440,12 @@ class Config:
                 self.data_path = arg
             elif opt == "--video_from_session":
                 self.video_from_session = arg
+            elif opt == "--workers":
+                self.workers = arg
+            elif opt == "--clusterer":
+                self.clusterer = arg
+            elif opt == "--front_end":
+                self.front_end = arg
             elif opt == "--create_figures":
                 self.create_figures = True
             elif opt == "--show_figures":
@@ -366,3 +462,9 @@ class Config:
                 self.print_logs = True
             elif opt == "--process_all":
                 self.process_all = True
+            elif opt == "--mp_ground_plane":
+                self.mp_ground_plane = True
+            elif opt == "--temporal_ground":
+                self.temporal_ground = True
+            elif opt == "--pipelined":
+                self.pipelined = True
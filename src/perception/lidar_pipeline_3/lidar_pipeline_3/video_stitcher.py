@@ -1,25 +1,122 @@
+import math
+import multiprocessing as mp
 import os
 
-import moviepy.video.io.ImageSequenceClip
+import numpy as np
 
+from . import constants as const
 
-def stitch_figures(session_path, output_path):
-    directories = []
-    for file in os.listdir(session_path):
-        fig_dir = os.path.join(session_path, file)
-        if os.path.isdir(fig_dir):
-            directories.append(fig_dir)
+from typing import Dict, Iterable, Iterator, List, Tuple
 
-    image_sequences = []
-    for image in os.listdir(directories[0]):
-        image_sequences.append([directories[0] + "/" + image])
 
-    for dir in directories[1:]:
-        for i, image in enumerate(os.listdir(dir)):
-            print(i, image)
-            image_sequences[i].append(dir + "/" + image)
+class VideoStream:
+    """Encodes RGB frames into a video as they arrive, rather than stitching saved images afterwards
 
-    print(image_sequences)
-    for i, image_sequence in enumerate(image_sequences):
-        clip = moviepy.video.io.ImageSequenceClip.ImageSequenceClip(image_sequence, fps=10)
-        clip.write_videofile(f"{output_path}/{i}.mp4")
+    The video takes the size of the first frame, trimmed to even dimensions for the encoder.
+    Later frames are cropped or padded to match.
+    """
+
+    def __init__(self, path: str, fps: float = const.VIDEO_FPS) -> None:
+        self.path: str = path
+        self.fps: float = fps
+        self.frame_count: int = 0
+        self._size = None
+        self._writer = None
+
+    def write(self, frame: np.ndarray) -> None:
+        """Append an (H, W, 3) uint8 RGB frame"""
+        if self._writer is None:
+            # Imported with the first frame, as moviepy slows down starting the pipeline
+            from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+            height, width = frame.shape[:2]
+            self._size = (width - width % 2, height - height % 2)
+            self._writer = FFMPEG_VideoWriter(self.path, self._size, self.fps)
+
+        width, height = self._size
+        if frame.shape[:2] != (height, width):
+            resized = np.zeros((height, width, 3), dtype=np.uint8)
+            resized[: frame.shape[0], : frame.shape[1]] = frame[:height, :width]
+            frame = resized
+
+        self._writer.write_frame(np.ascontiguousarray(frame))
+        self.frame_count += 1
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def write_video(frames: Iterable[np.ndarray], path: str, fps: float = const.VIDEO_FPS) -> int:
+    """Encodes RGB frames into a video, whether rendered in memory or read lazily from disk (see read_images)
+
+    Returns:
+        int: Number of frames written
+    """
+    stream = VideoStream(path, fps)
+    try:
+        for frame in frames:
+            stream.write(frame)
+    finally:
+        stream.close()
+
+    return stream.frame_count
+
+
+def read_images(paths: Iterable[str]) -> Iterator[np.ndarray]:
+    """Lazily reads images as RGB frames, so only one is held in memory at a time"""
+    from PIL import Image
+
+    for path in paths:
+        with Image.open(path) as image:
+            yield np.asarray(image.convert("RGB"))
+
+
+def get_figure_sequences(session_path: str) -> Dict[str, List[str]]:
+    """Finds every frame of each figure saved during a session
+
+    Each frame's figures are saved to a directory named by its timestamp (see Config.setup_image_dir),
+    so sorting the directories puts the frames in order.
+
+    Returns:
+        dict: Paths to the frames of each figure, by figure name
+    """
+    frame_dirs = sorted(entry.path for entry in os.scandir(session_path) if entry.is_dir())
+
+    sequences = {}
+    for frame_dir in frame_dirs:
+        for file in sorted(os.listdir(frame_dir)):
+            name, extension = os.path.splitext(file)
+            if extension == ".png":
+                sequences.setdefault(name, []).append(os.path.join(frame_dir, file))
+
+    return sequences
+
+
+def _write_sequence(name: str, paths: List[str], output_path: str, fps: float) -> Tuple[str, int]:
+    return name, write_video(read_images(paths), f"{output_path}/{name}.mp4", fps)
+
+
+def stitch_figures(
+    session_path: str, output_path: str, processes: int = None, fps: float = const.VIDEO_FPS
+) -> Dict[str, int]:
+    """Encodes the figures saved during a session into a video per figure (<output_path>/<figure name>.mp4)
+
+    Figures are encoded in parallel, one per process, reading their frames lazily in timestamp order.
+
+    Returns:
+        dict: Number of frames in each figure's video, by figure name
+    """
+    sequences = get_figure_sequences(session_path)
+    os.makedirs(output_path, exist_ok=True)
+    if processes is None:
+        processes = max(1, math.floor(mp.cpu_count() * const.CPU_UTILISATION))
+    processes = min(processes, len(sequences))
+
+    tasks = [(name, paths, output_path, fps) for name, paths in sequences.items()]
+    if processes <= 1:
+        return dict(_write_sequence(*task) for task in tasks)
+
+    with mp.Pool(processes) as pool:
+        return dict(pool.starmap(_write_sequence, tasks, chunksize=1))
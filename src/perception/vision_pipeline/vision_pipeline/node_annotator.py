@@ -13,7 +13,6 @@ from driverless_msgs.msg import Cone
 from sensor_msgs.msg import CameraInfo, Image
 
 from .rect import Rect, draw_box
-from .torch_inference import torch_init
 
 from typing import List, Tuple
 
@@ -22,11 +21,9 @@ cv_bridge = CvBridge()
 
 CAMERA_FOV = 110  # degrees
 
-# loading Pytorch model
-MODEL_PATH = os.path.join(get_package_share_directory("vision_pipeline"), "models", "YBV2.pt")
-REPO_PATH = os.path.join(get_package_share_directory("vision_pipeline"), "yolov5")
+# Pytorch model, loaded in main rather than on import
 CONFIDENCE = 0.40  # higher = tighter filter
-model = torch_init(CONFIDENCE, MODEL_PATH, REPO_PATH)
+IOU = 0.45  # YOLOv5's default
 
 ANNOTATION_PATH = "datasets/annotations/"
 VALIDATION_PATH = "datasets/validation/"
@@ -48,7 +45,7 @@ ConeMsgColour = int  # define arbitrary variable type
 
 
 def get_yolo_bounding_boxes(
-    colour_frame: np.ndarray,
+    colour_frame: np.ndarray, model
 ) -> List[Tuple[Rect, ConeMsgColour, Colour]]:  # bbox, msg colour, display colour
     rgb_frame: np.ndarray = cv2.cvtColor(colour_frame, cv2.COLOR_BGR2RGB)
 
@@ -71,9 +68,11 @@ def get_yolo_bounding_boxes(
 
 
 class AnnotatorNode(Node):
-    def __init__(self):
+    def __init__(self, model):
         super().__init__("cone_annotator")
 
+        self.model = model
+
         # subscribers
         CAMERA = "left"  ## SWITCH CAMERAS TO INCREASE DATASET SIZE ON ADDITIONAL RUNS
         # CAMERA = "right"
@@ -109,7 +108,7 @@ class AnnotatorNode(Node):
 
         # extract frame dimensions
         h, w, _ = colour_frame.shape
-        for bounding_box, cone_colour, display_colour in get_yolo_bounding_boxes(colour_frame):
+        for bounding_box, cone_colour, display_colour in get_yolo_bounding_boxes(colour_frame, self.model):
             # draw box for validation image check
             draw_box(colour_frame, box=bounding_box, colour=display_colour)
             # normalise all dimensions that annotating requires
@@ -133,9 +132,16 @@ class AnnotatorNode(Node):
 
 
 def main(args=None):
+    from .torch_inference import torch_init
+
+    # loading Pytorch model
+    MODEL_PATH = os.path.join(get_package_share_directory("vision_pipeline"), "models", "YBV2.pt")
+    REPO_PATH = os.path.join(get_package_share_directory("vision_pipeline"), "yolov5")
+    model = torch_init(MODEL_PATH, REPO_PATH, CONFIDENCE, IOU)
+
     rclpy.init(args=args)
 
-    annotator_node = AnnotatorNode()
+    annotator_node = AnnotatorNode(model)
 
     rclpy.spin(annotator_node)
     rclpy.shutdown()